@@ -0,0 +1,98 @@
+# encoding: utf-8
+"""
+Shared options and helpers for the benchmarks.
+
+Run with ``pytest benchmarks`` (requires ``pytest-benchmark``). The size of
+the synthetic corpus is set with ``--corpus-items``, ``--files-per-item``
+and ``--cardinality``. Compare runs with ``--benchmark-autosave`` and
+``--benchmark-compare``.
+
+Latency percentiles, throughput and peak memory are stored in the
+``extra_info`` of each benchmark, which is included in the output of
+``--benchmark-json``.
+"""
+__author__ = 'Richard Smith'
+__date__ = '18 Oct 2026'
+__copyright__ = 'Copyright 2018 United Kingdom Research and Innovation'
+__license__ = 'BSD - see LICENSE file in top-level package directory'
+__contact__ = 'richard.d.smith@stfc.ac.uk'
+
+import time
+import tracemalloc
+from array import array
+from typing import Callable, List, Sequence
+
+import pytest
+
+from item_generator.testing.corpus import Corpus
+
+
+def pytest_addoption(parser):
+    group = parser.getgroup('item_generator benchmarks')
+    group.addoption('--corpus-items', type=int, default=100, help='Number of items in the synthetic corpus')
+    group.addoption('--files-per-item', type=int, default=10, help='Number of assets in each item')
+    group.addoption('--cardinality', type=int, default=50, help='Distinct values for each facet')
+    group.addoption('--benchmark-rounds', type=int, default=3, help='Timed rounds for each benchmark')
+
+
+@pytest.fixture(scope='session')
+def corpus(request) -> Corpus:
+    return Corpus(
+        items=request.config.getoption('--corpus-items'),
+        files_per_item=request.config.getoption('--files-per-item'),
+        cardinality=request.config.getoption('--cardinality'),
+    )
+
+
+def percentile(ordered: Sequence[float], percent: float) -> float:
+    return ordered[round(percent / 100 * (len(ordered) - 1))]
+
+
+@pytest.fixture
+def run_calls(benchmark, request):
+    """
+    Time a function over a list of argument tuples.
+
+    The mean round time is measured by ``pytest-benchmark``. Per call
+    latency percentiles, throughput and peak memory are added to the
+    ``extra_info`` of the benchmark. Peak memory is measured in a separate
+    round as tracing slows the calls.
+    """
+    rounds = request.config.getoption('--benchmark-rounds')
+
+    def run(function: Callable, calls: List[tuple]) -> None:
+        latencies = array('d')
+        round_seconds = []
+
+        def workload():
+            del latencies[:]
+            for args in calls:
+                start = time.perf_counter()
+                function(*args)
+                latencies.append(time.perf_counter() - start)
+            round_seconds.append(sum(latencies))
+
+        benchmark.pedantic(workload, rounds=rounds, iterations=1, warmup_rounds=1)
+
+        # Timed here as benchmark.stats is None with --benchmark-disable
+        ordered = sorted(latencies)
+        timed = round_seconds[-rounds:]
+        mean_seconds = sum(timed) / len(timed)
+
+        tracemalloc.start()
+        try:
+            workload()
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+        benchmark.extra_info.update({
+            'calls': len(calls),
+            'calls_per_second': len(calls) / mean_seconds if mean_seconds else 0.0,
+            'p50_ms': percentile(ordered, 50) * 1000,
+            'p95_ms': percentile(ordered, 95) * 1000,
+            'p99_ms': percentile(ordered, 99) * 1000,
+            'peak_memory_mb': peak / 2 ** 20,
+        })
+
+    return run
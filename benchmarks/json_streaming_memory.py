@@ -0,0 +1,110 @@
+# encoding: utf-8
+"""
+Compare the peak memory of the indexed and streaming modes of the
+``JSONAggregator`` as the size of the asset dump grows.
+
+The streaming mode should stay flat while the indexed mode grows with
+the number of assets::
+
+    python benchmarks/json_streaming_memory.py --sizes 10000 100000 1000000
+
+"""
+__author__ = 'Richard Smith'
+__date__ = '18 Oct 2026'
+__copyright__ = 'Copyright 2018 United Kingdom Research and Innovation'
+__license__ = 'BSD - see LICENSE file in top-level package directory'
+__contact__ = 'richard.d.smith@stfc.ac.uk'
+
+import argparse
+import json
+import os
+import tempfile
+import time
+import tracemalloc
+
+from asset_scanner.core.item_describer import ItemDescription
+
+from item_generator.plugins.processors.json_aggregator import JSONAggregator
+
+
+def write_assets(path: str, n_assets: int, files_per_item: int = 100, ndjson: bool = False) -> None:
+    """
+    Write a synthetic asset dump
+
+    :param path: Output path
+    :param n_assets: Number of assets to write
+    :param files_per_item: Number of assets which share an item_id
+    :param ndjson: Write newline delimited JSON instead of an array
+    """
+    with open(path, 'w') as writer:
+        if not ndjson:
+            writer.write('[\n')
+
+        for i in range(n_assets):
+            asset = {
+                'id': f'asset-{i}',
+                'body': {
+                    'item_id': f'item-{i // files_per_item}',
+                    'categories': ['data'],
+                    'properties': {
+                        'platform': f'platform-{i % 7}',
+                        'variable': [f'var-{i % 13}', f'var-{i % 17}'],
+                        'datetime': f'2005-01-{(i % 28) + 1:02d}T00:00:00',
+                    }
+                }
+            }
+            separator = '\n' if ndjson or i == n_assets - 1 else ',\n'
+            writer.write(json.dumps(asset) + separator)
+
+        if not ndjson:
+            writer.write(']\n')
+
+
+def measure(aggregator: JSONAggregator, item_id: str, description: ItemDescription):
+    """
+    Run the aggregator and return the elapsed time and peak traced memory
+    """
+    tracemalloc.start()
+    start = time.perf_counter()
+
+    aggregator.run(item_id, description)
+
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return elapsed, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', nargs='+', type=int, default=[10000, 100000, 500000],
+                        help='Number of assets in each generated dump')
+    parser.add_argument('--ndjson', action='store_true', help='Generate newline delimited JSON')
+    parser.add_argument('--skip-index', action='store_true', help='Only measure the streaming mode')
+    args = parser.parse_args()
+
+    description = ItemDescription(
+        paths=['/'],
+        facets={'aggregation_facets': ['platform'], 'search_facets': ['variable']}
+    )
+
+    print(f'{"assets":>10} {"mode":>10} {"seconds":>10} {"peak MiB":>10}')
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        for size in args.sizes:
+            path = os.path.join(tmpdir, f'assets-{size}.json')
+            write_assets(path, size, ndjson=args.ndjson)
+
+            modes = ['streaming'] if args.skip_index or args.ndjson else ['indexed', 'streaming']
+
+            for mode in modes:
+                aggregator = JSONAggregator(filepath=path, streaming=mode == 'streaming')
+                elapsed, peak = measure(aggregator, 'item-0', description)
+                print(f'{size:>10} {mode:>10} {elapsed:>10.2f} {peak / 2 ** 20:>10.2f}')
+
+            os.remove(path)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,168 @@
+# encoding: utf-8
+"""
+Throughput, latency and memory of the aggregation processors and the
+``process_file`` pipeline over a synthetic corpus.
+
+Elasticsearch is replaced by the in-process
+:py:class:`item_generator.testing.fake_elasticsearch.FakeElasticsearch`, so
+these measure the cost of the processor and extractor code, not the cluster.
+"""
+__author__ = 'Richard Smith'
+__date__ = '18 Oct 2026'
+__copyright__ = 'Copyright 2018 United Kingdom Research and Innovation'
+__license__ = 'BSD - see LICENSE file in top-level package directory'
+__contact__ = 'richard.d.smith@stfc.ac.uk'
+
+import pytest
+
+pytest.importorskip('pytest_benchmark')
+
+from asset_scanner.types.source_media import StorageType
+
+from item_generator import FacetExtractor
+from item_generator.testing.fake_elasticsearch import FakeElasticsearch, merge_summary
+
+es_aggregator = pytest.importorskip(
+    'item_generator.plugins.processors.elasticsearch_aggregator',
+    exc_type=ImportError
+)
+json_aggregator = pytest.importorskip(
+    'item_generator.plugins.processors.json_aggregator',
+    exc_type=ImportError
+)
+sqlite_aggregator = pytest.importorskip(
+    'item_generator.plugins.processors.sqlite_aggregator',
+    exc_type=ImportError
+)
+
+INDEX = 'ceda-index'
+
+
+@pytest.fixture(scope='module')
+def fake_es(corpus):
+    return FakeElasticsearch({INDEX: corpus.assets()})
+
+
+def es_processor(fake_es, **kwargs):
+    processor = es_aggregator.ElasticsearchAggregator(
+        index=INDEX,
+        connection_kwargs={'hosts': ['localhost:9200']},
+        **kwargs
+    )
+    processor.es = fake_es
+    return processor
+
+
+@pytest.fixture(scope='module')
+def assets_file(corpus, tmp_path_factory):
+    path = tmp_path_factory.mktemp('assets') / 'assets.json'
+    corpus.write_json(str(path))
+    return str(path)
+
+
+@pytest.mark.parametrize('single_request', [False, True], ids=['per_facet', 'single_request'])
+def test_elasticsearch_run(run_calls, corpus, fake_es, single_request):
+    processor = es_processor(fake_es, single_request=single_request)
+    description = corpus.description()
+
+    run_calls(processor.run, [(item_id, description) for item_id in corpus.item_ids()])
+
+
+@pytest.mark.parametrize('options', [
+    {'query_planner': True},
+    {'query_planner': {'terms_max': 0, 'composite_max': 0, 'partition_size': 10}},
+    {'query_planner': {'terms_max': 0, 'composite_max': 0, 'partition_size': 10}, 'parallel_partitions': 4},
+], ids=['planned', 'partitioned', 'parallel_partitions'])
+def test_elasticsearch_planned_run(run_calls, corpus, fake_es, options):
+    processor = es_processor(fake_es, single_request=True, **options)
+    description = corpus.description()
+
+    run_calls(processor.run, [(item_id, description) for item_id in corpus.item_ids()])
+    processor.close()
+
+
+def test_elasticsearch_materialised_run(run_calls, corpus):
+    materialised_es = FakeElasticsearch()
+    materialised_es.register_script(es_aggregator.SUMMARY_SCRIPT, merge_summary)
+
+    processor = es_processor(materialised_es, summary_index='summaries')
+    processor.update_summaries(corpus.assets())
+    description = corpus.description()
+
+    run_calls(processor.run, [(item_id, description) for item_id in corpus.item_ids()])
+
+
+def test_elasticsearch_run_batch(run_calls, corpus, fake_es):
+    processor = es_processor(fake_es)
+    description = corpus.description()
+    item_ids = corpus.item_ids()
+
+    batches = [item_ids[i:i + 50] for i in range(0, len(item_ids), 50)]
+
+    run_calls(processor.run_batch, [(batch, [description] * len(batch)) for batch in batches])
+
+
+@pytest.mark.parametrize('streaming', [False, True], ids=['indexed', 'streaming'])
+def test_json_run(run_calls, corpus, assets_file, streaming):
+    processor = json_aggregator.JSONAggregator(filepath=assets_file, streaming=streaming)
+    description = corpus.description()
+
+    # Streaming reads the whole file for every item, so sample the items
+    item_ids = corpus.item_ids()[:10] if streaming else corpus.item_ids()
+
+    run_calls(processor.run, [(item_id, description) for item_id in item_ids])
+
+
+def test_sqlite_run(run_calls, corpus, assets_file, tmp_path):
+    processor = sqlite_aggregator.SQLiteAggregator(path=str(tmp_path / 'assets.db'), filepath=assets_file)
+    description = corpus.description()
+
+    # Load before timing the runs
+    processor.refresh()
+
+    run_calls(processor.run, [(item_id, description) for item_id in corpus.item_ids()])
+
+
+@pytest.mark.parametrize('filename', ['assets.parquet', 'assets.arrow'], ids=['parquet', 'arrow'])
+def test_columnar_run(run_calls, corpus, tmp_path, filename):
+    parquet_aggregator = pytest.importorskip(
+        'item_generator.plugins.processors.parquet_aggregator',
+        exc_type=ImportError
+    )
+    pytest.importorskip('pyarrow')
+
+    path = str(tmp_path / filename)
+    parquet_aggregator.ParquetAggregator.write_table(
+        corpus.assets(), path, format='arrow' if filename.endswith('.arrow') else 'parquet'
+    )
+
+    processor = parquet_aggregator.ParquetAggregator(filepath=path)
+    description = corpus.description()
+
+    run_calls(processor.run, [(item_id, description) for item_id in corpus.item_ids()])
+
+
+@pytest.mark.parametrize('summary_cache', [False, True], ids=['uncached', 'summary_cache'])
+def test_process_file(run_calls, corpus, fake_es, tmp_path, summary_cache):
+    descriptions = tmp_path / 'descriptions'
+    descriptions.mkdir()
+    (descriptions / 'synthetic.yml').write_text(corpus.description_yaml())
+
+    conf = {
+        'item_descriptions': {'root_directory': str(descriptions)},
+        'outputs': [{'name': 'standard_out'}],
+    }
+
+    if summary_cache:
+        conf['summary_cache'] = {'maxsize': corpus.items, 'ttl': 300}
+
+    extractor = FacetExtractor(conf)
+
+    processor = es_processor(fake_es, single_request=True)
+    extractor._load_processor = lambda: processor
+    extractor.output = lambda filepath, source_media, data, namespace=None, **kwargs: None
+
+    def process(filepath, item_id):
+        extractor.process_file(filepath, StorageType.POSIX, item_id=item_id)
+
+    run_calls(process, [(filepath, item_id) for filepath, item_id, _ in corpus.files()])
@@ -0,0 +1,234 @@
+# encoding: utf-8
+"""
+Summary Cache
+-------------
+
+Caches the output of the aggregation processor so that files which share an
+``item_id`` do not repeat the same aggregation.
+
+Configuration
+-------------
+
+.. code-block:: yaml
+
+    summary_cache:
+        # lru or ttl. Both expire summaries after the ttl and evict the
+        # least recently used once full
+        policy: lru
+        # Maximum number of cached summaries
+        maxsize: 1000
+        # Required. Seconds before a summary expires, as new assets for an
+        # item do not change the cache key
+        ttl: 300
+        # Optional memory budget in bytes. Replaces maxsize as the limit.
+        max_memory: 104857600
+        # Optional SQLite file so summaries survive restarts
+        path: /path/to/summaries.db
+
+"""
+__author__ = 'Richard Smith'
+__date__ = '18 Oct 2026'
+__copyright__ = 'Copyright 2018 United Kingdom Research and Innovation'
+__license__ = 'BSD - see LICENSE file in top-level package directory'
+__contact__ = 'richard.d.smith@stfc.ac.uk'
+
+import copy
+import json
+import logging
+import sqlite3
+import threading
+import time
+from contextlib import closing
+from typing import Dict, Optional
+
+from asset_scanner.core.item_describer import ItemDescription
+from asset_scanner.core.utils import generate_id
+from cachetools import TTLCache
+
+from item_generator.core.plan import PlanCache
+
+LOGGER = logging.getLogger(__name__)
+
+
+def summary_size(summaries: Dict) -> int:
+    """
+    Approximate the memory used by a summary from its serialised size
+    """
+    return len(json.dumps(summaries, default=str))
+
+
+class SummaryCache:
+    """
+    Cache of summaries keyed by ``item_id`` and the facets of the compiled plan.
+
+    Summaries are held in an in-memory TTL cache, optionally backed
+    by a SQLite store. Cached summaries are copied on the way out so that
+    changes made downstream do not leak back into the cache.
+    """
+
+    def __init__(self,
+                 policy: str = 'lru',
+                 maxsize: int = 1000,
+                 ttl: Optional[float] = None,
+                 max_memory: Optional[int] = None,
+                 path: Optional[str] = None):
+        """
+        :param policy: Eviction policy. ``lru`` or ``ttl``
+        :param maxsize: Maximum number of entries
+        :param ttl: Time to live in seconds. Required
+        :param max_memory: Memory budget in bytes, replaces ``maxsize``
+        :param path: Path to a SQLite file for a persistent store
+        """
+        if policy not in ('lru', 'ttl'):
+            raise ValueError(f'Unknown summary cache policy: {policy}')
+
+        if not ttl:
+            # Summaries would outlive any assets added to the item
+            raise ValueError('The summary cache requires a ttl')
+
+        cache_kwargs = {'maxsize': maxsize}
+
+        if max_memory:
+            cache_kwargs = {'maxsize': max_memory, 'getsizeof': summary_size}
+
+        # TTLCache also evicts the least recently used summary once full
+        self.cache = TTLCache(ttl=ttl, **cache_kwargs)
+
+        self.ttl = ttl
+        self.path = path
+        self.plans = PlanCache()
+        self.lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.disk_hits = 0
+
+        if path:
+            with closing(self._connect()) as conn, conn:
+                conn.execute(
+                    'CREATE TABLE IF NOT EXISTS summaries '
+                    '(key TEXT PRIMARY KEY, value TEXT NOT NULL, created REAL NOT NULL)'
+                )
+                conn.execute('DELETE FROM summaries WHERE created < ?', (time.time() - ttl,))
+
+    @classmethod
+    def from_conf(cls, conf: Optional[Dict]) -> Optional['SummaryCache']:
+        """
+        Build the cache from the ``summary_cache`` configuration section
+
+        :param conf: Configuration section. The cache is disabled if empty
+        """
+        if not conf:
+            return
+
+        return cls(**conf)
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path, timeout=30)
+
+    def key(self, item_id: str, description: ItemDescription) -> str:
+        """
+        Cache key for the item. Includes the facets of the compiled plan as
+        these determine the content of the summary.
+
+        :param item_id: Item ID
+        :param description: ItemDescription used to generate the summary
+        """
+        facets = self.plans.get(description).facets
+        return f'{item_id}:{generate_id(",".join(facets))}'
+
+    def get(self, item_id: str, description: ItemDescription) -> Optional[Dict]:
+        """
+        Return a copy of the cached summary, or None if not cached
+
+        :param item_id: Item ID
+        :param description: ItemDescription used to generate the summary
+        """
+        key = self.key(item_id, description)
+
+        with self.lock:
+            summaries = self.cache.get(key)
+
+            if summaries is not None:
+                self.hits += 1
+                return copy.deepcopy(summaries)
+
+        if self.path:
+            summaries = self._get_disk(key)
+
+            if summaries is not None:
+                with self.lock:
+                    self.hits += 1
+                    self.disk_hits += 1
+                    self._set_memory(key, summaries)
+                return copy.deepcopy(summaries)
+
+        with self.lock:
+            self.misses += 1
+
+    def set(self, item_id: str, description: ItemDescription, summaries: Dict) -> None:
+        """
+        Store a copy of the summary
+
+        :param item_id: Item ID
+        :param description: ItemDescription used to generate the summary
+        :param summaries: Output from the aggregation processor
+        """
+        key = self.key(item_id, description)
+        summaries = copy.deepcopy(summaries)
+
+        with self.lock:
+            self._set_memory(key, summaries)
+
+        if self.path:
+            with closing(self._connect()) as conn, conn:
+                conn.execute(
+                    'INSERT OR REPLACE INTO summaries (key, value, created) VALUES (?, ?, ?)',
+                    (key, json.dumps(summaries), time.time())
+                )
+
+    def _set_memory(self, key: str, summaries: Dict) -> None:
+        try:
+            self.cache[key] = summaries
+        except ValueError:
+            # Larger than the whole memory budget
+            LOGGER.debug(f'Summary too large to cache: {key}')
+
+    def _get_disk(self, key: str) -> Optional[Dict]:
+        with closing(self._connect()) as conn:
+            row = conn.execute('SELECT value, created FROM summaries WHERE key = ?', (key,)).fetchone()
+
+        if row is None:
+            return
+
+        value, created = row
+
+        if self.ttl and time.time() - created > self.ttl:
+            return
+
+        return json.loads(value)
+
+    def clear(self) -> None:
+        """
+        Remove all cached summaries, including the on-disk store
+        """
+        with self.lock:
+            self.cache.clear()
+
+        if self.path:
+            with closing(self._connect()) as conn, conn:
+                conn.execute('DELETE FROM summaries')
+
+    def stats(self) -> Dict:
+        """
+        Cache counters
+        """
+        lookups = self.hits + self.misses
+
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'disk_hits': self.disk_hits,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'size': len(self.cache),
+        }
@@ -0,0 +1,121 @@
+# encoding: utf-8
+"""
+Item Coalescing
+---------------
+
+Buffers the files passing through ``process_file`` by ``item_id`` so that the
+summaries are computed, and the item is output, once per window rather than
+once per file. Header messages are still output for every file.
+
+A window is flushed when it holds ``max_files`` files or when the oldest
+file in it is ``max_age`` seconds old. The age is checked as files arrive
+and by ``FacetExtractor.poll``, so a window is not held open when no more
+files arrive. The :py:class:`~item_generator.core.executor.BatchExecutor`
+polls while it waits for chunks in ``thread`` mode, callers of
+``process_file`` should poll at least every ``max_age`` seconds. Any
+remaining items are flushed when the extractor is closed.
+
+Coalescing applies to ``process_file``. ``process_files`` already outputs
+items from a batch summary and ``aprocess_file`` is not buffered.
+
+Configuration
+-------------
+
+.. code-block:: yaml
+
+    coalesce:
+        max_files: 1000
+        max_age: 5
+
+"""
+__author__ = 'Richard Smith'
+__date__ = '18 Oct 2026'
+__copyright__ = 'Copyright 2018 United Kingdom Research and Innovation'
+__license__ = 'BSD - see LICENSE file in top-level package directory'
+__contact__ = 'richard.d.smith@stfc.ac.uk'
+
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+from asset_scanner.core.item_describer import ItemDescription
+from asset_scanner.types.source_media import StorageType
+
+PendingItems = Dict[str, Tuple[str, StorageType, ItemDescription]]
+
+
+class ItemCoalescer:
+    """
+    Holds the items waiting to be output in the current window
+    """
+
+    def __init__(self, max_files: int = 1000, max_age: float = 5.0):
+        """
+        :param max_files: Number of files which fill the window
+        :param max_age: Seconds after the first file when the window is flushed
+        """
+        self.max_files = max_files
+        self.max_age = max_age
+
+        self.lock = threading.Lock()
+        self.pending: PendingItems = {}
+        self.files = 0
+        self.window_start = None
+
+    @classmethod
+    def from_conf(cls, conf: Optional[Dict]) -> Optional['ItemCoalescer']:
+        """
+        Build the coalescer from the ``coalesce`` configuration section
+
+        :param conf: Configuration section. Coalescing is disabled if empty
+        """
+        if not conf:
+            return
+
+        return cls(**conf)
+
+    def add(self,
+            item_id: str,
+            filepath: str,
+            source_media: StorageType,
+            description: ItemDescription) -> Optional[PendingItems]:
+        """
+        Add a file to the window. The latest file for each item is kept.
+
+        :return: The items to output if the window is full
+        """
+        with self.lock:
+            self.pending[item_id] = (filepath, source_media, description)
+            self.files += 1
+
+            if self.window_start is None:
+                self.window_start = time.monotonic()
+
+            if self.files >= self.max_files or time.monotonic() - self.window_start >= self.max_age:
+                return self._drain()
+
+    def poll(self) -> Optional[PendingItems]:
+        """
+        Check the age of the window without adding a file
+
+        :return: The items to output if the window is ``max_age`` seconds old
+        """
+        with self.lock:
+            if self.window_start is not None and time.monotonic() - self.window_start >= self.max_age:
+                return self._drain()
+
+    def drain(self) -> PendingItems:
+        """
+        Empty the window and return the pending items
+        """
+        with self.lock:
+            return self._drain()
+
+    def _drain(self) -> PendingItems:
+        pending = self.pending
+
+        self.pending = {}
+        self.files = 0
+        self.window_start = None
+
+        return pending
@@ -0,0 +1,336 @@
+# encoding: utf-8
+"""
+Header Deduplication
+--------------------
+
+Stores which collection IDs have recently had a header output, so that
+downstream consumers can skip duplicate header messages.
+
+Three backends are available. Each refreshes the TTL of a key when it is
+seen again, so a collection which keeps receiving files stays deduplicated.
+
+``memory``
+    In-process TTL/LRU cache. The default.
+
+``sqlite``
+    SQLite file shared by all the workers on a node.
+
+``redis``
+    Redis, or any server which speaks the Redis protocol, shared by all the
+    workers. Requires the ``redis`` package. Capacity is managed by the TTL
+    and the memory policy of the server.
+
+Configuration
+-------------
+
+``header_deduplication: True`` enables the ``memory`` backend, sized by
+``CAHCE_MAX_SIZE`` and ``CACHE_MAX_AGE``. A dictionary selects the backend:
+
+.. code-block:: yaml
+
+    header_deduplication:
+        backend: sqlite
+        maxsize: 10000
+        ttl: 300
+        # sqlite
+        path: /tmp/item_generator_headers.db
+        # redis
+        url: redis://localhost:6379/0
+        prefix: 'item_generator:header:'
+
+"""
+__author__ = 'Richard Smith'
+__date__ = '18 Oct 2026'
+__copyright__ = 'Copyright 2018 United Kingdom Research and Innovation'
+__license__ = 'BSD - see LICENSE file in top-level package directory'
+__contact__ = 'richard.d.smith@stfc.ac.uk'
+
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import Dict, Optional
+
+from cachetools import TTLCache
+
+
+class BaseDeduplicator(ABC):
+    """
+    Base class for the deduplication backends. Records hit and miss counts.
+    """
+
+    def __init__(self, maxsize: int = 1000, ttl: float = 30):
+        """
+        :param maxsize: Maximum number of keys held
+        :param ttl: Seconds a key is remembered for
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.counter_lock = threading.Lock()
+
+    def seen(self, key: str) -> bool:
+        """
+        Record the key and return whether it had already been seen
+        within the TTL
+
+        :param key: Collection ID
+        """
+        hit = self.check_and_set(key)
+
+        with self.counter_lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+        return hit
+
+    @abstractmethod
+    def check_and_set(self, key: str) -> bool:
+        """
+        Atomically record the key and return whether it was already present
+        """
+        pass
+
+    def state(self, since: Optional[float] = None) -> Dict[str, float]:
+        """
+        Keys held locally with the time they expire, which may be passed to
+        other workers. Shared backends return nothing as the state is
+        already shared.
+
+        :param since: Only the keys recorded at or after this ``time.time()``
+        """
+        return {}
+
+    def add(self, state: Dict[str, float]) -> None:
+        """
+        Record keys seen by another worker. Each key keeps the expiry it was
+        given by that worker.
+
+        :param state: Expiry time of each key, from ``state``
+        """
+        pass
+
+    def close(self) -> None:
+        pass
+
+    def stats(self) -> Dict:
+        """
+        Deduplication counters
+        """
+        lookups = self.hits + self.misses
+
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+        }
+
+
+class MemoryDeduplicator(BaseDeduplicator):
+    """
+    In-process TTL cache. Least recently used keys are evicted when full.
+    The expiry time of each key is stored as its value, so keys added from
+    other workers expire when they would have done in that worker.
+    """
+
+    def __init__(self, maxsize: int = 1000, ttl: float = 30):
+        super().__init__(maxsize, ttl)
+        self.cache = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.lock = threading.Lock()
+
+    def check_and_set(self, key: str) -> bool:
+        now = time.time()
+
+        with self.lock:
+            expires = self.cache.get(key)
+            self.cache[key] = now + self.ttl
+            return expires is not None and expires > now
+
+    def state(self, since: Optional[float] = None) -> Dict[str, float]:
+        now = time.time()
+
+        with self.lock:
+            return {
+                key: expires for key, expires in self.cache.items()
+                if expires > now and (since is None or expires - self.ttl >= since)
+            }
+
+    def add(self, state: Dict[str, float]) -> None:
+        now = time.time()
+
+        with self.lock:
+            for key, expires in state.items():
+                if expires > max(now, self.cache.get(key, 0)):
+                    self.cache[key] = expires
+
+
+class SQLiteDeduplicator(BaseDeduplicator):
+    """
+    SQLite store shared by the processes on a node. Expired keys, and the
+    keys closest to expiry when over capacity, are pruned periodically.
+    Each process keeps one connection, shared by its threads.
+    """
+
+    PRUNE_INTERVAL = 100
+
+    def __init__(self, path: str, maxsize: int = 1000, ttl: float = 30):
+        super().__init__(maxsize, ttl)
+        self.path = path
+        self.inserts = 0
+        self.lock = threading.Lock()
+        self._conn = None
+        self._pid = None
+
+        with self.lock:
+            conn = self.connection()
+            conn.execute('CREATE TABLE IF NOT EXISTS headers (key TEXT PRIMARY KEY, expires REAL NOT NULL)')
+            conn.execute('CREATE INDEX IF NOT EXISTS headers_expires ON headers (expires)')
+
+    def connection(self) -> sqlite3.Connection:
+        """
+        Connection for the current process. A connection inherited from the
+        parent of a forked process is not used, as SQLite connections must
+        not cross a fork. Call with ``lock`` held.
+        """
+        if self._conn is None or self._pid != os.getpid():
+            self._conn = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+            self._pid = os.getpid()
+
+        return self._conn
+
+    def check_and_set(self, key: str) -> bool:
+        now = time.time()
+
+        with self.lock:
+            conn = self.connection()
+
+            # Take the write lock so the check and set are atomic between processes
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                row = conn.execute('SELECT expires FROM headers WHERE key = ?', (key,)).fetchone()
+                hit = row is not None and row[0] > now
+
+                conn.execute(
+                    'INSERT OR REPLACE INTO headers (key, expires) VALUES (?, ?)',
+                    (key, now + self.ttl)
+                )
+
+                self.inserts += 1
+                if self.inserts % self.PRUNE_INTERVAL == 0:
+                    self.prune(conn, now)
+
+                conn.execute('COMMIT')
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+
+        return hit
+
+    def close(self) -> None:
+        with self.lock:
+            if self._conn is not None and self._pid == os.getpid():
+                self._conn.close()
+            self._conn = None
+
+    def prune(self, conn: sqlite3.Connection, now: float) -> None:
+        """
+        Remove expired keys and keep the store within ``maxsize``
+        """
+        conn.execute('DELETE FROM headers WHERE expires <= ?', (now,))
+
+        count, = conn.execute('SELECT COUNT(*) FROM headers').fetchone()
+
+        if count > self.maxsize:
+            conn.execute(
+                'DELETE FROM headers WHERE key IN (SELECT key FROM headers ORDER BY expires LIMIT ?)',
+                (count - self.maxsize,)
+            )
+
+
+class RedisDeduplicator(BaseDeduplicator):
+    """
+    Redis store shared by all workers. ``SET NX EX`` makes the check and set
+    atomic, and an ``EXPIRE`` in the same pipeline refreshes the TTL when the
+    key already exists, in one round trip.
+    """
+
+    def __init__(self,
+                 url: str = 'redis://localhost:6379/0',
+                 maxsize: int = 1000,
+                 ttl: float = 30,
+                 prefix: str = 'item_generator:header:',
+                 client=None):
+        """
+        :param url: Redis connection URL
+        :param prefix: Prefix for the keys
+        :param client: Existing client. Must support ``pipeline`` with ``set(key, value, nx=, ex=)`` and ``expire``
+        """
+        super().__init__(maxsize, ttl)
+        self.prefix = prefix
+
+        if client is None:
+            try:
+                import redis
+            except ImportError:
+                raise ImportError(
+                    'The redis header deduplication backend requires the redis package. '
+                    'Install with: pip install redis'
+                )
+
+            client = redis.Redis.from_url(url)
+
+        self.client = client
+
+    def check_and_set(self, key: str) -> bool:
+        key = f'{self.prefix}{key}'
+        ttl = max(1, int(self.ttl))
+
+        pipeline = self.client.pipeline(transaction=False)
+        pipeline.set(key, 1, nx=True, ex=ttl)
+        pipeline.expire(key, ttl)
+
+        # set returns None when the key already exists
+        created, _ = pipeline.execute()
+        return not created
+
+    def close(self) -> None:
+        close = getattr(self.client, 'close', None)
+        if close:
+            close()
+
+
+BACKENDS = {
+    'memory': MemoryDeduplicator,
+    'sqlite': SQLiteDeduplicator,
+    'redis': RedisDeduplicator,
+}
+
+
+def load_deduplicator(conf: dict) -> Optional[BaseDeduplicator]:
+    """
+    Build the header deduplicator from the extractor configuration
+
+    :param conf: Extractor configuration
+    """
+    dedup_conf = conf.get('header_deduplication', False)
+
+    if not dedup_conf:
+        return
+
+    if dedup_conf is True:
+        return MemoryDeduplicator(
+            maxsize=conf.get('CAHCE_MAX_SIZE', 5),
+            ttl=conf.get('CACHE_MAX_AGE', 30)
+        )
+
+    dedup_conf = dict(dedup_conf)
+    backend = dedup_conf.pop('backend', 'memory')
+
+    if backend not in BACKENDS:
+        raise ValueError(f'Unknown header deduplication backend: {backend}')
+
+    return BACKENDS[backend](**dedup_conf)
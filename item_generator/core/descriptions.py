@@ -0,0 +1,189 @@
+# encoding: utf-8
+"""
+Description Index
+-----------------
+
+Precompiled lookup from path prefix to the merged item description.
+
+Building :py:class:`ItemDescriptions` walks and parses every yaml file under
+the root directory, which is repeated by every worker process. The prefix
+index stores the merged description for each path listed in the yaml files
+in a single SQLite file. Workers open the file at startup, read it through a
+memory map and only load the descriptions for the prefixes they use.
+
+Build the index with:
+
+.. code-block:: bash
+
+    build_description_index /path/to/descriptions descriptions.db
+
+Configuration
+-------------
+
+.. code-block:: yaml
+
+    item_descriptions:
+        # Used to build the index if it does not exist
+        root_directory: /path/to/descriptions
+        index: /path/to/descriptions.db
+
+"""
+__author__ = 'Richard Smith'
+__date__ = '18 Oct 2026'
+__copyright__ = 'Copyright 2018 United Kingdom Research and Innovation'
+__license__ = 'BSD - see LICENSE file in top-level package directory'
+__contact__ = 'richard.d.smith@stfc.ac.uk'
+
+import os
+import pickle
+import sqlite3
+import threading
+from contextlib import closing
+from typing import Dict, List, Optional
+
+import yaml
+from asset_scanner.core.item_describer import ItemDescription, ItemDescriptions
+from asset_scanner.core.utils import load_description_files
+
+# Bytes of the index file mapped into memory
+MMAP_SIZE = 256 * 1024 * 1024
+
+
+def path_prefixes(filepath: str) -> List[str]:
+    """
+    All the prefixes of the path, including the path itself, in the form
+    stored in the index. The root is stored as an empty string.
+
+    :param filepath: Path to the file
+    """
+    if not filepath[0] == '/':
+        filepath = f'/{filepath}'
+
+    parts = filepath.rstrip('/').split('/')
+
+    return ['/'.join(parts[:i]) for i in range(1, len(parts) + 1)]
+
+
+def build_index(path: str, root_directory: str) -> None:
+    """
+    Write the prefix index for the description files. The index is written
+    to a temporary file and moved into place so that readers never see a
+    partial index.
+
+    :param path: Path to write the index to
+    :param root_directory: Root of the yaml description files
+    """
+    descriptions = ItemDescriptions(root_directory)
+
+    prefixes = set()
+    for file in load_description_files(root_directory):
+        with open(file) as reader:
+            data = yaml.safe_load(reader) or {}
+
+        prefixes.update(dataset.rstrip('/') for dataset in data.get('paths', []))
+
+    if not prefixes:
+        raise ValueError(f'No description paths found under {root_directory}')
+
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+
+    try:
+        with closing(sqlite3.connect(tmp_path)) as conn:
+            conn.execute('CREATE TABLE prefixes (path TEXT PRIMARY KEY, config BLOB NOT NULL)')
+
+            for prefix in sorted(prefixes):
+                nodes = descriptions.tree.search_all(prefix or '/')
+                config = descriptions.load_config(*[node.description_file for node in nodes])
+
+                conn.execute(
+                    'INSERT INTO prefixes (path, config) VALUES (?, ?)',
+                    (prefix, pickle.dumps(config))
+                )
+
+            conn.commit()
+
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+class DescriptionIndex:
+    """
+    Read only prefix index. Provides the ``get_description`` interface of
+    :py:class:`ItemDescriptions`.
+    """
+
+    def __init__(self, path: str):
+        """
+        :param path: Path to the index built by :py:func:`build_index`
+        """
+        if not os.path.exists(path):
+            raise FileNotFoundError(f'Description index not found: {path}')
+
+        self.path = path
+        self.lock = threading.Lock()
+        self.descriptions: Dict[str, ItemDescription] = {}
+
+        self.conn = sqlite3.connect(f'file:{path}?mode=ro', uri=True, check_same_thread=False)
+        self.conn.execute(f'PRAGMA mmap_size = {MMAP_SIZE}')
+
+    @classmethod
+    def from_conf(cls, conf: Dict) -> 'DescriptionIndex':
+        """
+        Open the index from the ``item_descriptions`` configuration section,
+        building it from ``root_directory`` first if it does not exist
+
+        :param conf: Configuration section
+        """
+        path = conf['index']
+
+        if not os.path.exists(path) and conf.get('root_directory'):
+            build_index(path, conf['root_directory'])
+
+        return cls(path)
+
+    def lookup(self, filepath: str) -> Optional[str]:
+        """
+        Most specific prefix in the index which matches the path
+
+        :param filepath: Path to the file
+        """
+        prefixes = path_prefixes(filepath)
+
+        with self.lock:
+            row = self.conn.execute(
+                f'SELECT path FROM prefixes WHERE path IN ({",".join("?" * len(prefixes))}) '
+                f'ORDER BY length(path) DESC LIMIT 1',
+                prefixes
+            ).fetchone()
+
+        return row[0] if row else None
+
+    def get_description(self, filepath: str) -> ItemDescription:
+        """
+        Get the merged description for the given file path. Descriptions are
+        shared between all the paths with the same prefix.
+
+        :param filepath: Path for which to retrieve the description
+        """
+        prefix = self.lookup(filepath)
+
+        if prefix is None:
+            # Matches ItemDescriptions when no description files match the path
+            return ItemDescription(**{})
+
+        with self.lock:
+            description = self.descriptions.get(prefix)
+
+            if description is None:
+                config, = self.conn.execute(
+                    'SELECT config FROM prefixes WHERE path = ?', (prefix,)
+                ).fetchone()
+                description = ItemDescription(**pickle.loads(config))
+                self.descriptions[prefix] = description
+
+        return description
+
+    def close(self) -> None:
+        self.conn.close()
@@ -0,0 +1,327 @@
+# encoding: utf-8
+"""
+Batch Executor
+--------------
+
+Runs many files through a :py:class:`FacetExtractor` concurrently.
+
+``thread`` mode shares one extractor between a pool of threads and suits the
+I/O bound aggregation queries. ``process`` mode initialises one extractor in
+each worker process. Workers return the collection IDs they output headers
+for during each chunk, with the time the IDs expire, and these are passed to
+the workers handling later chunks. The IDs keep their original expiry and are
+dropped once expired. Shared ``sqlite`` and ``redis`` deduplication backends
+return nothing, so no state is passed between workers.
+
+Errors are collected per file and do not stop the batch.
+
+Configuration
+-------------
+
+.. code-block:: yaml
+
+    executor:
+        # thread or process
+        mode: thread
+        workers: 8
+        # Number of files sent to a worker at a time
+        chunk_size: 100
+
+"""
+__author__ = 'Richard Smith'
+__date__ = '18 Oct 2026'
+__copyright__ = 'Copyright 2018 United Kingdom Research and Innovation'
+__license__ = 'BSD - see LICENSE file in top-level package directory'
+__contact__ = 'richard.d.smith@stfc.ac.uk'
+
+import logging
+import time
+from array import array
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from itertools import islice
+from multiprocessing.util import Finalize
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from asset_scanner.types.source_media import StorageType
+
+from item_generator.core.facet_extractor import FacetExtractor
+from item_generator.core.output_buffer import OutputFlushError
+
+LOGGER = logging.getLogger(__name__)
+
+FileRecord = Tuple[str, str, StorageType]
+
+# Extractor for the current worker process
+_WORKER_EXTRACTOR = None
+
+
+class FileError:
+    """
+    Error raised while processing a single file
+    """
+
+    def __init__(self, filepath: str, item_id: str, error: str):
+        self.filepath = filepath
+        self.item_id = item_id
+        self.error = error
+
+    def __repr__(self):
+        return f'FileError({self.filepath!r}, {self.item_id!r}, {self.error!r})'
+
+
+class BatchResult:
+    """
+    Summary of a batch run
+    """
+
+    def __init__(self):
+        self.processed = 0
+        self.errors: List[FileError] = []
+        self.latencies = array('d')
+        self.start = time.perf_counter()
+
+    @property
+    def failed(self) -> int:
+        return len(self.errors)
+
+    @property
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.start
+
+    @property
+    def rate(self) -> float:
+        """
+        Files processed per second
+        """
+        elapsed = self.elapsed
+        return self.processed / elapsed if elapsed else 0.0
+
+    def percentile(self, percent: float, recent: Optional[int] = None) -> Optional[float]:
+        """
+        Percentile of the per file latency in seconds
+
+        :param percent: Percentile in the range 0-100
+        :param recent: Only use the most recent number of files
+        """
+        latencies = self.latencies[-recent:] if recent else self.latencies
+
+        if not latencies:
+            return
+
+        ordered = sorted(latencies)
+        index = round(percent / 100 * (len(ordered) - 1))
+        return ordered[index]
+
+
+def process_chunk(extractor: FacetExtractor,
+                  chunk: List[FileRecord],
+                  header_state: Optional[Dict[str, float]] = None) -> Tuple[int, List[FileError], Dict[str, float], array]:
+    """
+    Process a chunk of files, catching the errors for each file
+
+    :param extractor: Extractor to process the files with
+    :param chunk: List of ``(filepath, item_id, source_media)``
+    :param header_state: Expiry time of collection IDs already output by other workers
+    :return: number processed, errors, collection IDs output during the chunk, latencies
+    """
+    chunk_start = time.time()
+
+    if header_state:
+        extractor.merge_header_state(header_state)
+
+    processed = 0
+    errors = []
+    latencies = array('d')
+
+    for filepath, item_id, source_media in chunk:
+        start = time.perf_counter()
+        try:
+            extractor.process_file(filepath, StorageType(source_media), item_id=item_id)
+            processed += 1
+            latencies.append(time.perf_counter() - start)
+        except Exception as e:
+            LOGGER.error(f'Failed to process: {filepath}', exc_info=True)
+            errors.append(FileError(filepath, item_id, repr(e)))
+
+    return processed, errors, extractor.get_header_state(since=chunk_start), latencies
+
+
+def _init_worker(conf: dict) -> None:
+    """
+    Initialise the extractor in a worker process
+    """
+    global _WORKER_EXTRACTOR
+    _WORKER_EXTRACTOR = FacetExtractor(conf)
+
+    # atexit handlers are not run in forked workers, multiprocessing finalizers are
+    Finalize(_WORKER_EXTRACTOR, _close_worker, exitpriority=10)
+
+
+def _close_worker() -> None:
+    """
+    Close the extractor as the worker process exits
+    """
+    try:
+        _WORKER_EXTRACTOR.close()
+    except Exception:
+        LOGGER.error('Failed to close the worker extractor', exc_info=True)
+
+
+def _process_chunk_in_worker(chunk: List[FileRecord], header_state: Dict[str, float]):
+    processed, errors, header_state, latencies = process_chunk(_WORKER_EXTRACTOR, chunk, header_state)
+
+    # Worker processes are not closed, so output any coalesced items with the chunk
+    try:
+        _WORKER_EXTRACTOR.flush()
+    except OutputFlushError as e:
+        # Report each file with output still waiting, which may include files from earlier chunks
+        LOGGER.error('Failed to write buffered output', exc_info=True)
+        item_ids = {filepath: item_id for filepath, item_id, _ in chunk}
+        errors.extend(FileError(filepath, item_ids.get(filepath), repr(e.error)) for filepath in e.filepaths)
+    except Exception as e:
+        LOGGER.error('Failed to output coalesced items', exc_info=True)
+        errors.append(FileError(chunk[-1][0], chunk[-1][1], repr(e)))
+
+    return processed, errors, header_state, latencies
+
+
+class BatchExecutor:
+    """
+    Run files through the :py:class:`FacetExtractor` with a thread or process pool
+    """
+
+    def __init__(self,
+                 conf: dict,
+                 mode: str = 'thread',
+                 workers: int = 4,
+                 chunk_size: int = 100,
+                 extractor: Optional[FacetExtractor] = None):
+        """
+        :param conf: Extractor configuration
+        :param mode: ``thread`` or ``process``
+        :param workers: Number of threads or processes
+        :param chunk_size: Number of files sent to a worker at a time
+        :param extractor: Existing extractor to use in ``thread`` mode
+        """
+        if mode not in ('thread', 'process'):
+            raise ValueError(f'Unknown executor mode: {mode}')
+
+        self.conf = conf
+        self.mode = mode
+        self.workers = workers
+        self.chunk_size = chunk_size
+        self.extractor = extractor
+        self.header_state: Dict[str, float] = {}
+
+    @classmethod
+    def from_conf(cls, conf: dict, **kwargs) -> 'BatchExecutor':
+        """
+        Build the executor from the ``executor`` section of the configuration
+
+        :param conf: Extractor configuration
+        :param kwargs: Override the configured options
+        """
+        options = dict(conf.get('executor', {}))
+        options.update({k: v for k, v in kwargs.items() if v is not None})
+        return cls(conf, **options)
+
+    def merge_header_state(self, header_state: Dict[str, float]) -> None:
+        """
+        Add the collection IDs returned by a worker, keeping the latest expiry
+        """
+        for collection_id, expires in header_state.items():
+            if expires > self.header_state.get(collection_id, 0):
+                self.header_state[collection_id] = expires
+
+    def live_header_state(self) -> Dict[str, float]:
+        """
+        Drop the expired collection IDs and return the rest
+        """
+        now = time.time()
+        self.header_state = {
+            collection_id: expires
+            for collection_id, expires in self.header_state.items() if expires > now
+        }
+        return self.header_state
+
+    def run(self,
+            files: Iterable[FileRecord],
+            callback: Optional[Callable[[BatchResult], None]] = None) -> BatchResult:
+        """
+        Process the files. At most two chunks per worker are queued at a
+        time so the input can be a stream.
+
+        :param files: Iterable of ``(filepath, item_id, source_media)``
+        :param callback: Called with the running result as each chunk completes
+        """
+        result = BatchResult()
+        files = iter(files)
+
+        if self.mode == 'thread':
+            owns_extractor = self.extractor is None
+            extractor = self.extractor or FacetExtractor(self.conf)
+            pool = ThreadPoolExecutor(max_workers=self.workers)
+
+            def submit(chunk):
+                return pool.submit(process_chunk, extractor, chunk)
+
+            # Wake up to output coalesced items and buffered messages which have expired
+            poll_interval = min((
+                component.max_age for component in (extractor.coalescer, extractor.output_buffer) if component
+            ), default=None)
+        else:
+            owns_extractor = False
+            extractor = None
+            poll_interval = None
+            pool = ProcessPoolExecutor(
+                max_workers=self.workers,
+                initializer=_init_worker,
+                initargs=(self.conf,)
+            )
+
+            def submit(chunk):
+                return pool.submit(_process_chunk_in_worker, chunk, self.live_header_state())
+
+        pending = set()
+
+        try:
+            with pool:
+                while True:
+                    while len(pending) < self.workers * 2:
+                        chunk = list(islice(files, self.chunk_size))
+                        if not chunk:
+                            break
+                        pending.add(submit(chunk))
+
+                    if not pending:
+                        break
+
+                    done, pending = wait(pending, timeout=poll_interval, return_when=FIRST_COMPLETED)
+
+                    if poll_interval:
+                        try:
+                            extractor.poll()
+                        except Exception:
+                            LOGGER.error('Failed to output expired items and messages', exc_info=True)
+
+                    for future in done:
+                        processed, errors, header_state, latencies = future.result()
+                        result.processed += processed
+                        result.errors.extend(errors)
+                        result.latencies.extend(latencies)
+                        self.merge_header_state(header_state)
+
+                    if callback:
+                        callback(result)
+        finally:
+            if owns_extractor:
+                extractor.close()
+            elif extractor:
+                # The caller keeps the extractor open, so output what is waiting now
+                try:
+                    extractor.flush()
+                except OutputFlushError as e:
+                    LOGGER.error('Failed to write buffered output', exc_info=True)
+                    result.errors.extend(FileError(filepath, None, repr(e.error)) for filepath in e.filepaths)
+
+        return result
@@ -9,6 +9,49 @@ Configuration
 
     item_descriptions:
         root_directory: /path/to/root/descriptions
+        # Optional precompiled prefix index loaded instead of the yaml files.
+        # See :py:mod:`item_generator.core.descriptions`
+        index: /path/to/descriptions.db
+        # Number of directories held in the description cache. 0 to disable
+        cache_size: 10000
+
+    # Output header messages flagged for deduplication.
+    # See :py:mod:`item_generator.core.deduplication`
+    header_deduplication:
+        backend: memory
+        maxsize: 1000
+        ttl: 30
+
+    # Number of files to aggregate together in ``process_files``
+    batch_size: 500
+
+    # Maximum number of files in flight in ``aprocess_files``
+    max_items_in_flight: 100
+
+    # Optional window to output each item once for many files.
+    # See :py:mod:`item_generator.core.coalesce`
+    coalesce:
+        max_files: 1000
+        max_age: 5
+
+    # Optional cache of summaries by item_id.
+    # See :py:mod:`item_generator.core.cache`
+    summary_cache:
+        policy: lru
+        maxsize: 1000
+        ttl: 300
+
+    # Optional buffer to write outputs in batches.
+    # See :py:mod:`item_generator.core.output_buffer`
+    output_buffer:
+        max_documents: 500
+        max_bytes: 5000000
+        max_age: 5
+
+    # Optional timing and counters. See :py:mod:`item_generator.core.metrics`
+    metrics:
+        enabled: True
+        log_interval: 60
 
 """
 __author__ = 'Richard Smith'
@@ -17,35 +60,108 @@ __copyright__ = 'Copyright 2018 United Kingdom Research and Innovation'
 __license__ = 'BSD - see LICENSE file in top-level package directory'
 __contact__ = 'richard.d.smith@stfc.ac.uk'
 
+import asyncio
 import logging
+import posixpath
+import threading
 
 from asset_scanner.core.extractor import BaseExtractor
 from asset_scanner.core.item_describer import ItemDescription, ItemDescriptions
 from asset_scanner.core.processor import BaseProcessor
 from asset_scanner.core.utils import dict_merge, dot2dict, generate_id
 from asset_scanner.types.source_media import StorageType
+from cachetools import LRUCache
 
 from asset_scanner.plugins.extraction_methods import utils as item_utils
 
-from typing import Dict
+from item_generator.core.cache import SummaryCache
+from item_generator.core.coalesce import ItemCoalescer, PendingItems
+from item_generator.core.deduplication import load_deduplicator
+from item_generator.core.descriptions import DescriptionIndex
+from item_generator.core.metrics import Metrics
+from item_generator.core.output_buffer import OutputBuffer, OutputFlushError
+from item_generator.core.plan import ExecutionPlan, PlanCache
+
+from typing import Dict, Optional
 
 LOGGER = logging.getLogger(__name__)
 
-from typing import List
-from string import Template
-from cachetools import TTLCache
+from typing import Iterable, List, Tuple
+from itertools import islice
 
 class FacetExtractor(BaseExtractor):
 
     PROCESSOR_ENTRY_POINT = 'item_generator.processors'
 
     def __init__(self, conf: dict):
-        super().__init__(conf)
+        descriptions_conf = conf.get('item_descriptions') or {}
+
+        self.description_cache_size = descriptions_conf.get('cache_size', 10000)
+        self.description_lock = threading.Lock()
+
+        if descriptions_conf.get('index'):
+            # Skip loading the yaml files in BaseExtractor
+            super().__init__({k: v for k, v in conf.items() if k != 'item_descriptions'})
+            self.conf = conf
+            self.item_descriptions = DescriptionIndex.from_conf(descriptions_conf)
+        else:
+            super().__init__(conf)
+
         self.header_deduplication = conf.get('header_deduplication', False)
-        self.collection_id_cache = TTLCache(
-            maxsize=conf.get('CAHCE_MAX_SIZE', 5),
-            ttl=conf.get('CACHE_MAX_AGE', 30)
-        )
+        self.batch_size = conf.get('batch_size', 500)
+        self.max_items_in_flight = conf.get('max_items_in_flight', 100)
+        self.aggregation_processor = None
+        self.processor_lock = threading.Lock()
+        self.summary_cache = SummaryCache.from_conf(conf.get('summary_cache'))
+        self.coalescer = ItemCoalescer.from_conf(conf.get('coalesce'))
+        self.output_buffer = OutputBuffer.from_conf(conf.get('output_buffer'))
+        self.header_deduplicator = load_deduplicator(conf)
+        self.plans = PlanCache()
+        self.metrics = Metrics.from_conf(conf.get('metrics'))
+
+    @property
+    def item_descriptions(self):
+        return self._item_descriptions
+
+    @item_descriptions.setter
+    def item_descriptions(self, descriptions) -> None:
+        self._item_descriptions = descriptions
+        self.description_cache = LRUCache(maxsize=self.description_cache_size) if self.description_cache_size else None
+
+    def get_description(self, filepath: str) -> ItemDescription:
+        """
+        Get the description for the file. Description paths are directories,
+        so the description is cached by the directory of the file.
+
+        :param filepath: Path to the file
+        """
+        if self.description_cache is None:
+            return self.item_descriptions.get_description(filepath)
+
+        directory = posixpath.dirname(filepath)
+
+        with self.description_lock:
+            description = self.description_cache.get(directory)
+
+        if description is None:
+            self.metrics.inc('item_generator_cache_requests_total', cache='description', result='miss')
+            description = self.item_descriptions.get_description(filepath)
+
+            with self.description_lock:
+                self.description_cache[directory] = description
+        else:
+            self.metrics.inc('item_generator_cache_requests_total', cache='description', result='hit')
+
+        return description
+
+    def get_plan(self, description: ItemDescription) -> ExecutionPlan:
+        """
+        Return the compiled plan for the description.
+        See :py:mod:`item_generator.core.plan`
+
+        :param description: ItemDescription
+        """
+        return self.plans.get(description)
 
     def get_collection_id(self, description: ItemDescription, filepath: str, storage_media: StorageType) -> str:
         """Return the collection ID for the file."""
@@ -92,31 +208,189 @@ class FacetExtractor(BaseExtractor):
 
         return tags
 
+    def __enter__(self) -> 'FacetExtractor':
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """
+        Release the resources held by the extractor. Outputs any items
+        waiting in the coalescing window or the output buffer and closes
+        the aggregation processor and its connections.
+        """
+        self.flush()
+
+        with self.processor_lock:
+            processor, self.aggregation_processor = self.aggregation_processor, None
+
+        if processor and hasattr(processor, 'close'):
+            processor.close()
+
+        if self.header_deduplicator:
+            self.header_deduplicator.close()
+
+        self.metrics.close()
+
+    async def aclose(self) -> None:
+        """
+        Asynchronous version of ``close`` for use within a running event loop.
+        """
+        self.flush()
+
+        with self.processor_lock:
+            processor, self.aggregation_processor = self.aggregation_processor, None
+
+        if hasattr(processor, 'aclose'):
+            await processor.aclose()
+        elif processor and hasattr(processor, 'close'):
+            processor.close()
+
+        if self.header_deduplicator:
+            self.header_deduplicator.close()
+
+        self.metrics.close()
+
+    def get_aggregation_processor(self) -> BaseProcessor:
+        """
+        Return the aggregation processor. The processor is loaded on first
+        use and reused for the life of the extractor so that connections
+        are shared between files. The first threads to call it wait for the
+        one loading the processor, so only one is created.
+        """
+        processor = self.aggregation_processor
+
+        if processor is None:
+            with self.processor_lock:
+                processor = self.aggregation_processor
+
+                if processor is None:
+                    processor = self._load_processor()
+
+                    # Processors which record metrics share the registry of the extractor
+                    if hasattr(processor, 'metrics'):
+                        processor.metrics = self.metrics
+
+                    self.aggregation_processor = processor
+
+        return processor
+
+    def record_cache_request(self, cache: str, hit: bool) -> None:
+        """
+        Count a cache hit or miss
+
+        :param cache: Name of the cache
+        :param hit: Whether the lookup was a hit
+        """
+        self.metrics.inc('item_generator_cache_requests_total', cache=cache, result='hit' if hit else 'miss')
+
     def get_summaries(self, item_id: str, description: 'ItemDescription') -> Dict:
 
-        processor = self._load_processor()
+        if self.summary_cache:
+            metadata = self.summary_cache.get(item_id, description)
+            self.record_cache_request('summary', metadata is not None)
+            if metadata is not None:
+                return metadata
+
+        processor = self.get_aggregation_processor()
 
-        metadata = processor.run(item_id, description)
+        with self.metrics.timer('item_generator_processor_seconds', processor=type(processor).__name__):
+            metadata = processor.run(item_id, description)
+
+        if self.summary_cache:
+            self.summary_cache.set(item_id, description, metadata)
 
         return metadata
 
-    def process_file(self, filepath: str, source_media: StorageType = StorageType.POSIX, **kwargs):
+    async def aget_summaries(self, item_id: str, description: 'ItemDescription') -> Dict:
         """
-        Method to outline the processing pipeline for an individual file
-        :param filepath:
-        :param source_media:
-        :return:
+        Asynchronous version of ``get_summaries``. Uses the ``arun`` method of
+        the aggregation processor, if it has one, otherwise ``run`` is called
+        in the default executor.
+
+        :param item_id: Item ID to summarise
+        :param description: ItemDescription
         """
-        # Generate file ID
-        file_id = generate_id(filepath)
 
-        LOGGER.info(f'Processing: {filepath}')
+        if self.summary_cache:
+            metadata = self.summary_cache.get(item_id, description)
+            self.record_cache_request('summary', metadata is not None)
+            if metadata is not None:
+                return metadata
 
-        # Get dataset description file
-        description = self.item_descriptions.get_description(filepath)
+        processor = self.get_aggregation_processor()
 
-        # Get summaries - aggregated properties from assets.
-        summaries = self.get_summaries(kwargs['item_id'], description)
+        with self.metrics.timer('item_generator_processor_seconds', processor=type(processor).__name__):
+            if hasattr(processor, 'arun'):
+                metadata = await processor.arun(item_id, description)
+            else:
+                loop = asyncio.get_running_loop()
+                metadata = await loop.run_in_executor(None, processor.run, item_id, description)
+
+        if self.summary_cache:
+            self.summary_cache.set(item_id, description, metadata)
+
+        return metadata
+
+    def get_batch_summaries(self, item_ids: List[str], descriptions: List['ItemDescription']) -> Dict[str, Dict]:
+        """
+        Get the summaries for many items at once. Uses the ``run_batch``
+        method of the aggregation processor, if it has one.
+
+        :param item_ids: Item IDs to summarise
+        :param descriptions: ItemDescription for each item ID
+        :return: Summaries keyed by item ID
+        """
+
+        summaries = {}
+
+        if self.summary_cache:
+            for item_id, description in zip(item_ids, descriptions):
+                metadata = self.summary_cache.get(item_id, description)
+                self.record_cache_request('summary', metadata is not None)
+                if metadata is not None:
+                    summaries[item_id] = metadata
+
+            missing = [
+                (item_id, description) for item_id, description in zip(item_ids, descriptions)
+                if item_id not in summaries
+            ]
+
+            if not missing:
+                return summaries
+
+            item_ids, descriptions = map(list, zip(*missing))
+
+        processor = self.get_aggregation_processor()
+
+        with self.metrics.timer('item_generator_processor_seconds', processor=type(processor).__name__):
+            if hasattr(processor, 'run_batch'):
+                results = processor.run_batch(item_ids, descriptions)
+            else:
+                results = {
+                    item_id: processor.run(item_id, description)
+                    for item_id, description in zip(item_ids, descriptions)
+                }
+
+        if self.summary_cache:
+            for item_id, description in zip(item_ids, descriptions):
+                if item_id in results:
+                    self.summary_cache.set(item_id, description, results[item_id])
+
+        summaries.update(results)
+
+        return summaries
+
+    def build_item(self, filepath: str, description: 'ItemDescription', summaries: Dict, **kwargs) -> Dict:
+        """
+        Build the item document from the description and the summaries
+
+        :param filepath: Path to the file
+        :param description: ItemDescription
+        :param summaries: Aggregated properties from the assets
+        :return: Item document
+        """
 
         # processor_output = self.run_processors(filepath, description, source_media, **kwargs)
 
@@ -124,17 +398,7 @@ class FacetExtractor(BaseExtractor):
         properties = {}
 
         # Generate title and description properties from templates
-        templates = description.facets.templates
-
-        if templates:
-            if templates.title:
-                title_template = templates.title
-                title = Template(title_template).safe_substitute(properties)
-                properties['title'] = title
-            if templates.description:
-                desc_template = templates.description
-                desc = Template(desc_template).safe_substitute(properties)
-                properties['description'] = desc
+        self.get_plan(description).render_templates(properties)
 
         # Get collection id
         coll_id = description.collections.id
@@ -160,25 +424,32 @@ class FacetExtractor(BaseExtractor):
 
         merged_body = dict_merge(body, summaries)
 
-        output = {
+        return {
             'id': item_id,
             'body': merged_body
         }
 
-        # Output the item
-        self.output(filepath, source_media, output, namespace='items')
+    def output_header(self, filepath: str, source_media: StorageType, description: 'ItemDescription') -> None:
+        """
+        Output the header message for the file
+
+        :param filepath: Path to the file
+        :param source_media: The source media type (POSIX, Object, Tape)
+        :param description: ItemDescription
+        """
+
+        # Get collection id
+        coll_id = description.collections.id
 
         # If deduplication enabled, check LRU cache and pass relevant kwargs
         kwargs = {
                     'deduplicate': False,
                     'id': coll_id
                 }
-        if self.header_deduplication:
-            # Check if id is in the cache
-            if self.collection_id_cache.get(coll_id):
-                kwargs['deduplicate'] = True
-            # add a dummy value to the cache of equal to True.
-            self.collection_id_cache.update({coll_id: True})
+        if self.header_deduplicator:
+            # Check if id has been seen and record it
+            kwargs['deduplicate'] = self.header_deduplicator.seen(coll_id)
+            self.record_cache_request('header_deduplication', kwargs['deduplicate'])
 
         message = {
             'collection_id': coll_id,
@@ -188,3 +459,252 @@ class FacetExtractor(BaseExtractor):
 
         # Output the header
         self.output(filepath, source_media, message, namespace='header', **kwargs)
+
+    def get_header_state(self, since: Optional[float] = None) -> Dict[str, float]:
+        """
+        Return the collection IDs currently held for header deduplication
+        with the time they expire
+
+        :param since: Only the IDs recorded at or after this ``time.time()``
+        """
+        if self.header_deduplicator:
+            return self.header_deduplicator.state(since)
+
+        return {}
+
+    def merge_header_state(self, state: Dict[str, float]) -> None:
+        """
+        Add collection IDs seen elsewhere, for example by another worker,
+        to the header deduplication cache. The IDs keep their expiry time.
+
+        :param state: Expiry time of each collection ID which has had a header output
+        """
+        if self.header_deduplicator:
+            self.header_deduplicator.add(state)
+
+    def process_file(self, filepath: str, source_media: StorageType = StorageType.POSIX, **kwargs):
+        """
+        Method to outline the processing pipeline for an individual file
+        :param filepath:
+        :param source_media:
+        :return:
+        """
+        # Generate file ID
+        file_id = generate_id(filepath)
+
+        LOGGER.info(f'Processing: {filepath}')
+
+        metrics = self.metrics
+        metrics.inc('item_generator_files_total')
+
+        # Get dataset description file
+        with metrics.timer('item_generator_stage_seconds', stage='description'):
+            description = self.get_description(filepath)
+
+        if self.coalescer:
+            with metrics.timer('item_generator_stage_seconds', stage='output_header'):
+                self.output_header(filepath, source_media, description)
+
+            # Defer the item until the window is full
+            pending = self.coalescer.add(kwargs['item_id'], filepath, source_media, description)
+            if pending:
+                self.output_items(pending)
+            return
+
+        # Get summaries - aggregated properties from assets.
+        with metrics.timer('item_generator_stage_seconds', stage='summaries'):
+            summaries = self.get_summaries(kwargs['item_id'], description)
+
+        with metrics.timer('item_generator_stage_seconds', stage='build_item'):
+            output = self.build_item(filepath, description, summaries, **kwargs)
+
+        # Output the item
+        with metrics.timer('item_generator_stage_seconds', stage='output_item'):
+            self.output(filepath, source_media, output, namespace='items')
+
+        with metrics.timer('item_generator_stage_seconds', stage='output_header'):
+            self.output_header(filepath, source_media, description)
+
+    def output_items(self, pending: PendingItems) -> None:
+        """
+        Summarise and output the items from a coalescing window
+
+        :param pending: Latest file for each item in the window
+        """
+        item_ids = list(pending)
+        descriptions = [description for _, _, description in pending.values()]
+
+        summaries = self.get_batch_summaries(item_ids, descriptions)
+
+        for item_id, (filepath, source_media, description) in pending.items():
+            output = self.build_item(filepath, description, summaries.get(item_id, {}), item_id=item_id)
+
+            # Output the item
+            self.output(filepath, source_media, output, namespace='items')
+
+    def output(self,
+               filepath: str,
+               source_media: StorageType,
+               data: dict,
+               namespace: str = None,
+               **kwargs) -> None:
+        """
+        Send the message to the output backends for the namespace, through
+        the output buffer if configured
+
+        :param filepath: Path to the file
+        :param source_media: The source media type (POSIX, Object, Tape)
+        :param data: Message to output
+        :param namespace: Only backends with this namespace, or none, receive the message
+        """
+        if not self.output_buffer:
+            return super().output(filepath, source_media, data, namespace=namespace, **kwargs)
+
+        full = False
+        for backend in self.output_plugins:
+            if not backend.namespace or backend.namespace == namespace:
+                full = self.output_buffer.add(backend, data, filepath=filepath, **kwargs) or full
+
+        if full:
+            try:
+                self.flush_output()
+            except OutputFlushError as e:
+                # The messages are kept and written by a later flush
+                LOGGER.error(f'{e}. Files affected: {", ".join(e.filepaths)}')
+
+    def flush_output(self) -> None:
+        """
+        Write the messages waiting in the output buffer
+
+        :raises OutputFlushError: If a backend failed. The messages not written are kept
+        """
+        if self.output_buffer:
+            written = 0
+            try:
+                with self.metrics.timer('item_generator_stage_seconds', stage='flush_output'):
+                    written = self.output_buffer.flush()
+            except OutputFlushError as e:
+                self.metrics.inc('item_generator_output_flush_errors_total')
+                written = e.written
+                raise
+            finally:
+                if written:
+                    self.metrics.inc('item_generator_output_flushes_total')
+                    self.metrics.inc('item_generator_output_messages_total', written)
+
+    def poll(self) -> None:
+        """
+        Output the items in the coalescing window if it has reached
+        ``max_age``, then write the output buffer if it is due. Call
+        periodically so items are not held when no more files arrive.
+
+        :raises OutputFlushError: If a backend failed. The messages not written are kept
+        """
+        if self.coalescer:
+            pending = self.coalescer.poll()
+            if pending:
+                self.output_items(pending)
+
+        if self.output_buffer and self.output_buffer.due():
+            self.flush_output()
+
+    def flush(self) -> None:
+        """
+        Output the items waiting in the coalescing window, then write the
+        messages waiting in the output buffer
+        """
+        if self.coalescer:
+            pending = self.coalescer.drain()
+            if pending:
+                self.output_items(pending)
+
+        self.flush_output()
+
+    async def aprocess_file(self, filepath: str, source_media: StorageType = StorageType.POSIX, **kwargs):
+        """
+        Asynchronous version of ``process_file``. The aggregation is awaited,
+        description lookup and output are synchronous.
+
+        :param filepath:
+        :param source_media:
+        """
+
+        LOGGER.info(f'Processing: {filepath}')
+
+        self.metrics.inc('item_generator_files_total')
+
+        # Get dataset description file
+        description = self.get_description(filepath)
+
+        # Get summaries - aggregated properties from assets.
+        with self.metrics.timer('item_generator_stage_seconds', stage='summaries'):
+            summaries = await self.aget_summaries(kwargs['item_id'], description)
+
+        output = self.build_item(filepath, description, summaries, **kwargs)
+
+        # Output the item
+        self.output(filepath, source_media, output, namespace='items')
+
+        self.output_header(filepath, source_media, description)
+
+    async def aprocess_files(self, files: Iterable[Tuple[str, str, StorageType]]) -> None:
+        """
+        Process many files concurrently, keeping at most ``max_items_in_flight``
+        files in progress. Errors are logged and do not stop the other files.
+
+        :param files: Iterable of ``(filepath, item_id, source_media)``
+        """
+
+        files = iter(files)
+
+        async def worker():
+            for filepath, item_id, source_media in files:
+                try:
+                    await self.aprocess_file(filepath, StorageType(source_media), item_id=item_id)
+                except Exception:
+                    LOGGER.error(f'Failed to process: {filepath}', exc_info=True)
+
+        await asyncio.gather(*[worker() for _ in range(self.max_items_in_flight)])
+
+    def process_files(self, files: Iterable[Tuple[str, str, StorageType]]) -> None:
+        """
+        Process many files, aggregating the summaries for all the items in
+        each batch of files with a single call to the aggregation processor.
+
+        The batch size is set by the ``batch_size`` configuration option.
+
+        :param files: Iterable of ``(filepath, item_id, source_media)``
+        """
+
+        files = iter(files)
+
+        while True:
+            batch = list(islice(files, self.batch_size))
+
+            if not batch:
+                break
+
+            descriptions = []
+            items = {}
+
+            for filepath, item_id, _ in batch:
+                LOGGER.info(f'Processing: {filepath}')
+
+                description = self.get_description(filepath)
+                descriptions.append(description)
+                items.setdefault(item_id, description)
+
+            self.metrics.inc('item_generator_files_total', len(batch))
+
+            with self.metrics.timer('item_generator_stage_seconds', stage='summaries'):
+                summaries = self.get_batch_summaries(list(items), list(items.values()))
+
+            for (filepath, item_id, source_media), description in zip(batch, descriptions):
+                source_media = StorageType(source_media)
+
+                output = self.build_item(filepath, description, summaries.get(item_id, {}), item_id=item_id)
+
+                # Output the item
+                self.output(filepath, source_media, output, namespace='items')
+
+                self.output_header(filepath, source_media, description)
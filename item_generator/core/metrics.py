@@ -0,0 +1,346 @@
+# encoding: utf-8
+"""
+Metrics
+-------
+
+Counters and latency histograms for the stages of ``process_file``, the
+aggregation processors and the caches.
+
+Metrics are disabled by default. The extractor then holds a
+:py:class:`NullMetrics`, whose methods do nothing, so the instrumentation
+costs a method call per stage.
+
+When enabled, the metrics can be served in the Prometheus text format and
+logged periodically. Tests can read the values with :py:meth:`Metrics.counter`
+and :py:meth:`Metrics.histogram`.
+
+Each extractor has its own registry. With the ``process`` executor every
+worker process records separately, so use ``log_interval`` there, as only
+one process can bind a fixed ``port``.
+
+Metrics recorded:
+
+``item_generator_files_total``
+    Files processed
+``item_generator_stage_seconds{stage}``
+    Time in each stage: ``description``, ``summaries``, ``build_item``,
+    ``output_item``, ``output_header``
+``item_generator_processor_seconds{processor}``
+    Time in the aggregation processor
+``item_generator_cache_requests_total{cache,result}``
+    Hits and misses for the ``description`` and ``summary`` caches and
+    ``header_deduplication``
+``item_generator_es_searches_total``, ``item_generator_es_search_seconds``
+    Elasticsearch round trips
+``item_generator_es_searches_per_item``
+    Round trips to summarise each item
+``item_generator_es_composite_pages_total``
+    Pages of composite aggregations fetched
+
+Configuration
+-------------
+
+.. code-block:: yaml
+
+    metrics:
+        enabled: True
+        # Serve the metrics in the Prometheus text format
+        port: 9100
+        # Log the metrics every interval seconds
+        log_interval: 60
+
+"""
+__author__ = 'Richard Smith'
+__date__ = '18 Oct 2026'
+__copyright__ = 'Copyright 2018 United Kingdom Research and Innovation'
+__license__ = 'BSD - see LICENSE file in top-level package directory'
+__contact__ = 'richard.d.smith@stfc.ac.uk'
+
+import bisect
+import logging
+import threading
+import time
+from contextlib import nullcontext
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional, Sequence, Tuple
+
+LOGGER = logging.getLogger(__name__)
+
+# Upper bounds of the latency buckets in seconds
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Upper bounds of the buckets for counts, such as searches per item
+COUNT_BUCKETS = (1, 2, 3, 4, 5, 10, 20, 50, 100)
+
+MetricKey = Tuple[str, Tuple[Tuple[str, str], ...]]
+
+
+def metric_key(name: str, labels: Dict) -> MetricKey:
+    return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def format_key(key: MetricKey, extra: Optional[Dict] = None) -> str:
+    """
+    Prometheus series name for the key
+    """
+    name, labels = key
+    labels = labels + tuple((extra or {}).items())
+
+    if not labels:
+        return name
+
+    label_str = ','.join(f'{k}="{v}"' for k, v in labels)
+    return f'{name}{{{label_str}}}'
+
+
+class Histogram:
+    """
+    Cumulative histogram with fixed buckets
+    """
+
+    def __init__(self, buckets: Sequence[float]):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def to_dict(self) -> Dict:
+        cumulative = 0
+        buckets = {}
+
+        for bound, count in zip(self.buckets + (float('inf'),), self.counts):
+            cumulative += count
+            buckets[bound] = cumulative
+
+        return {'count': self.count, 'sum': self.sum, 'buckets': buckets}
+
+
+class Timer:
+    """
+    Context manager which observes the elapsed time into a histogram
+    """
+
+    __slots__ = ('metrics', 'name', 'labels', 'start')
+
+    def __init__(self, metrics: 'Metrics', name: str, labels: Dict):
+        self.metrics = metrics
+        self.name = name
+        self.labels = labels
+
+    def __enter__(self) -> 'Timer':
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.metrics.observe(self.name, time.perf_counter() - self.start, **self.labels)
+
+
+class Metrics:
+    """
+    Thread safe store of counters and histograms
+    """
+
+    enabled = True
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters: Dict[MetricKey, float] = {}
+        self.histograms: Dict[MetricKey, Histogram] = {}
+        self.server = None
+        self.reporter = None
+
+    @classmethod
+    def from_conf(cls, conf: Optional[Dict]) -> 'Metrics':
+        """
+        Build the metrics from the ``metrics`` configuration section.
+        Returns :py:class:`NullMetrics` if not enabled.
+
+        :param conf: Configuration section
+        """
+        if not conf or not conf.get('enabled', True):
+            return NULL_METRICS
+
+        metrics = cls()
+
+        if conf.get('port'):
+            metrics.serve(conf['port'], conf.get('host', ''))
+
+        if conf.get('log_interval'):
+            metrics.start_reporter(conf['log_interval'])
+
+        return metrics
+
+    def inc(self, name: str, value: float = 1, **labels) -> None:
+        """
+        Increment a counter
+        """
+        key = metric_key(name, labels)
+
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name: str, value: float, buckets: Sequence[float] = DEFAULT_BUCKETS, **labels) -> None:
+        """
+        Add a value to a histogram
+
+        :param buckets: Bucket bounds used when the histogram is created
+        """
+        key = metric_key(name, labels)
+
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram(buckets)
+            histogram.observe(value)
+
+    def timer(self, name: str, **labels):
+        """
+        Context manager which records the time spent in the block
+        """
+        return Timer(self, name, labels)
+
+    def counter(self, name: str, **labels) -> float:
+        """
+        Current value of a counter
+        """
+        with self.lock:
+            return self.counters.get(metric_key(name, labels), 0)
+
+    def histogram(self, name: str, **labels) -> Optional[Dict]:
+        """
+        Count, sum and cumulative bucket counts of a histogram
+        """
+        with self.lock:
+            histogram = self.histograms.get(metric_key(name, labels))
+            return histogram.to_dict() if histogram else None
+
+    def reset(self) -> None:
+        with self.lock:
+            self.counters.clear()
+            self.histograms.clear()
+
+    def render(self) -> str:
+        """
+        Metrics in the Prometheus text exposition format
+        """
+        lines = []
+        types = set()
+
+        with self.lock:
+            counters = sorted(self.counters.items())
+            histograms = sorted((key, histogram.to_dict()) for key, histogram in self.histograms.items())
+
+        for key, value in counters:
+            if key[0] not in types:
+                types.add(key[0])
+                lines.append(f'# TYPE {key[0]} counter')
+            lines.append(f'{format_key(key)} {value}')
+
+        for key, histogram in histograms:
+            if key[0] not in types:
+                types.add(key[0])
+                lines.append(f'# TYPE {key[0]} histogram')
+
+            bucket_key = (f'{key[0]}_bucket', key[1])
+            for bound, count in histogram['buckets'].items():
+                le = '+Inf' if bound == float('inf') else bound
+                lines.append(f'{format_key(bucket_key, {"le": le})} {count}')
+
+            lines.append(f'{format_key((f"{key[0]}_sum", key[1]))} {histogram["sum"]}')
+            lines.append(f'{format_key((f"{key[0]}_count", key[1]))} {histogram["count"]}')
+
+        return '\n'.join(lines) + '\n'
+
+    def summary_line(self) -> str:
+        """
+        Single line summary of the counters and the mean of each histogram
+        """
+        with self.lock:
+            parts = [f'{format_key(key)}={value:g}' for key, value in sorted(self.counters.items())]
+            parts.extend(
+                f'{format_key(key)}={histogram.count}/{histogram.sum / histogram.count:.4g}'
+                for key, histogram in sorted(self.histograms.items(), key=lambda item: item[0])
+                if histogram.count
+            )
+
+        return ' '.join(parts)
+
+    def serve(self, port: int, host: str = '') -> ThreadingHTTPServer:
+        """
+        Serve the metrics over HTTP from a background thread
+
+        :param port: Port to listen on. 0 picks a free port
+        :param host: Address to bind to
+        """
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+
+            def do_GET(self):
+                body = metrics.render().encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+        return self.server
+
+    def start_reporter(self, interval: float) -> None:
+        """
+        Log the ``summary_line`` every interval seconds from a background thread
+        """
+        stop = threading.Event()
+
+        def report():
+            while not stop.wait(interval):
+                LOGGER.info(f'Metrics: {self.summary_line()}')
+
+        self.reporter = stop
+        threading.Thread(target=report, daemon=True).start()
+
+    def close(self) -> None:
+        """
+        Stop the HTTP server and the reporter
+        """
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+
+        if self.reporter:
+            self.reporter.set()
+            self.reporter = None
+
+
+class NullMetrics(Metrics):
+    """
+    Metrics which are not recorded
+    """
+
+    enabled = False
+
+    _timer = nullcontext()
+
+    def inc(self, name: str, value: float = 1, **labels) -> None:
+        pass
+
+    def observe(self, name: str, value: float, buckets: Sequence[float] = DEFAULT_BUCKETS, **labels) -> None:
+        pass
+
+    def timer(self, name: str, **labels):
+        return self._timer
+
+
+NULL_METRICS = NullMetrics()
@@ -0,0 +1,296 @@
+# encoding: utf-8
+"""
+Output Buffering
+----------------
+
+Holds the item and header messages from ``FacetExtractor.output`` and writes
+them to each output backend in batches, rather than one request per message.
+
+The buffer is flushed when it holds ``max_documents`` messages, when the
+messages in it add up to ``max_bytes`` of JSON, or when the oldest message
+is ``max_age`` seconds old. The thresholds are checked as messages arrive,
+and the age by ``FacetExtractor.poll`` so a quiet buffer is not held until
+the next message. The buffer is also flushed by ``FacetExtractor.flush``, so messages still
+waiting are written when the extractor is closed and at the end of each
+chunk in worker processes.
+
+If a batch cannot be written, its messages and those of the backends not yet
+written are put back at the front of the buffer and
+:py:class:`OutputFlushError` is raised naming every file with a message
+still waiting. The buffer is not due again for ``max_age`` seconds, so a
+failing backend is not retried for every new message. Retried batches may
+repeat messages which were partly written, which the upserts of the
+``elasticsearch`` backend tolerate.
+
+Each backend receives its messages in the order they were output. A batch is
+written with:
+
+- ``export_batch`` if the backend has one. It is passed a list of
+  ``(data, kwargs)`` pairs, the arguments ``export`` would have been called
+  with. Backends which publish to a queue can implement it to publish the
+  batch in one go.
+- one ``_bulk`` request for the ``elasticsearch`` output backend, with the
+  same upserts ``export`` makes
+- ``export`` for each message for any other backend
+
+Configuration
+-------------
+
+.. code-block:: yaml
+
+    output_buffer:
+        max_documents: 500
+        max_bytes: 5000000
+        max_age: 5
+
+"""
+__author__ = 'Richard Smith'
+__date__ = '18 Oct 2026'
+__copyright__ = 'Copyright 2018 United Kingdom Research and Innovation'
+__license__ = 'BSD - see LICENSE file in top-level package directory'
+__contact__ = 'richard.d.smith@stfc.ac.uk'
+
+import json
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+try:
+    from elasticsearch.helpers import BulkIndexError
+    from asset_scanner.plugins.output_plugins.elasticsearch_backend import ElasticsearchOutputBackend
+except ImportError:
+    ElasticsearchOutputBackend = None
+
+# Message and the keyword arguments for ``export``
+Message = Tuple[Dict, Dict]
+
+# Backend, its messages and the file each message was output for
+Batch = Tuple[object, List[Message], List[Optional[str]]]
+
+
+class OutputFlushError(Exception):
+    """
+    Raised when buffered messages could not be written. The messages are
+    kept in the buffer for the next flush.
+    """
+
+    def __init__(self, filepaths: List[str], written: int, error: Exception):
+        """
+        :param filepaths: Files with messages which were not written
+        :param written: Number of messages written before the failure
+        :param error: Error raised by the backend
+        """
+        super().__init__(f'Failed to write output for {len(filepaths)} file(s): {error!r}')
+        self.filepaths = filepaths
+        self.written = written
+        self.error = error
+
+
+def message_size(data: Dict) -> int:
+    """
+    Approximate size of the message once serialized
+    """
+    return len(json.dumps(data, default=str))
+
+
+def elasticsearch_bulk_body(backend: 'ElasticsearchOutputBackend', messages: List[Message]) -> List[Dict]:
+    """
+    Lines of a ``_bulk`` request for the upserts made by
+    ``ElasticsearchOutputBackend.export``
+    """
+    lines = []
+
+    for data, _ in messages:
+        data = backend.clean(data)
+        lines.append({'update': {'_index': backend.index_name, '_id': data['id']}})
+        lines.append({'doc': data['body'], 'doc_as_upsert': True})
+
+    return lines
+
+
+def elasticsearch_bulk(backend: 'ElasticsearchOutputBackend', messages: List[Message]) -> None:
+    """
+    Write the messages with one ``_bulk`` request. The size of the request
+    is bounded by the buffer thresholds.
+
+    :raises BulkIndexError: If any of the upserts failed
+    """
+    response = backend.es.bulk(body=elasticsearch_bulk_body(backend, messages))
+
+    if response.get('errors'):
+        failed = [item for item in response['items'] if any('error' in action for action in item.values())]
+        raise BulkIndexError(f'{len(failed)} document(s) failed to index.', failed)
+
+
+def write_batch(backend, messages: List[Message]) -> None:
+    """
+    Write the messages to the backend with the bulk method it supports
+
+    :param backend: Output backend
+    :param messages: Messages in the order they were output
+    """
+    if hasattr(backend, 'export_batch'):
+        backend.export_batch(messages)
+
+    elif ElasticsearchOutputBackend is not None and isinstance(backend, ElasticsearchOutputBackend):
+        elasticsearch_bulk(backend, messages)
+
+    else:
+        for data, kwargs in messages:
+            backend.export(data, **kwargs)
+
+
+class OutputBuffer:
+    """
+    Messages waiting to be written to each output backend
+    """
+
+    def __init__(self, max_documents: int = 500, max_bytes: Optional[int] = 5000000, max_age: float = 5.0):
+        """
+        :param max_documents: Number of messages which fill the buffer
+        :param max_bytes: Serialized size of the messages which fills the buffer. ``None`` to not measure
+        :param max_age: Seconds after the first message when the buffer is flushed
+        """
+        self.max_documents = max_documents
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+
+        self.lock = threading.Lock()
+        self.pending: Dict[int, Batch] = {}
+        self.documents = 0
+        self.bytes = 0
+        self.buffer_start = None
+        self.retry_after = None
+
+    @classmethod
+    def from_conf(cls, conf: Optional[Dict]) -> Optional['OutputBuffer']:
+        """
+        Build the buffer from the ``output_buffer`` configuration section
+
+        :param conf: Configuration section. Buffering is disabled if empty
+        """
+        if not conf:
+            return
+
+        if conf is True:
+            conf = {}
+
+        return cls(**conf)
+
+    def add(self, backend, data: Dict, filepath: Optional[str] = None, **kwargs) -> bool:
+        """
+        Add a message for the backend
+
+        :param backend: Output backend
+        :param data: Message
+        :param filepath: File the message was output for, reported if it cannot be written
+        :param kwargs: Keyword arguments for ``export``
+        :return: Whether the buffer is due to be flushed
+        """
+        with self.lock:
+            _, messages, filepaths = self.pending.setdefault(id(backend), (backend, [], []))
+            messages.append((data, kwargs))
+            filepaths.append(filepath)
+
+            self.documents += 1
+
+            if self.max_bytes:
+                self.bytes += message_size(data)
+
+            if self.buffer_start is None:
+                self.buffer_start = time.monotonic()
+
+            return self._due()
+
+    def due(self) -> bool:
+        """
+        Whether the buffer is due to be flushed
+        """
+        with self.lock:
+            return self._due()
+
+    def _due(self) -> bool:
+        if self.buffer_start is None:
+            return False
+
+        if self.retry_after is not None and time.monotonic() < self.retry_after:
+            return False
+
+        return bool(
+            self.documents >= self.max_documents
+            or (self.max_bytes and self.bytes >= self.max_bytes)
+            or time.monotonic() - self.buffer_start >= self.max_age
+        )
+
+    def drain(self) -> List[Batch]:
+        """
+        Empty the buffer and return the messages for each backend, with the
+        file each message was output for
+        """
+        with self.lock:
+            pending = list(self.pending.values())
+
+            self.pending = {}
+            self.documents = 0
+            self.bytes = 0
+            self.buffer_start = None
+
+            return pending
+
+    def restore(self, batches: List[Batch]) -> None:
+        """
+        Put batches which were not written back at the front of the buffer,
+        ahead of any messages added since they were drained
+
+        :param batches: Batches from ``drain``
+        """
+        with self.lock:
+            pending = {
+                id(backend): (backend, list(messages), list(filepaths))
+                for backend, messages, filepaths in batches
+            }
+
+            for key, (backend, messages, filepaths) in self.pending.items():
+                _, restored_messages, restored_filepaths = pending.setdefault(key, (backend, [], []))
+                restored_messages.extend(messages)
+                restored_filepaths.extend(filepaths)
+
+            self.pending = pending
+            self.documents = sum(len(messages) for _, messages, _ in pending.values())
+
+            if self.max_bytes:
+                self.bytes = sum(message_size(data) for _, messages, _ in pending.values() for data, _ in messages)
+
+            # Wait before retrying a failing backend
+            self.buffer_start = self.buffer_start or time.monotonic()
+            self.retry_after = time.monotonic() + self.max_age
+
+    def flush(self) -> int:
+        """
+        Write the buffered messages to their backends. The backends are
+        written in the order they were first output to.
+
+        :return: Number of messages written
+        :raises OutputFlushError: If a backend failed. The messages not written are kept
+        """
+        batches = self.drain()
+        written = 0
+
+        for position, (backend, messages, _) in enumerate(batches):
+            try:
+                write_batch(backend, messages)
+            except Exception as e:
+                failed = batches[position:]
+                self.restore(failed)
+
+                filepaths = list(dict.fromkeys(
+                    filepath for _, _, filepaths in failed for filepath in filepaths if filepath
+                ))
+                raise OutputFlushError(filepaths, written, e) from e
+
+            written += len(messages)
+
+        with self.lock:
+            self.retry_after = None
+
+        return written
@@ -0,0 +1,132 @@
+# encoding: utf-8
+"""
+Execution Plans
+---------------
+
+The facet list and templates are derived from the :py:class:`ItemDescription`
+for every file. An :py:class:`ExecutionPlan` holds them ready to use and
+is cached per description, so the work is done once for all the files which
+share a description.
+
+Descriptions are cached by directory in the :py:class:`FacetExtractor`, so the
+same description object is seen for many files. Plans are keyed by the
+identity of the description and hold a reference to it, so a key can not be
+reused by a new description while the plan is cached.
+
+Query bodies which only differ by item ID are serialized once with
+:py:class:`QueryTemplate`.
+"""
+__author__ = 'Richard Smith'
+__date__ = '18 Oct 2026'
+__copyright__ = 'Copyright 2018 United Kingdom Research and Innovation'
+__license__ = 'BSD - see LICENSE file in top-level package directory'
+__contact__ = 'richard.d.smith@stfc.ac.uk'
+
+import json
+import threading
+from string import Template
+from typing import Callable, Dict, List, Optional
+
+from asset_scanner.core.item_describer import ItemDescription
+from cachetools import LRUCache
+
+
+class QueryTemplate:
+    """
+    JSON query body serialized once, with the item ID substituted per call
+    """
+
+    PLACEHOLDER = '__item_generator_item_id__'
+
+    def __init__(self, query: Dict):
+        """
+        :param query: Query built with ``PLACEHOLDER`` as the item ID, in one or more places
+        :raises ValueError: If the query does not contain ``PLACEHOLDER``
+        """
+        body = json.dumps(query)
+        self.parts = body.split(json.dumps(self.PLACEHOLDER))
+
+        if len(self.parts) < 2:
+            raise ValueError(f'Query template does not contain {self.PLACEHOLDER}')
+
+    def render(self, item_id: str) -> str:
+        """
+        Serialized query for the item, substituted everywhere the placeholder was
+
+        :param item_id: Item ID to substitute
+        """
+        return json.dumps(item_id).join(self.parts)
+
+
+class ExecutionPlan:
+    """
+    Parts of the description used for each file
+    """
+
+    def __init__(self, description: ItemDescription):
+        self.description = description
+
+        # Aggregation facets and extra top level facets
+        self.facets: List[str] = sorted(set(
+            description.facets.aggregation_facets + description.facets.search_facets
+        ))
+
+        templates = description.facets.templates
+
+        self.title_template: Optional[Template] = None
+        self.description_template: Optional[Template] = None
+
+        if templates:
+            if templates.title:
+                self.title_template = Template(templates.title)
+            if templates.description:
+                self.description_template = Template(templates.description)
+
+    def render_templates(self, properties: Dict) -> Dict:
+        """
+        Add the title and description generated from the templates
+        to the properties
+
+        :param properties: Properties to substitute into the templates
+        """
+        if self.title_template:
+            properties['title'] = self.title_template.safe_substitute(properties)
+
+        if self.description_template:
+            properties['description'] = self.description_template.safe_substitute(properties)
+
+        return properties
+
+
+class PlanCache:
+    """
+    Execution plans by description
+    """
+
+    def __init__(self, compile: Callable[[ItemDescription], ExecutionPlan] = ExecutionPlan, maxsize: int = 1000):
+        """
+        :param compile: Builds the plan for a description
+        :param maxsize: Maximum number of plans held
+        """
+        self.compile = compile
+        self.plans = LRUCache(maxsize=maxsize)
+        self.lock = threading.Lock()
+
+    def get(self, description: ItemDescription) -> ExecutionPlan:
+        """
+        Return the plan for the description, compiling it on first use
+
+        :param description: ItemDescription
+        """
+        key = id(description)
+
+        with self.lock:
+            plan = self.plans.get(key)
+
+        if plan is None:
+            plan = self.compile(description)
+
+            with self.lock:
+                self.plans[key] = plan
+
+        return plan
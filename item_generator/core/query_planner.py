@@ -0,0 +1,296 @@
+# encoding: utf-8
+"""
+Facet Query Planner
+-------------------
+
+Chooses how the ``elasticsearch_aggregator`` retrieves the values of each
+facet from an estimate of the number of distinct values.
+
+``terms``
+    Facets with few values are fetched with a plain ``terms``
+    aggregation sized to hold them all, in one request and without the
+    overhead of a composite aggregation.
+``composite``
+    Facets with more values are paged with a composite aggregation whose
+    page size fits the estimate, so most need a single page.
+``partitions``
+    Facets with too many values for one page are split with partitioned
+    ``terms`` aggregations of ``partition_size`` values each. The partitions
+    are independent, so they can be fetched concurrently, see
+    :py:meth:`FacetCursor.split`.
+
+The estimate is a ``cardinality`` aggregation over the first item of each
+collection, cached for ``ttl`` seconds, so the other items in the collection
+plan without a round trip. Estimates are approximate and items vary, so a
+``terms`` aggregation or partition which was cut short is fetched again with
+a larger size. The number of values found for each item is written back
+with :py:meth:`QueryPlanner.observe` when it is above the estimate, so the
+rest of the collection is planned from it rather than repeating the retries,
+switching to composite or partitions if needed.
+
+Without a planner every facet is paged with a composite aggregation of
+``ElasticsearchAggregator.PAGE_SIZE``.
+
+Configuration
+-------------
+
+.. code-block:: yaml
+
+    name: elasticsearch_aggregator
+    inputs:
+        index: ceda-index
+        connection_kwargs:
+          hosts: ['host1:9200']
+        query_planner:
+            # Largest estimate fetched with a terms aggregation
+            terms_max: 1000
+            # Largest composite page. Larger estimates are partitioned
+            composite_max: 10000
+            # Values in each partition
+            partition_size: 1000
+            # Seconds an estimate is kept for a collection
+            ttl: 3600
+
+"""
+__author__ = 'Richard Smith'
+__date__ = '18 Oct 2026'
+__copyright__ = 'Copyright 2018 United Kingdom Research and Innovation'
+__license__ = 'BSD - see LICENSE file in top-level package directory'
+__contact__ = 'richard.d.smith@stfc.ac.uk'
+
+import math
+import threading
+from typing import Dict, Hashable, Iterable, List, NamedTuple, Optional
+
+from cachetools import TTLCache
+
+TERMS = 'terms'
+COMPOSITE = 'composite'
+PARTITIONS = 'partitions'
+
+# Only the parts of the response which are parsed
+RESPONSE_FILTER = ','.join([
+    'aggregations.*.buckets.key',
+    'aggregations.*.after_key',
+    'aggregations.*.sum_other_doc_count',
+    'aggregations.*.value',
+    'aggregations.*.value_as_string',
+])
+
+
+def facet_field(facet: str) -> str:
+    return f'properties.{facet}.keyword'
+
+
+class FacetStrategy(NamedTuple):
+    """
+    How to retrieve the values of a facet
+    """
+    kind: str
+    size: int
+    partitions: int = 1
+
+
+class FacetCursor:
+    """
+    Progress through the values of a facet for one item. ``agg`` gives the
+    next aggregation to request and ``parse`` reads the response to it.
+    """
+
+    def __init__(self, facet: str, strategy: FacetStrategy, partition: int = 0, stop: Optional[int] = None):
+        """
+        :param facet: Facet to retrieve
+        :param strategy: How to retrieve the values
+        :param partition: First partition to request
+        :param stop: Partition to stop before. Default: all the partitions
+        """
+        self.facet = facet
+        self.strategy = strategy
+        self.values: List = []
+        self.after: Optional[Dict] = None
+        self.partition = partition
+        self.stop = strategy.partitions if stop is None else stop
+        self.done = False
+
+    def split(self) -> List['FacetCursor']:
+        """
+        A cursor for each of the remaining partitions
+        """
+        return [
+            FacetCursor(self.facet, self.strategy, partition, partition + 1)
+            for partition in range(self.partition, self.stop)
+        ]
+
+    def agg(self) -> Dict:
+        field = facet_field(self.facet)
+        kind, size, partitions = self.strategy
+
+        if kind == COMPOSITE:
+            composite = {
+                'sources': [{self.facet: {'terms': {'field': field}}}],
+                'size': size,
+            }
+            if self.after:
+                composite['after'] = self.after
+            return {'composite': composite}
+
+        terms = {'field': field, 'size': size}
+
+        if kind == PARTITIONS:
+            terms['include'] = {'partition': self.partition, 'num_partitions': partitions}
+
+        return {'terms': terms}
+
+    def parse(self, agg: Optional[Dict]) -> None:
+        """
+        Add the values from the response and move to the next request
+
+        :param agg: Response to the aggregation from ``agg``. ``None`` if absent
+        """
+        if not agg:
+            self.done = True
+            return
+
+        buckets = agg.get('buckets', [])
+
+        if self.strategy.kind == COMPOSITE:
+            self.values.extend(bucket['key'][self.facet] for bucket in buckets)
+
+            # A short page is the last page, even if an after_key is returned
+            self.after = agg.get('after_key') if len(buckets) == self.strategy.size else None
+            self.done = not self.after
+            return
+
+        if agg.get('sum_other_doc_count'):
+            # Estimate was too low, request the same values with room for twice as many
+            self.strategy = self.strategy._replace(size=self.strategy.size * 2)
+            return
+
+        self.values.extend(bucket['key'] for bucket in buckets)
+        self.partition += 1
+        self.done = self.partition >= self.stop
+
+
+class QueryPlanner:
+    """
+    Chooses a :py:class:`FacetStrategy` for each facet from cached
+    cardinality estimates
+    """
+
+    def __init__(self,
+                 terms_max: int = 1000,
+                 composite_max: int = 10000,
+                 partition_size: int = 1000,
+                 ttl: float = 3600,
+                 maxsize: int = 10000,
+                 precision_threshold: int = 3000,
+                 margin: float = 1.2):
+        """
+        :param terms_max: Largest estimate fetched with a terms aggregation
+        :param composite_max: Largest composite page
+        :param partition_size: Values in each partition
+        :param ttl: Seconds an estimate is kept
+        :param maxsize: Number of collection and facet estimates kept
+        :param precision_threshold: Counts below this are close to exact
+        :param margin: Headroom over the estimate when sizing a request
+        """
+        self.terms_max = terms_max
+        self.composite_max = composite_max
+        self.partition_size = partition_size
+        self.precision_threshold = precision_threshold
+        self.margin = margin
+
+        self.estimates = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.lock = threading.Lock()
+
+    @classmethod
+    def from_conf(cls, conf: Optional[Dict]) -> Optional['QueryPlanner']:
+        """
+        Build the planner from the ``query_planner`` option.
+        Returns ``None`` if not configured.
+        """
+        if not conf:
+            return
+
+        if conf is True:
+            conf = {}
+
+        return cls(**conf)
+
+    @staticmethod
+    def collection_key(description) -> Hashable:
+        """
+        Key which estimates are shared under, the collection ID of the
+        description or its paths
+        """
+        collection_id = getattr(description.collections, 'id', None)
+        return collection_id or tuple(description.paths)
+
+    def get_estimates(self, collection: Hashable, facets: Iterable[str]) -> Dict[str, int]:
+        """
+        Cached estimates for the facets in the collection
+        """
+        with self.lock:
+            return {
+                facet: self.estimates[(collection, facet)]
+                for facet in facets if (collection, facet) in self.estimates
+            }
+
+    def set_estimates(self, collection: Hashable, estimates: Dict[str, int]) -> None:
+        with self.lock:
+            for facet, estimate in estimates.items():
+                self.estimates[(collection, facet)] = estimate
+
+    def observe(self, collection: Hashable, counts: Dict[str, int]) -> None:
+        """
+        Raise the estimates to the number of values found for an item.
+        Estimates are never lowered, as other items may have more values.
+
+        :param collection: Collection of the item
+        :param counts: Number of values of each facet
+        """
+        with self.lock:
+            for facet, count in counts.items():
+                key = (collection, facet)
+
+                if count > self.estimates.get(key, 0):
+                    self.estimates[key] = count
+
+    @staticmethod
+    def cardinality_agg_name(facet: str) -> str:
+        return f'cardinality_{facet}'
+
+    def cardinality_aggs(self, facets: Iterable[str]) -> Dict:
+        """
+        Aggregations which estimate the number of values of each facet
+        """
+        return {
+            self.cardinality_agg_name(facet): {
+                'cardinality': {'field': facet_field(facet), 'precision_threshold': self.precision_threshold}
+            }
+            for facet in facets
+        }
+
+    def parse_cardinality(self, result: Dict, facets: Iterable[str]) -> Dict[str, int]:
+        aggs = result.get('aggregations') or {}
+        return {
+            facet: int(aggs.get(self.cardinality_agg_name(facet), {}).get('value') or 0)
+            for facet in facets
+        }
+
+    def choose(self, cardinality: int) -> FacetStrategy:
+        """
+        Strategy for a facet with the estimated number of values
+        """
+        # Room for values missed by the estimate, and one more so a full
+        # composite page shows there are no more values
+        size = max(10, math.ceil(cardinality * self.margin) + 1)
+
+        if cardinality <= self.terms_max:
+            return FacetStrategy(TERMS, size)
+
+        if cardinality <= self.composite_max:
+            return FacetStrategy(COMPOSITE, min(size, self.composite_max))
+
+        partitions = math.ceil(cardinality / self.partition_size)
+        return FacetStrategy(PARTITIONS, math.ceil(self.partition_size * self.margin), partitions)
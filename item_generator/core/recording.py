@@ -0,0 +1,283 @@
+# encoding: utf-8
+"""
+Record and Replay
+-----------------
+
+Records the requests made by the Elasticsearch aggregators, with their
+responses and latencies, so that a run can be repeated offline. Searches
+are recorded, as are the ``get`` and ``mget`` requests for materialised
+summaries.
+
+:py:class:`RecordingClient` wraps the Elasticsearch client and appends each
+request to a log. :py:class:`ReplayClient` serves the responses from the log
+in place of the client, optionally sleeping for the recorded latency.
+
+The log is newline delimited JSON, gzip compressed if the path ends
+``.gz``. Each line holds the operation, the index, the query body, the
+response and the latency in seconds. A ``get`` is recorded with the body
+``{"id": id}``. Lines without an operation are searches. Queries are matched
+on the operation, the index and the body with the keys sorted, so serialized
+and dictionary bodies match. Identical queries are replayed in the order
+they were recorded, the last response is reused once they run out.
+
+Configuration
+-------------
+
+.. code-block:: yaml
+
+    name: elasticsearch_aggregator
+    inputs:
+        index: ceda-index
+        connection_kwargs:
+          hosts: ['host1:9200']
+        # Record the traffic from a real run
+        record: /tmp/es_traffic.ndjson.gz
+
+.. code-block:: yaml
+
+    name: elasticsearch_aggregator
+    inputs:
+        index: ceda-index
+        # Serve the recorded responses. connection_kwargs are not used
+        replay: /tmp/es_traffic.ndjson.gz
+        # Sleep for the recorded latency of each search
+        replay_latency: True
+
+"""
+__author__ = 'Richard Smith'
+__date__ = '18 Oct 2026'
+__copyright__ = 'Copyright 2018 United Kingdom Research and Innovation'
+__license__ = 'BSD - see LICENSE file in top-level package directory'
+__contact__ = 'richard.d.smith@stfc.ac.uk'
+
+import asyncio
+import gzip
+import json
+import threading
+import time
+from typing import Dict, List, Tuple, Union
+
+Body = Union[Dict, str, bytes, None]
+
+SEARCH = 'search'
+GET = 'get'
+MGET = 'mget'
+
+
+def open_log(path: str, mode: str):
+    if path.endswith('.gz'):
+        return gzip.open(path, f'{mode}t', encoding='utf-8')
+
+    return open(path, mode, encoding='utf-8')
+
+
+def normalise(body: Body) -> Dict:
+    """
+    Decode a serialized query body
+    """
+    if isinstance(body, (str, bytes)):
+        return json.loads(body)
+
+    return body or {}
+
+
+def query_key(index: str, body: Body, operation: str = SEARCH) -> str:
+    """
+    Key which matches a query regardless of serialization and key order
+    """
+    return json.dumps([operation, index, normalise(body)], sort_keys=True, separators=(',', ':'))
+
+
+class TrafficLog:
+    """
+    Appends searches to the log
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.lock = threading.Lock()
+        self.writer = open_log(path, 'a')
+
+    def write(self, index: str, body: Body, response: Dict, latency: float, operation: str = SEARCH) -> None:
+        line = json.dumps({
+            'operation': operation,
+            'index': index,
+            'query': normalise(body),
+            'response': response,
+            'latency': round(latency, 6),
+        }, separators=(',', ':'))
+
+        with self.lock:
+            self.writer.write(line + '\n')
+
+    def close(self) -> None:
+        with self.lock:
+            self.writer.close()
+
+
+class RecordingClient:
+    """
+    Wraps an Elasticsearch client and records every search, ``get`` and
+    ``mget``. Other attributes are passed to the client.
+    """
+
+    def __init__(self, client, path: str):
+        """
+        :param client: Elasticsearch client
+        :param path: Log to append to
+        """
+        self.client = client
+        self.log = TrafficLog(path)
+
+    def search(self, index: str, body: Body = None, **kwargs) -> Dict:
+        start = time.perf_counter()
+        response = self.client.search(index=index, body=body, **kwargs)
+        self.log.write(index, body, response, time.perf_counter() - start)
+        return response
+
+    def get(self, index: str, id: str, **kwargs) -> Dict:
+        start = time.perf_counter()
+        response = self.client.get(index=index, id=id, **kwargs)
+        self.log.write(index, {'id': id}, response, time.perf_counter() - start, GET)
+        return response
+
+    def mget(self, body: Body, index: str, **kwargs) -> Dict:
+        start = time.perf_counter()
+        response = self.client.mget(body=body, index=index, **kwargs)
+        self.log.write(index, body, response, time.perf_counter() - start, MGET)
+        return response
+
+    def close(self) -> None:
+        self.log.close()
+        self.client.close()
+
+    def __getattr__(self, name):
+        return getattr(self.client, name)
+
+
+class AsyncRecordingClient(RecordingClient):
+    """
+    Asynchronous version of :py:class:`RecordingClient`
+    """
+
+    async def search(self, index: str, body: Body = None, **kwargs) -> Dict:
+        start = time.perf_counter()
+        response = await self.client.search(index=index, body=body, **kwargs)
+        self.log.write(index, body, response, time.perf_counter() - start)
+        return response
+
+    async def get(self, index: str, id: str, **kwargs) -> Dict:
+        start = time.perf_counter()
+        response = await self.client.get(index=index, id=id, **kwargs)
+        self.log.write(index, {'id': id}, response, time.perf_counter() - start, GET)
+        return response
+
+    async def mget(self, body: Body, index: str, **kwargs) -> Dict:
+        start = time.perf_counter()
+        response = await self.client.mget(body=body, index=index, **kwargs)
+        self.log.write(index, body, response, time.perf_counter() - start, MGET)
+        return response
+
+    async def close(self) -> None:
+        self.log.close()
+        await self.client.close()
+
+
+class ReplayMissError(LookupError):
+    """
+    Raised when a search was not recorded
+    """
+
+
+class ReplayClient:
+    """
+    Serves recorded responses in place of an Elasticsearch client
+    """
+
+    def __init__(self, path: str, latency: bool = False, speed: float = 1.0):
+        """
+        :param path: Recorded log
+        :param latency: Sleep for the recorded latency of each search
+        :param speed: Divides the recorded latency
+        """
+        self.latency = latency
+        self.speed = speed
+        self.lock = threading.Lock()
+        self.recordings: Dict[str, List[Tuple[str, float]]] = {}
+        self.positions: Dict[str, int] = {}
+
+        with open_log(path, 'r') as reader:
+            for line in reader:
+                if not line.strip():
+                    continue
+
+                record = json.loads(line)
+                key = query_key(record['index'], record['query'], record.get('operation', SEARCH))
+                # Responses are decoded on each search, as by the client
+                response = json.dumps(record['response'])
+                self.recordings.setdefault(key, []).append((response, record.get('latency', 0.0)))
+
+    def next_response(self, index: str, body: Body, operation: str = SEARCH) -> Tuple[Dict, float]:
+        """
+        Next recorded response for the query and its latency
+        """
+        key = query_key(index, body, operation)
+
+        with self.lock:
+            recordings = self.recordings.get(key)
+
+            if not recordings:
+                raise ReplayMissError(f'No recorded response for {operation} on {index}: {key}')
+
+            position = self.positions.get(key, 0)
+            self.positions[key] = position + 1
+
+        response, latency = recordings[min(position, len(recordings) - 1)]
+
+        return json.loads(response), latency
+
+    def replay(self, index: str, body: Body, operation: str = SEARCH) -> Dict:
+        response, latency = self.next_response(index, body, operation)
+
+        if self.latency:
+            time.sleep(latency / self.speed)
+
+        return response
+
+    def search(self, index: str, body: Body = None, **kwargs) -> Dict:
+        return self.replay(index, body)
+
+    def get(self, index: str, id: str, **kwargs) -> Dict:
+        return self.replay(index, {'id': id}, GET)
+
+    def mget(self, body: Body, index: str, **kwargs) -> Dict:
+        return self.replay(index, body, MGET)
+
+    def close(self) -> None:
+        pass
+
+
+class AsyncReplayClient(ReplayClient):
+    """
+    Asynchronous version of :py:class:`ReplayClient`
+    """
+
+    async def replay(self, index: str, body: Body, operation: str = SEARCH) -> Dict:
+        response, latency = self.next_response(index, body, operation)
+
+        if self.latency:
+            await asyncio.sleep(latency / self.speed)
+
+        return response
+
+    async def search(self, index: str, body: Body = None, **kwargs) -> Dict:
+        return await self.replay(index, body)
+
+    async def get(self, index: str, id: str, **kwargs) -> Dict:
+        return await self.replay(index, {'id': id}, GET)
+
+    async def mget(self, body: Body, index: str, **kwargs) -> Dict:
+        return await self.replay(index, body, MGET)
+
+    async def close(self) -> None:
+        pass
@@ -0,0 +1,284 @@
+# encoding: utf-8
+"""
+Item Summaries
+--------------
+
+Running aggregate of the assets in an item: the set of values of each
+property, the datetime range and the bounding box. Assets are added one at a
+time, so a summary can be kept up to date as assets arrive, or built in a
+single pass over a dump of assets.
+
+The output of :py:meth:`ItemSummary.metadata` has the same shape as the
+``elasticsearch_aggregator``, so the processors can be swapped.
+"""
+__author__ = 'Richard Smith'
+__date__ = '18 Oct 2026'
+__copyright__ = 'Copyright 2018 United Kingdom Research and Innovation'
+__license__ = 'BSD - see LICENSE file in top-level package directory'
+__contact__ = 'richard.d.smith@stfc.ac.uk'
+
+from datetime import datetime, timezone
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional
+
+from dateutil.parser import isoparse
+
+# Extent properties and whether the lowest or highest value is kept
+MIN_FIELDS = ('start_datetime', 'min_datetime', 'min_lon', 'min_lat')
+MAX_FIELDS = ('end_datetime', 'max_datetime', 'max_lon', 'max_lat')
+
+DATETIME_FIELDS = {'start_datetime', 'end_datetime', 'min_datetime', 'max_datetime'}
+
+# Properties summarised by the extent accumulators. Their values are only
+# kept when requested as facets, as every asset tends to have its own.
+EXTENT_PROPERTIES = frozenset({'datetime', 'start_datetime', 'end_datetime', 'min_lon', 'min_lat', 'max_lon', 'max_lat'})
+
+
+@lru_cache(maxsize=65536)
+def datetime_key(value: str) -> Optional[datetime]:
+    """
+    Comparable datetime for an ISO 8601 string. Naive values are taken to
+    be UTC. Unparseable values return ``None`` and are ignored.
+    """
+    try:
+        parsed = isoparse(value)
+    except (TypeError, ValueError):
+        return
+
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+
+    return parsed
+
+
+def extent_key(field: str, value):
+    """
+    Comparable form of an extent value, or ``None`` if it can't be compared
+    """
+    if field in DATETIME_FIELDS:
+        return datetime_key(value) if isinstance(value, str) else None
+
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return value
+
+
+def build_metadata(summaries: Dict, extent: Dict) -> Dict:
+    """
+    Combine the facet summaries and the extent into the processor output
+
+    :param summaries: Facet values
+    :param extent: Extent as returned by ``ItemSummary.extent`` or
+        ``ElasticsearchAggregator.parse_extent``
+    """
+    metadata = {}
+
+    if extent.get('temporal'):
+        summaries['start_datetime'] = extent['temporal'][0][0]
+        summaries['end_datetime'] = extent['temporal'][0][1]
+
+    if extent.get('spatial'):
+        summaries['min_lon'] = extent['spatial']['min_lon']
+        summaries['min_lat'] = extent['spatial']['min_lat']
+        summaries['max_lon'] = extent['spatial']['max_lon']
+        summaries['max_lat'] = extent['spatial']['max_lat']
+        metadata['bbox'] = extent['spatial']['bbox']
+
+    metadata['properties'] = summaries
+    return metadata
+
+
+class ItemSummary:
+    """
+    Value sets and extent accumulators for one item
+    """
+
+    __slots__ = ('values', 'bounds', 'assets')
+
+    def __init__(self):
+        self.values: Dict[str, set] = {}
+        # Extent field: (comparable key, original value)
+        self.bounds: Dict[str, tuple] = {}
+        self.assets = 0
+
+    def add(self, properties: Dict, facets: Optional[Iterable[str]] = None) -> None:
+        """
+        Add the properties of an asset
+
+        :param properties: Asset properties
+        :param facets: Only keep the values of these properties. If ``None``,
+            all the properties except the extent properties
+        """
+        self.assets += 1
+
+        for key, values in properties.items():
+            if key not in facets if facets is not None else key in EXTENT_PROPERTIES:
+                continue
+
+            if not isinstance(values, list):
+                values = [values]
+
+            value_set = self.values.setdefault(key, set())
+
+            for value in values:
+                try:
+                    value_set.add(value)
+                except TypeError:
+                    # Unhashable values, such as objects, can't be summarised
+                    pass
+
+        datetime_value = properties.get('datetime')
+
+        for field in MIN_FIELDS + MAX_FIELDS:
+            if field in ('min_datetime', 'max_datetime'):
+                value = datetime_value
+            else:
+                value = properties.get(field)
+
+            if value is not None:
+                self.update_bound(field, value)
+
+    def update_bound(self, field: str, value) -> None:
+        key = extent_key(field, value)
+
+        if key is None:
+            return
+
+        current = self.bounds.get(field)
+
+        if current is None or (key < current[0] if field in MIN_FIELDS else key > current[0]):
+            self.bounds[field] = (key, value)
+
+    def merge(self, other: 'ItemSummary') -> None:
+        """
+        Add the values and extent of another summary of the same item
+        """
+        self.assets += other.assets
+
+        for key, values in other.values.items():
+            self.values.setdefault(key, set()).update(values)
+
+        for field, (_, value) in other.bounds.items():
+            self.update_bound(field, value)
+
+    def bound(self, field: str):
+        current = self.bounds.get(field)
+        return current[1] if current else None
+
+    def bound_keys(self) -> Dict:
+        """
+        Numeric form of the extent bounds, with datetimes as epoch milliseconds
+        """
+        return {
+            field: key.timestamp() * 1000 if isinstance(key, datetime) else key
+            for field, (key, _) in self.bounds.items()
+        }
+
+    def extent(self) -> Dict:
+        """
+        Temporal and spatial extent in the form returned by
+        ``ElasticsearchAggregator.parse_extent``
+        """
+        extent = {}
+
+        start_datetime = self.bound('start_datetime')
+        end_datetime = self.bound('end_datetime')
+
+        # Prefer the start and end datetimes, which may be open ended
+        if start_datetime is not None or end_datetime is not None:
+            extent['temporal'] = [[start_datetime, end_datetime]]
+        elif self.bound('min_datetime') is not None:
+            extent['temporal'] = [[self.bound('min_datetime'), self.bound('max_datetime')]]
+
+        bbox = [self.bound(field) for field in ('min_lon', 'min_lat', 'max_lon', 'max_lat')]
+
+        if None not in bbox:
+            extent['spatial'] = dict(
+                bbox=bbox,
+                min_lon=bbox[0],
+                min_lat=bbox[1],
+                max_lon=bbox[2],
+                max_lat=bbox[3],
+            )
+
+        return extent
+
+    def metadata(self, facets: Iterable[str]) -> Dict:
+        """
+        Processor output for the facets
+
+        :param facets: Facets to summarise
+        """
+        summaries = {}
+
+        for facet in facets:
+            values = self.values.get(facet)
+            if values:
+                summaries[facet] = list(values)
+
+        return build_metadata(summaries, self.extent())
+
+    def to_dict(self) -> Dict:
+        """
+        JSON serializable form
+        """
+        return {
+            'assets': self.assets,
+            'values': {key: list(values) for key, values in self.values.items()},
+            'bounds': {field: value for field, (_, value) in self.bounds.items()},
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'ItemSummary':
+        summary = cls()
+        summary.assets = data.get('assets', 0)
+        summary.values = {key: set(values) for key, values in data.get('values', {}).items()}
+
+        for field, value in data.get('bounds', {}).items():
+            summary.update_bound(field, value)
+
+        return summary
+
+
+def is_hidden(body: Dict) -> bool:
+    """
+    Hidden assets are excluded from the summaries, as in the
+    ``elasticsearch_aggregator`` base query
+    """
+    return 'hidden' in body.get('categories', [])
+
+
+def summarise(assets: Iterable[Dict],
+              item_ids: Optional[Iterable[str]] = None,
+              facets: Optional[Iterable[str]] = None) -> Dict[str, ItemSummary]:
+    """
+    Build the summaries for the assets in a single pass
+
+    :param assets: Asset documents, either with the fields in ``body`` or at the top level
+    :param item_ids: Only summarise these items. All if ``None``
+    :param facets: Only keep the values of these properties. See :py:meth:`ItemSummary.add`
+    """
+    item_ids = set(item_ids) if item_ids is not None else None
+    facets = set(facets) if facets is not None else None
+    summaries: Dict[str, ItemSummary] = {}
+
+    for asset in assets:
+        body = asset.get('body', asset)
+
+        if is_hidden(body):
+            continue
+
+        item_id = body.get('item_id')
+
+        if item_ids is not None and item_id not in item_ids:
+            continue
+
+        summary = summaries.get(item_id)
+        if summary is None:
+            summary = summaries[item_id] = ItemSummary()
+
+        summary.add(body.get('properties', {}), facets)
+
+    return summaries
+
+
+__all__: List[str] = ['ItemSummary', 'build_metadata', 'summarise', 'is_hidden']
@@ -0,0 +1,371 @@
+# encoding: utf-8
+"""
+"""
+__author__ = 'Richard Smith'
+__date__ = '18 Oct 2026'
+__copyright__ = 'Copyright 2018 United Kingdom Research and Innovation'
+__license__ = 'BSD - see LICENSE file in top-level package directory'
+__contact__ = 'richard.d.smith@stfc.ac.uk'
+
+import asyncio
+import threading
+
+from asset_scanner.core.item_describer import ItemDescription
+
+from item_generator.core.query_planner import FacetCursor, FacetStrategy
+from item_generator.core.recording import AsyncRecordingClient, AsyncReplayClient
+from item_generator.core.summaries import ItemSummary, summarise
+
+from .elasticsearch_aggregator import ElasticsearchAggregator
+
+from typing import Any, Dict, Generator, Iterable, List, Optional, Tuple
+
+try:
+    from elasticsearch import AsyncElasticsearch
+except ImportError:
+    AsyncElasticsearch = None
+
+
+class AsyncElasticsearchAggregator(ElasticsearchAggregator):
+    """
+    .. list-table::
+
+        * - Processor Name
+          - ``async_elasticsearch_aggregator``
+        * - Accepts Pre-processors
+          - .. fa:: times
+        * - Accepts Post-processors
+          - .. fa:: times
+
+    Description:
+        Asynchronous version of the ``elasticsearch_aggregator`` using
+        `elasticsearch.AsyncElasticsearch<https://elasticsearch-py.readthedocs.io/en/7.10.0/async.html>`_.
+        The searches for each facet and the extent are run concurrently.
+        Use ``arun`` from a running event loop. ``run`` executes ``arun``
+        on a private event loop for synchronous callers. The loop runs in
+        its own thread, so ``run`` can be called from many threads at once,
+        for example by the ``BatchExecutor`` in ``thread`` mode.
+
+        Requires ``elasticsearch[async]``.
+
+    Configuration Options:
+        Accepts all the options of the ``elasticsearch_aggregator`` and:
+
+        - ``max_concurrent_requests``: Maximum number of searches in flight
+        from this processor. Default: ``100``
+
+    Configuration Example:
+
+        .. code-block:: yaml
+
+                name: async_elasticsearch_aggregator
+                inputs:
+                    index: ceda-index
+                    connection_kwargs:
+                      hosts: ['host1:9200','host2:9200']
+                    max_concurrent_requests: 200
+    """
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+
+        self.max_concurrent_requests = kwargs.get('max_concurrent_requests', 100)
+        self._semaphore = None
+        self._loop = None
+        self._loop_thread = None
+        self._loop_lock = threading.Lock()
+
+    def get_client(self, kwargs: Dict) -> 'AsyncElasticsearch':
+        """
+        Create the asynchronous Elasticsearch client, or the record and
+        replay clients
+
+        :param kwargs: Processor configuration
+        """
+        if kwargs.get('replay'):
+            return AsyncReplayClient(kwargs['replay'], latency=kwargs.get('replay_latency', False))
+
+        if AsyncElasticsearch is None:
+            raise ImportError(
+                'async_elasticsearch_aggregator requires the async extras. '
+                'Install with: pip install elasticsearch[async]'
+            )
+
+        client = AsyncElasticsearch(**self.build_connection_kwargs(kwargs))
+
+        if kwargs.get('record'):
+            return AsyncRecordingClient(client, kwargs['record'])
+
+        return client
+
+    @property
+    def semaphore(self) -> asyncio.Semaphore:
+        """
+        Limits the requests in flight to ``max_concurrent_requests``
+        """
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrent_requests)
+
+        return self._semaphore
+
+    async def search(self, query: Dict, filter_path: Optional[str] = None) -> Dict:
+        """
+        Run a search, limited by ``max_concurrent_requests``
+
+        :param query: Elasticsearch query to execute
+        :param filter_path: Only return these parts of the response
+        """
+        kwargs = {'filter_path': filter_path} if filter_path else {}
+
+        async with self.semaphore:
+            self.record_search()
+
+            with self.metrics.timer('item_generator_es_search_seconds'):
+                return await self.es.search(index=self.index, body=query, **kwargs)
+
+    async def adrive(self, searches: Generator, filter_path: Optional[str] = None) -> Any:
+        """
+        Run the searches yielded by the generator. See :py:meth:`ElasticsearchAggregator.drive`.
+        A list of searches is run concurrently, limited by ``max_concurrent_requests``.
+
+        :param searches: Generator of searches, such as ``summary_searches``
+        :param filter_path: Only return these parts of the responses
+        """
+        try:
+            query = next(searches)
+            while True:
+                if isinstance(query, list):
+                    results = await asyncio.gather(*[self.search(q, filter_path=filter_path) for q in query])
+                    query = searches.send(list(results))
+                else:
+                    query = searches.send(await self.search(query, filter_path=filter_path))
+        except StopIteration as stop:
+            return stop.value
+
+    async def aget_facet_values(self, facet: str, file_id: str, strategy: Optional[FacetStrategy] = None) -> List:
+        """
+        Page through the aggregations for the facet
+
+        :param facet: Facet to check
+        :param file_id: Collection ID
+        :param strategy: How to retrieve the values. Default: ``default_strategy``
+        :return: List of values for the facet
+        """
+        strategy = strategy or self.default_strategy
+        cursor = FacetCursor(facet, strategy)
+
+        first_page = self.query_template(
+            ('async_facet', facet, strategy),
+            lambda item_id: self.facet_query(item_id, [FacetCursor(facet, strategy)])
+        )
+
+        result = await self.search(first_page.render(file_id), filter_path=self.response_filter)
+
+        await self.adrive(self.facet_searches(file_id, self.parse_facet_aggs(result, [cursor])), self.response_filter)
+
+        return cursor.values
+
+    async def aget_extent(self, file_id: str) -> Dict:
+        """
+        Get the extent aggregation
+
+        :param file_id: collection ID
+        """
+        query = self.query_template(('async_extent',), self.async_extent_query)
+
+        return await self.search(query.render(file_id), filter_path=self.response_filter)
+
+    def async_extent_query(self, file_id: str) -> Dict:
+        """
+        Extent search which also returns an asset when not aggregating
+
+        :param file_id: collection ID
+        """
+        query = self.extent_query(file_id)
+        query['size'] = 0 if self.aggregate else 1
+
+        return query
+
+    async def aget_summaries(self,
+                             file_id: str,
+                             facets: List[str],
+                             description: Optional[ItemDescription] = None) -> Tuple[Dict, Dict]:
+        """
+        Retrieve the facet values and extent using the searches from
+        ``summary_searches``
+
+        :param file_id: Collection ID
+        :param facets: Facets to aggregate on
+        :param description: ItemDescription of the item, used by the query planner
+        :return: summaries, extent
+        """
+        if description is None:
+            searches = self.summary_searches(file_id, facets)
+        else:
+            searches = self.plan_searches(file_id, facets, description)
+
+        return await self.adrive(searches, self.response_filter)
+
+    async def arun(self, file_id: str, description: ItemDescription) -> Dict:
+        """
+        Run the processor
+        :param file_id: Collection ID to aggregate on
+        :param description: ItemDescription containing keys to summarise
+        """
+        # Aggregation facets and extra top level facets from the compiled plan
+        facets = self.plans.get(description).facets
+
+        with self.count_searches():
+            if self.summary_index:
+                summary = await self.aget_materialised_summary(file_id)
+                return summary.metadata(facets)
+
+            if self.single_request:
+                summaries, extent = await self.aget_summaries(file_id, facets, description)
+                return self.build_metadata(summaries, extent)
+
+            if not self.aggregate:
+                facets = []
+
+            strategies = await self.adrive(self.strategy_searches(file_id, facets, description), self.response_filter)
+
+            # The extent search also returns the asset used when not aggregating
+            results = await asyncio.gather(
+                self.aget_extent(file_id),
+                *[self.aget_facet_values(facet, file_id, strategies[facet]) for facet in facets]
+            )
+
+            extent_result = results[0]
+
+            if self.aggregate:
+                summaries = {facet: values for facet, values in zip(facets, results[1:]) if values}
+                self.observe_values(description, summaries)
+            else:
+                hits = extent_result['hits']['hits']
+                summaries = hits[0]['_source']['properties'] if hits else {}
+
+        return self.build_metadata(summaries, self.parse_extent(extent_result))
+
+    async def arun_batch(self, item_ids: List[str], descriptions: List[ItemDescription]) -> Dict[str, Dict]:
+        """
+        Run the processor for many items in one search.
+        See :py:meth:`ElasticsearchAggregator.run_batch`
+
+        :param item_ids: Item IDs to aggregate on
+        :param descriptions: ItemDescription for each item ID
+        :return: Dictionary of processor output keyed by item ID
+        """
+        if self.summary_index:
+            summaries = await self.aget_materialised_summaries(item_ids)
+            return {
+                item_id: summaries[item_id].metadata(self.plans.get(description).facets)
+                for item_id, description in zip(item_ids, descriptions)
+            }
+
+        return await self.adrive(self.batch_searches(item_ids, descriptions))
+
+    async def aupdate_summaries(self, assets: Iterable[Dict]) -> None:
+        """
+        Merge assets into the materialised summaries, updating the items
+        concurrently. See :py:meth:`ElasticsearchAggregator.update_summaries`
+
+        :param assets: Asset documents, either with the fields in ``body`` or at the top level
+        """
+        async def update(item_id: str, summary: ItemSummary) -> None:
+            async with self.semaphore:
+                await self.es.update(
+                    index=self.summary_index,
+                    id=item_id,
+                    body=self.summary_update(item_id, summary),
+                    retry_on_conflict=5
+                )
+
+        await asyncio.gather(*[update(item_id, summary) for item_id, summary in summarise(assets, facets=self.summary_facets).items()])
+
+    async def aget_materialised_summary(self, file_id: str) -> ItemSummary:
+        """
+        Read the materialised summary of the item
+
+        :param file_id: Item to read
+        """
+        self.record_search()
+
+        with self.metrics.timer('item_generator_es_search_seconds'):
+            doc = await self.es.get(index=self.summary_index, id=file_id, ignore=404)
+
+        return self.parse_summary_doc(doc)
+
+    async def aget_materialised_summaries(self, item_ids: List[str]) -> Dict[str, ItemSummary]:
+        """
+        Read the materialised summaries of the items in one request
+
+        :param item_ids: Items to read
+        """
+        self.record_search()
+
+        with self.metrics.timer('item_generator_es_search_seconds'):
+            result = await self.es.mget(index=self.summary_index, body={'ids': list(item_ids)})
+
+        return {doc['_id']: self.parse_summary_doc(doc) for doc in result['docs']}
+
+    def run_sync(self, coro):
+        """
+        Run the coroutine on the private event loop of the processor and
+        wait for the result. The loop runs in a dedicated thread, started
+        on first use, so the client and semaphore stay on one loop while
+        any number of threads submit work to it.
+        """
+        with self._loop_lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                self._loop_thread = threading.Thread(
+                    target=self._loop.run_forever,
+                    name='es-async-loop',
+                    daemon=True
+                )
+                self._loop_thread.start()
+
+        return asyncio.run_coroutine_threadsafe(coro, self._loop).result()
+
+    def run(self, file_id: str, description: ItemDescription) -> Dict:
+        """
+        Run the processor from synchronous code on a private event loop
+        :param file_id: Collection ID to aggregate on
+        :param description: ItemDescription containing keys to summarise
+        """
+        return self.run_sync(self.arun(file_id, description))
+
+    def run_batch(self, item_ids: List[str], descriptions: List[ItemDescription]) -> Dict[str, Dict]:
+        """
+        Run ``arun_batch`` from synchronous code on a private event loop
+
+        :param item_ids: Item IDs to aggregate on
+        :param descriptions: ItemDescription for each item ID
+        """
+        return self.run_sync(self.arun_batch(item_ids, descriptions))
+
+    def update_summaries(self, assets: Iterable[Dict]) -> None:
+        """
+        Run ``aupdate_summaries`` from synchronous code on a private event loop
+
+        :param assets: Asset documents
+        """
+        self.run_sync(self.aupdate_summaries(assets))
+
+    async def aclose(self) -> None:
+        """
+        Close the connections to Elasticsearch
+        """
+        await self.es.close()
+
+    def close(self) -> None:
+        """
+        Close the connections to Elasticsearch and the private event loop
+        """
+        self.run_sync(self.aclose())
+
+        with self._loop_lock:
+            loop, self._loop = self._loop, None
+            loop.call_soon_threadsafe(loop.stop)
+            self._loop_thread.join()
+            loop.close()
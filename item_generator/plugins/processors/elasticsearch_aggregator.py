@@ -10,9 +10,70 @@ __contact__ = 'richard.d.smith@stfc.ac.uk'
 from asset_scanner.core.processor import BaseAggregationProcessor
 from asset_scanner.core.types import SpatialExtent, TemporalExtent
 from asset_scanner.core.item_describer import ItemDescription
+from cachetools import LRUCache
 from elasticsearch import Elasticsearch
 
-from typing import Optional, List, Dict
+from item_generator.core.metrics import COUNT_BUCKETS, NULL_METRICS
+from item_generator.core.plan import PlanCache, QueryTemplate
+from item_generator.core.query_planner import (
+    COMPOSITE,
+    PARTITIONS,
+    RESPONSE_FILTER,
+    FacetCursor,
+    FacetStrategy,
+    QueryPlanner,
+)
+from item_generator.core.recording import RecordingClient, ReplayClient
+from item_generator.core.summaries import MIN_FIELDS, ItemSummary, build_metadata, summarise
+
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from contextvars import ContextVar, copy_context
+from typing import Any, Callable, Optional, Iterable, List, Dict, Generator, Tuple, Union
+
+# Number of searches made for the item being summarised
+ITEM_SEARCHES: ContextVar[Optional[List[int]]] = ContextVar('item_searches', default=None)
+
+# Merges the summary of newly indexed assets into the stored summary of an item.
+# The stored document has the form of ``ItemSummary.to_dict``, except the values
+# of each facet are held as a map keyed by their JSON encoding so adding them is
+# a constant time lookup. ``bound_keys`` holds the numeric form of each bound
+# for comparison.
+SUMMARY_SCRIPT = """
+ctx._source.assets += params.assets;
+for (entry in params.values.entrySet()) {
+    def current = ctx._source.values[entry.getKey()];
+    if (current == null) {
+        ctx._source.values[entry.getKey()] = entry.getValue();
+    } else {
+        current.putAll(entry.getValue());
+    }
+}
+for (entry in params.bounds.entrySet()) {
+    String field = entry.getKey();
+    def key = params.bound_keys[field];
+    def current = ctx._source.bound_keys[field];
+    if (current == null || (params.min_fields.contains(field) ? key < current : key > current)) {
+        ctx._source.bound_keys[field] = key;
+        ctx._source.bounds[field] = entry.getValue();
+    }
+}
+"""
+
+# Mapping for the summary index. The summaries are only read back by ID
+SUMMARY_INDEX_MAPPING = {
+    'mappings': {
+        'properties': {
+            'item_id': {'type': 'keyword'},
+            'assets': {'type': 'long'},
+            'values': {'type': 'object', 'enabled': False},
+            'bounds': {'type': 'object', 'enabled': False},
+            'bound_keys': {'type': 'object', 'enabled': False},
+        }
+    }
+}
 
 
 class ElasticsearchAggregator(BaseAggregationProcessor):
@@ -33,6 +94,39 @@ class ElasticsearchAggregator(BaseAggregationProcessor):
         - ``item_index``: ``REQUIRED`` Name of the index holding the STAC items
         - ``connection_kwargs``: ``REQUIRED`` Connection parameters passed to
         `elasticsearch.Elasticsearch<https://elasticsearch-py.readthedocs.io/en/7.10.0/api.html>`_
+        - ``pool_size``: Maximum number of connections kept open to each node.
+        Sets ``maxsize`` in the connection parameters.
+        - ``keep_alive``: Keep connections open between requests. Default: ``True``
+        - ``single_request``: Build all the facet and extent aggregations into
+        a single search. Only facets with more than one page of values make
+        further requests. Default: ``False``
+        - ``batch_page_size``: Number of buckets per page when aggregating many
+        items at once with ``run_batch``. Default: ``1000``
+        - ``record``: Path of a log to record every search and response to.
+        See :py:mod:`item_generator.core.recording`
+        - ``replay``: Path of a recorded log to serve the searches from
+        instead of Elasticsearch. ``connection_kwargs`` is not required
+        - ``replay_latency``: Sleep for the recorded latency of each replayed
+        search. Default: ``False``
+        - ``summary_index``: Name of an index of materialised item summaries.
+        ``run`` reads the summary of the item with a single ``get`` instead
+        of aggregating over the assets. The summaries are kept up to date by
+        passing assets to ``update_summaries`` as they are indexed, which
+        merges them into the stored summary with a scripted upsert. Create
+        the index with ``SUMMARY_INDEX_MAPPING``. Items without a summary
+        return no properties.
+        - ``summary_facets``: Only keep the values of these properties in the
+        materialised summaries. Default: all but the extent properties
+        - ``query_planner``: Choose a ``terms``, ``composite`` or partitioned
+        ``terms`` aggregation for each facet from a cached estimate of the
+        number of values in the collection. Searches skip the hit count and
+        only return the parsed parts of the response. ``True`` or the
+        options of :py:class:`item_generator.core.query_planner.QueryPlanner`.
+        Default: every facet is paged with a composite aggregation
+        - ``parallel_partitions``: Fetch the partitions of a partitioned facet
+        concurrently, with up to this many searches at once, rather than one
+        after another. Partitioned facets are chosen by the ``query_planner``.
+        Default: ``0``, fetched in sequence
 
     Configuration Example:
 
@@ -43,31 +137,290 @@ class ElasticsearchAggregator(BaseAggregationProcessor):
                     index: ceda-index
                     connection_kwargs:
                       hosts: ['host1:9200','host2:9200']
+                    pool_size: 10
+                    single_request: True
+
+        .. code-block:: yaml
+
+                name: elasticsearch_aggregator
+                inputs:
+                    index: ceda-index
+                    summary_index: ceda-item-summaries
+                    connection_kwargs:
+                      hosts: ['host1:9200','host2:9200']
+
+        .. code-block:: yaml
+
+                name: elasticsearch_aggregator
+                inputs:
+                    index: ceda-index
+                    connection_kwargs:
+                      hosts: ['host1:9200','host2:9200']
+                    single_request: True
+                    query_planner:
+                      terms_max: 1000
+                      ttl: 3600
+                    parallel_partitions: 8
     """
 
+    PAGE_SIZE = 100
+
+    # Maximum number of serialized queries held by ``query_template``
+    QUERY_TEMPLATES = 1000
+
+    # Replaced by the registry of the extractor.
+    # See :py:mod:`item_generator.core.metrics`
+    metrics = NULL_METRICS
+
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
 
         self.kwargs = kwargs
-        self.es = Elasticsearch(**kwargs['connection_kwargs'])
+        self.es = self.get_client(kwargs)
         self.index = kwargs['index']
         self.aggregate = kwargs.get('aggregate', True)
+        self.single_request = kwargs.get('single_request', False)
+        self.batch_page_size = kwargs.get('batch_page_size', 1000)
+        self.summary_index = kwargs.get('summary_index')
+        self.summary_facets = kwargs.get('summary_facets')
+        self.planner = QueryPlanner.from_conf(kwargs.get('query_planner'))
+        self.parallel_partitions = kwargs.get('parallel_partitions', 0)
+        self._pool = None
+
+        self.plans = PlanCache()
+        self.query_templates: LRUCache = LRUCache(maxsize=self.QUERY_TEMPLATES)
+        self.template_lock = threading.Lock()
+
+    @staticmethod
+    def build_connection_kwargs(kwargs: Dict) -> Dict:
+        """
+        Build the connection parameters, applying the connection pool options
+
+        :param kwargs: Processor configuration
+        """
+        connection_kwargs = dict(kwargs['connection_kwargs'])
+
+        if kwargs.get('pool_size'):
+            connection_kwargs['maxsize'] = kwargs['pool_size']
+
+        if 'keep_alive' in kwargs:
+            headers = dict(connection_kwargs.get('headers') or {})
+            headers['connection'] = 'keep-alive' if kwargs['keep_alive'] else 'close'
+            connection_kwargs['headers'] = headers
+
+        return connection_kwargs
+
+    def get_client(self, kwargs: Dict) -> Elasticsearch:
+        """
+        Create the Elasticsearch client, or the record and replay clients
+
+        :param kwargs: Processor configuration
+        """
+        if kwargs.get('replay'):
+            return ReplayClient(kwargs['replay'], latency=kwargs.get('replay_latency', False))
+
+        client = Elasticsearch(**self.build_connection_kwargs(kwargs))
+
+        if kwargs.get('record'):
+            return RecordingClient(client, kwargs['record'])
+
+        return client
+
+    def close(self) -> None:
+        """
+        Close the connections to Elasticsearch and stop the partition threads
+        """
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+
+        self.es.close()
+
+    def query_template(self, key: Tuple, build: Callable[[str], Dict]) -> QueryTemplate:
+        """
+        Return the serialized query for the key, building it on first use.
+        Searches which only differ by item ID are serialized once.
+
+        :param key: Name of the query and the facets it covers
+        :param build: Builds the query for an item ID
+        """
+        with self.template_lock:
+            template = self.query_templates.get(key)
+
+        if template is None:
+            template = QueryTemplate(build(QueryTemplate.PLACEHOLDER))
+
+            with self.template_lock:
+                self.query_templates[key] = template
+
+        return template
+
+    def record_search(self) -> None:
+        """
+        Count a round trip to Elasticsearch
+        """
+        self.metrics.inc('item_generator_es_searches_total')
+
+        searches = ITEM_SEARCHES.get()
+        if searches is not None:
+            searches[0] += 1
+
+    @contextmanager
+    def count_searches(self):
+        """
+        Record the number of searches made within the block as the
+        searches for one item
+        """
+        if not self.metrics.enabled:
+            yield
+            return
+
+        token = ITEM_SEARCHES.set([0])
+        try:
+            yield
+        finally:
+            self.metrics.observe('item_generator_es_searches_per_item', ITEM_SEARCHES.get()[0], buckets=COUNT_BUCKETS)
+            ITEM_SEARCHES.reset(token)
+
+    @property
+    def response_filter(self) -> Optional[str]:
+        """
+        ``filter_path`` for searches which only return aggregations
+        """
+        if self.planner and self.aggregate:
+            return RESPONSE_FILTER
+
+    def search(self, query, filter_path: Optional[str] = None) -> Dict:
+        """
+        Run a search against the index
+
+        :param query: Elasticsearch query or serialized query body
+        :param filter_path: Only return these parts of the response
+        """
+        self.record_search()
+
+        kwargs = {'filter_path': filter_path} if filter_path else {}
+
+        with self.metrics.timer('item_generator_es_search_seconds'):
+            return self.es.search(index=self.index, body=query, **kwargs)
+
+    def search_many(self, queries: List, filter_path: Optional[str] = None) -> List[Dict]:
+        """
+        Run the searches concurrently, up to ``parallel_partitions`` at once
+
+        :param queries: Elasticsearch queries
+        :param filter_path: Only return these parts of the responses
+        """
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(max_workers=self.parallel_partitions, thread_name_prefix='es-partition')
+
+        # Each search runs in a copy of the context so it is counted for the item
+        futures = [
+            self._pool.submit(copy_context().run, self.search, query, filter_path)
+            for query in queries
+        ]
+
+        return [future.result() for future in futures]
+
+    def drive(self, searches: Generator, filter_path: Optional[str] = None) -> Any:
+        """
+        Run the searches yielded by the generator, sending back each
+        response, and return the result of the generator. A list of searches
+        is run concurrently and the list of responses is sent back.
+
+        :param searches: Generator of searches, such as ``summary_searches``
+        :param filter_path: Only return these parts of the responses
+        """
+        try:
+            query = next(searches)
+            while True:
+                if isinstance(query, list):
+                    query = searches.send(self.search_many(query, filter_path))
+                else:
+                    query = searches.send(self.search(query, filter_path=filter_path))
+        except StopIteration as stop:
+            return stop.value
+
+    @staticmethod
+    def summary_update(item_id: str, summary: ItemSummary) -> Dict:
+        """
+        Scripted upsert which merges the summary into the stored summary of
+        the item, or stores it if the item has none
+
+        :param item_id: Item the assets belong to
+        :param summary: Summary of the new assets
+        """
+        document = summary.to_dict()
+        document['values'] = {
+            key: {json.dumps(value): value for value in values}
+            for key, values in document['values'].items()
+        }
+        document['bound_keys'] = summary.bound_keys()
+
+        params = dict(document, min_fields=list(MIN_FIELDS))
+
+        return {
+            'script': {
+                'source': SUMMARY_SCRIPT,
+                'lang': 'painless',
+                'params': params,
+            },
+            'upsert': dict(document, item_id=item_id),
+        }
 
-    def get_page(self, query: Dict, facet: str, result_list: List) -> List:
+    def update_summaries(self, assets: Iterable[Dict]) -> None:
         """
-        Get page of aggregations and parse the results
-        :param query: Elasticsearch query to execute
-        :param facet: Facet to retrieve values for
-        :param result_list: list to extend with any found values
+        Merge assets into the materialised summaries. Call as the assets are
+        indexed. Each item is updated once for all its assets in the batch.
+
+        :param assets: Asset documents, either with the fields in ``body`` or at the top level
+        """
+        for item_id, summary in summarise(assets, facets=self.summary_facets).items():
+            self.es.update(
+                index=self.summary_index,
+                id=item_id,
+                body=self.summary_update(item_id, summary),
+                retry_on_conflict=5
+            )
+
+    @staticmethod
+    def parse_summary_doc(doc: Dict) -> ItemSummary:
+        """
+        Summary from a ``get`` response. Empty if the item has no summary.
+        """
+        if not doc.get('found'):
+            return ItemSummary()
+
+        source = doc['_source']
+        values = {key: list(values.values()) for key, values in source.get('values', {}).items()}
+
+        return ItemSummary.from_dict(dict(source, values=values))
+
+    def get_materialised_summary(self, file_id: str) -> ItemSummary:
         """
+        Read the materialised summary of the item
 
-        result = self.es.search(index=self.index, body=query)
+        :param file_id: Item to read
+        """
+        self.record_search()
+
+        with self.metrics.timer('item_generator_es_search_seconds'):
+            doc = self.es.get(index=self.summary_index, id=file_id, ignore=404)
 
-        if result['aggregations']:
-            buckets = result['aggregations']['facet']['buckets']
-            result_list.extend([bucket['key'][facet] for bucket in buckets])
+        return self.parse_summary_doc(doc)
 
-            return result['aggregations']['facet'].get('after_key')
+    def get_materialised_summaries(self, item_ids: List[str]) -> Dict[str, ItemSummary]:
+        """
+        Read the materialised summaries of the items in one request
+
+        :param item_ids: Items to read
+        """
+        self.record_search()
+
+        with self.metrics.timer('item_generator_es_search_seconds'):
+            result = self.es.mget(index=self.summary_index, body={'ids': list(item_ids)})
+
+        return {doc['_id']: self.parse_summary_doc(doc) for doc in result['docs']}
 
     @staticmethod
     def base_query(file_id: str) -> Dict:
@@ -141,52 +494,166 @@ class ElasticsearchAggregator(BaseAggregationProcessor):
             },
         }
 
-    @staticmethod
-    def facet_composite_query(facet: str) -> Dict:
+    @property
+    def default_strategy(self) -> FacetStrategy:
         """
-        Generate the composite aggregation for the facet
-        :param facet: Facet to aggregate on
+        Strategy for every facet without a query planner
         """
-        return {
-            "facet": {
-                "composite": {
-                    "sources": [
-                        {
-                            facet: {
-                                "terms": {
-                                    "field": f"properties.{facet}.keyword"
-                                }
-                            }
-                        }
-                    ],
-                    "size": 100
-                }
-            }
-        }
+        return FacetStrategy(COMPOSITE, self.PAGE_SIZE)
+
+    def facet_query(self, file_id: str, cursors: List[FacetCursor]) -> Dict:
+        """
+        Search for the next aggregation of each facet
+
+        :param file_id: Collection ID
+        :param cursors: Facets to aggregate on
+        """
+        query = self.base_query(file_id)
+        query['size'] = 0
+        query['aggs'] = {self.facet_agg_name(cursor.facet): cursor.agg() for cursor in cursors}
+
+        if self.planner:
+            query['track_total_hits'] = False
+
+        return query
+
+    def parse_facet_aggs(self, result: Dict, cursors: List[FacetCursor]) -> List[FacetCursor]:
+        """
+        Pass the named facet aggregations in the response to their cursors
+
+        :param result: Elasticsearch result
+        :param cursors: Facets in the search
+        :return: The cursors with more values to retrieve
+        """
+        aggs = result.get('aggregations') or {}
+
+        for cursor in cursors:
+            agg = aggs.get(self.facet_agg_name(cursor.facet))
+
+            if agg and cursor.strategy.kind == COMPOSITE:
+                self.metrics.inc('item_generator_es_composite_pages_total')
+
+            cursor.parse(agg)
+
+        return [cursor for cursor in cursors if not cursor.done]
+
+    def facet_searches(self, file_id: str, cursors: List[FacetCursor]) -> Generator[Union[Dict, List[Dict]], Any, None]:
+        """
+        Generator which yields the searches for the remaining values of the
+        facets. Each search requests the next aggregation of every facet
+        which has more values, so the number of requests is set by the facet
+        with the most.
+
+        With ``parallel_partitions``, each remaining partition of a
+        partitioned facet is requested in its own search and the searches
+        of a round are yielded together as a list, to be run concurrently.
+
+        :param file_id: Collection ID
+        :param cursors: Facets to retrieve
+        """
+        cursors = [cursor for cursor in cursors if not cursor.done]
+
+        partitions = {}
+        if self.parallel_partitions:
+            partitions = {cursor: cursor.split() for cursor in cursors if cursor.strategy.kind == PARTITIONS}
+
+        groups = [[cursor for cursor in cursors if cursor not in partitions]]
+        groups.extend([part] for parts in partitions.values() for part in parts)
+        groups = [group for group in groups if group]
+
+        while groups:
+            queries = [self.facet_query(file_id, group) for group in groups]
+
+            if len(queries) == 1:
+                results = [(yield queries[0])]
+            else:
+                results = yield queries
+
+            groups = [self.parse_facet_aggs(result, group) for result, group in zip(results, groups)]
+            groups = [group for group in groups if group]
+
+        # Merge the partitions in order
+        for cursor, parts in partitions.items():
+            cursor.values.extend(value for part in parts for value in part.values)
+            cursor.done = True
+
+    def strategy_searches(self,
+                          file_id: str,
+                          facets: List[str],
+                          description: ItemDescription) -> Generator[Dict, Dict, Dict[str, FacetStrategy]]:
+        """
+        Generator which yields the search to estimate the number of values of
+        the facets if the planner has no estimate for the collection
 
-    def get_facet_values(self, facet: str, file_id: str) -> List:
+        :param file_id: Collection ID
+        :param facets: Facets to aggregate on
+        :param description: ItemDescription of the item
+        :return: Strategy for each facet
+        """
+        if not self.planner or not self.aggregate:
+            return {facet: self.default_strategy for facet in facets}
+
+        collection = self.planner.collection_key(description)
+        estimates = self.planner.get_estimates(collection, facets)
+        missing = [facet for facet in facets if facet not in estimates]
+
+        if missing:
+            query = self.base_query(file_id)
+            query['size'] = 0
+            query['track_total_hits'] = False
+            query['aggs'] = self.planner.cardinality_aggs(missing)
+
+            result = yield query
+
+            found = self.planner.parse_cardinality(result, missing)
+            self.planner.set_estimates(collection, found)
+            estimates.update(found)
+
+        strategies = {facet: self.planner.choose(estimates[facet]) for facet in facets}
+
+        for strategy in strategies.values():
+            self.metrics.inc('item_generator_es_facet_strategies_total', strategy=strategy.kind)
+
+        return strategies
+
+    def observe_values(self, description: ItemDescription, summaries: Dict[str, List]) -> None:
+        """
+        Pass the number of values found for each facet to the query planner,
+        so later items in the collection start from the observed count
+
+        :param description: ItemDescription of the item
+        :param summaries: Values of each facet
+        """
+        if self.planner and self.aggregate:
+            self.planner.observe(
+                self.planner.collection_key(description),
+                {facet: len(values) for facet, values in summaries.items()}
+            )
+
+    def get_facet_values(self, facet: str, file_id: str, strategy: Optional[FacetStrategy] = None) -> List:
         """
-        Query elasticsearch and scroll the aggregation response
+        Query elasticsearch and page through the aggregation response
         to get all the values for the given facet within the given
         collection.
 
         :param facet: Facet to check
         :param file_id: Collection ID
+        :param strategy: How to retrieve the values. Default: ``default_strategy``
         :return: List of values for the facet
         """
+        strategy = strategy or self.default_strategy
+        cursor = FacetCursor(facet, strategy)
 
-        query = self.base_query(file_id)
-        query['aggs'] = self.facet_composite_query(facet)
-
-        facet_values = []
+        first_page = self.query_template(
+            ('facet', facet, strategy),
+            lambda item_id: self.facet_query(item_id, [FacetCursor(facet, strategy)])
+        )
 
-        after_key = self.get_page(query, facet, facet_values)
+        result = self.search(first_page.render(file_id), filter_path=self.response_filter)
 
-        while after_key:
-            query['aggs']['facet']['composite']['after'] = after_key
-            after_key = self.get_page(query, facet, facet_values)
+        self.drive(self.facet_searches(file_id, self.parse_facet_aggs(result, [cursor])), self.response_filter)
 
-        return facet_values
+        return cursor.values
 
     @staticmethod
     def get_temporal_extent(response) -> Optional[TemporalExtent]:
@@ -201,17 +668,17 @@ class ElasticsearchAggregator(BaseAggregationProcessor):
         :return: [[start_date,end_date]]
         """
 
-        aggs = response['aggregations']
+        aggs = response.get('aggregations')
 
         if aggs:
 
             # Comes from datetime
-            max_datetime = aggs['max_datetime'].get('value_as_string')
-            min_datetime = aggs['min_datetime'].get('value_as_string')
+            max_datetime = aggs.get('max_datetime', {}).get('value_as_string')
+            min_datetime = aggs.get('min_datetime', {}).get('value_as_string')
 
             # comes from start and end datetime
-            end_datetime = aggs['end_datetime'].get('value_as_string')
-            start_datetime = aggs['start_datetime'].get('value_as_string')
+            end_datetime = aggs.get('end_datetime', {}).get('value_as_string')
+            start_datetime = aggs.get('start_datetime', {}).get('value_as_string')
 
             # Prefer values from start/end datetime as these are likely to be
             # more specific. Open date ranges are allowed to one of the values
@@ -232,13 +699,14 @@ class ElasticsearchAggregator(BaseAggregationProcessor):
         :param response: Elasticsearch result
         :return: [[minLon, minLat, maxLon, maxLat, (minHeight), (maxHeight)]]
         """
-        aggs = response['aggregations']
+        aggs = response.get('aggregations')
 
         if aggs:
-            min_lon = aggs['min_lon']['value']
-            min_lat = aggs['min_lat']['value']
-            max_lon = aggs['max_lon']['value']
-            max_lat = aggs['max_lat']['value']
+            # Missing when the null values are removed by filter_path
+            min_lon = aggs.get('min_lon', {}).get('value')
+            min_lat = aggs.get('min_lat', {}).get('value')
+            max_lon = aggs.get('max_lon', {}).get('value')
+            max_lat = aggs.get('max_lat', {}).get('value')
             bbox = [
                 min_lon,
                 min_lat,
@@ -261,6 +729,18 @@ class ElasticsearchAggregator(BaseAggregationProcessor):
         :param file_id: collection ID
         """
 
+        query = self.query_template(('extent',), self.extent_query)
+
+        result = self.search(query.render(file_id), filter_path=self.response_filter)
+
+        return self.parse_extent(result)
+
+    def extent_query(self, file_id: str) -> Dict:
+        """
+        Query for the time range and bbox aggregations
+
+        :param file_id: collection ID
+        """
         query = self.base_query(file_id)
 
         # Time range query
@@ -269,8 +749,18 @@ class ElasticsearchAggregator(BaseAggregationProcessor):
         # bounding box coordinate query
         query['aggs'].update(self.bbox_query())
 
-        result = self.es.search(index=self.index, body=query)
+        if self.planner:
+            query['track_total_hits'] = False
 
+        return query
+
+    def parse_extent(self, result: Dict) -> Dict:
+        """
+        Extract the temporal and spatial extent from a response which
+        includes the time range and bbox aggregations.
+
+        :param result: Elasticsearch result
+        """
         extent = {}
         temporal_extent = self.get_temporal_extent(result)
         spatial_extent = self.get_spatial_extent(result)
@@ -284,45 +774,343 @@ class ElasticsearchAggregator(BaseAggregationProcessor):
 
     def get_asset_properties(self, file_id: str):
 
-        query = self.base_query(file_id=file_id)
-        result = self.es.search(index=self.index, body=query)
+        query = self.query_template(('asset',), self.base_query)
+        result = self.search(query.render(file_id))
         asset = result['hits']['hits'][0]
         properties = asset['_source']['properties']
         return properties
 
+    @staticmethod
+    def facet_agg_name(facet: str) -> str:
+        """
+        Name of the aggregation for the facet when several facets
+        are requested in the same search.
+
+        :param facet: Facet to aggregate on
+        """
+        return f'facet_{facet}'
+
+    def summary_query(self, file_id: str, strategies: Dict[str, FacetStrategy]) -> Dict:
+        """
+        Build a single search which holds the first aggregation for all
+        the facets along with the time range and bbox aggregations.
+
+        :param file_id: Collection ID
+        :param strategies: Facets to aggregate on and how
+        """
+        query = self.base_query(file_id)
+        query['size'] = 0 if self.aggregate else 1
+
+        query['aggs'] = self.time_range_query()
+        query['aggs'].update(self.bbox_query())
+
+        if self.aggregate:
+            for facet, strategy in strategies.items():
+                query['aggs'][self.facet_agg_name(facet)] = FacetCursor(facet, strategy).agg()
+
+            if self.planner:
+                query['track_total_hits'] = False
+
+        return query
+
+    def summary_searches(self,
+                         file_id: str,
+                         facets: List[str],
+                         strategies: Optional[Dict[str, FacetStrategy]] = None) -> Generator[Dict, Dict, Tuple[Dict, Dict]]:
+        """
+        Generator which yields the searches needed to retrieve the facet
+        values and extent with a single search. Facets which have further
+        values are then requested together, so the number of requests
+        is set by the facet with the most values.
+
+        The response to each search is sent back into the generator, which
+        allows the same logic to be used with synchronous and asynchronous
+        clients.
+
+        :param file_id: Collection ID
+        :param facets: Facets to aggregate on
+        :param strategies: How to retrieve each facet. Default: ``default_strategy``
+        :return: summaries, extent
+        """
+        if strategies is None:
+            strategies = {facet: self.default_strategy for facet in facets}
+
+        query = self.query_template(
+            ('summary', *facets, *(strategies[facet] for facet in facets)),
+            lambda item_id: self.summary_query(item_id, strategies)
+        )
+        result = yield query.render(file_id)
+
+        extent = self.parse_extent(result)
+
+        if not self.aggregate:
+            hits = result['hits']['hits']
+            return (hits[0]['_source']['properties'] if hits else {}), extent
+
+        cursors = [FacetCursor(facet, strategies[facet]) for facet in facets]
+
+        yield from self.facet_searches(file_id, self.parse_facet_aggs(result, cursors))
+
+        summaries = {cursor.facet: cursor.values for cursor in cursors if cursor.values}
+
+        return summaries, extent
+
+    def plan_searches(self,
+                      file_id: str,
+                      facets: List[str],
+                      description: ItemDescription) -> Generator[Dict, Dict, Tuple[Dict, Dict]]:
+        """
+        Generator which chooses the strategy for each facet then yields the
+        searches from ``summary_searches``
+
+        :param file_id: Collection ID
+        :param facets: Facets to aggregate on
+        :param description: ItemDescription of the item
+        :return: summaries, extent
+        """
+        strategies = yield from self.strategy_searches(file_id, facets, description)
+
+        summaries, extent = yield from self.summary_searches(file_id, facets, strategies)
+        self.observe_values(description, summaries)
+
+        return summaries, extent
+
+    def get_summaries(self,
+                      file_id: str,
+                      facets: List[str],
+                      description: Optional[ItemDescription] = None) -> Tuple[Dict, Dict]:
+        """
+        Retrieve the facet values and extent using the searches from
+        ``summary_searches``
+
+        :param file_id: Collection ID
+        :param facets: Facets to aggregate on
+        :param description: ItemDescription of the item, used by the query planner
+        :return: summaries, extent
+        """
+        if description is None:
+            searches = self.summary_searches(file_id, facets)
+        else:
+            searches = self.plan_searches(file_id, facets, description)
+
+        return self.drive(searches, self.response_filter)
+
+    # Shared with the processors which summarise the assets in Python
+    build_metadata = staticmethod(build_metadata)
+
     def run(self, file_id: str, description: ItemDescription) -> Dict:
         """
         Run the processor
         :param file_id: Collection ID to aggregate on
         :param description: ItemDescription containing keys to summarise
         """
-        metadata = {}
-        if self.aggregate:
-            # Get list of aggregation facets and extra top level facets
-            facets = set(description.facets.aggregation_facets + description.facets.search_facets)
-
-            # Poll elasticsearch for value list for each facet
-            summaries = {}
-            for facet in facets:
-                values = self.get_facet_values(facet, file_id)
-                if values:
-                    summaries[facet] = values
-        else:
-            summaries = self.get_asset_properties(file_id)
+        # Aggregation facets and extra top level facets from the compiled plan
+        facets = self.plans.get(description).facets
+
+        with self.count_searches():
+            if self.summary_index:
+                return self.get_materialised_summary(file_id).metadata(facets)
+
+            if self.single_request:
+                summaries, extent = self.get_summaries(file_id, facets, description)
+
+            else:
+                if self.aggregate:
+                    strategies = self.drive(self.strategy_searches(file_id, facets, description), self.response_filter)
+
+                    # Poll elasticsearch for value list for each facet
+                    summaries = {}
+                    for facet in facets:
+                        values = self.get_facet_values(facet, file_id, strategies[facet])
+                        if values:
+                            summaries[facet] = values
+
+                    self.observe_values(description, summaries)
+                else:
+                    summaries = self.get_asset_properties(file_id)
+
+                # Get extent aggregation
+                extent = self.get_extent(file_id)
+
+        return self.build_metadata(summaries, extent)
+
+    @staticmethod
+    def batch_base_query(item_ids: List[str]) -> Dict:
+        """
+        Base query to filter the results to a set of items
+
+        :param item_ids: Items to restrict results to
+        """
+        query = ElasticsearchAggregator.base_query('')
+        query['query']['bool']['must'] = [
+            {
+                "terms": {
+                    "item_id.keyword": item_ids
+                }
+            }
+        ]
+        query['size'] = 0
+        return query
+
+    def batch_facet_composite_query(self, facet: str) -> Dict:
+        """
+        Generate the composite aggregation for the facet, split by item
+
+        :param facet: Facet to aggregate on
+        """
+        return {
+            "composite": {
+                "sources": [
+                    {
+                        "item_id": {
+                            "terms": {
+                                "field": "item_id.keyword"
+                            }
+                        }
+                    },
+                    {
+                        facet: {
+                            "terms": {
+                                "field": f"properties.{facet}.keyword"
+                            }
+                        }
+                    }
+                ],
+                "size": self.batch_page_size
+            }
+        }
+
+    def batch_extent_query(self, item_ids: List[str]) -> Dict:
+        """
+        Generate the time range and bbox aggregations, split by item
 
-        # Get extent aggregation
-        extent = self.get_extent(file_id)
+        :param item_ids: Items to aggregate
+        """
+        aggs = self.time_range_query()
+        aggs.update(self.bbox_query())
+
+        if not self.aggregate:
+            aggs['asset'] = {
+                "top_hits": {
+                    "size": 1,
+                    "_source": ["properties"]
+                }
+            }
+
+        return {
+            "terms": {
+                "field": "item_id.keyword",
+                "size": len(item_ids)
+            },
+            "aggs": aggs
+        }
+
+    def batch_searches(self,
+                       item_ids: List[str],
+                       descriptions: List[ItemDescription]) -> Generator[Dict, Dict, Dict[str, Dict]]:
+        """
+        Generator which yields the searches needed to aggregate many items
+        at once. The response to each search is sent back into the generator.
+        See ``run_batch``.
+
+        :param item_ids: Item IDs to aggregate on
+        :param descriptions: ItemDescription for each item ID
+        :return: Dictionary of processor output keyed by item ID
+        """
+        item_facets = {}
+        for item_id, description in zip(item_ids, descriptions):
+            item_facets[item_id] = set(self.plans.get(description).facets)
+
+        item_ids = list(item_facets)
+
+        if not item_ids:
+            return {}
+
+        facets = set().union(*item_facets.values()) if self.aggregate else set()
+
+        facet_values = {item_id: {} for item_id in item_ids}
+
+        query = self.batch_base_query(item_ids)
+        query['aggs'] = {'items': self.batch_extent_query(item_ids)}
+        for facet in facets:
+            query['aggs'][self.facet_agg_name(facet)] = self.batch_facet_composite_query(facet)
+
+        extent_buckets = []
+        after_keys = {}
 
-        if extent.get('temporal'):
-            summaries['start_datetime'] = extent['temporal'][0][0]
-            summaries['end_datetime'] = extent['temporal'][0][1]
+        while True:
+            result = yield query
+            aggs = result.get('aggregations') or {}
 
-        if extent.get('spatial'):
-            summaries['min_lon'] = extent['spatial']['min_lon']
-            summaries['min_lat'] = extent['spatial']['min_lat']
-            summaries['max_lon'] = extent['spatial']['max_lon']
-            summaries['max_lat'] = extent['spatial']['max_lat']
-            metadata['bbox'] = extent['spatial']['bbox']
+            if 'items' in aggs:
+                extent_buckets = aggs['items']['buckets']
+
+            for facet in list(facets):
+                agg = aggs.get(self.facet_agg_name(facet))
+                if not agg:
+                    continue
+
+                self.metrics.inc('item_generator_es_composite_pages_total')
+
+                buckets = agg['buckets']
+                for bucket in buckets:
+                    item_id = bucket['key']['item_id']
+                    if item_id in facet_values:
+                        facet_values[item_id].setdefault(facet, []).append(bucket['key'][facet])
+
+                if len(buckets) == self.batch_page_size and agg.get('after_key'):
+                    after_keys[facet] = agg['after_key']
+
+            if not after_keys:
+                break
+
+            # Page the facets which still have values to retrieve
+            query = self.batch_base_query(item_ids)
+            query['aggs'] = {}
+            for facet, after_key in after_keys.items():
+                agg = self.batch_facet_composite_query(facet)
+                agg['composite']['after'] = after_key
+                query['aggs'][self.facet_agg_name(facet)] = agg
+
+            facets = set(after_keys)
+            after_keys = {}
+
+        extents = {}
+        for bucket in extent_buckets:
+            extents[bucket['key']] = bucket
+
+        output = {}
+        for item_id in item_ids:
+            bucket = extents.get(item_id)
+            extent = self.parse_extent({'aggregations': bucket}) if bucket else {}
+
+            if self.aggregate:
+                summaries = {
+                    facet: values for facet, values in facet_values[item_id].items()
+                    if facet in item_facets[item_id]
+                }
+            else:
+                hits = bucket['asset']['hits']['hits'] if bucket else []
+                summaries = hits[0]['_source']['properties'] if hits else {}
+
+            output[item_id] = self.build_metadata(summaries, extent)
+
+        return output
+
+    def run_batch(self, item_ids: List[str], descriptions: List[ItemDescription]) -> Dict[str, Dict]:
+        """
+        Run the processor for many items in one search. Facet values and
+        extents are aggregated per item and split back out of the response.
+
+        :param item_ids: Item IDs to aggregate on
+        :param descriptions: ItemDescription for each item ID
+        :return: Dictionary of processor output keyed by item ID
+        """
+        if self.summary_index:
+            summaries = self.get_materialised_summaries(item_ids)
+            return {
+                item_id: summaries[item_id].metadata(self.plans.get(description).facets)
+                for item_id, description in zip(item_ids, descriptions)
+            }
 
-        metadata['properties'] = summaries
-        return metadata
+        return self.drive(self.batch_searches(item_ids, descriptions))
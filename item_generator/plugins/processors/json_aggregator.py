@@ -1,47 +1,342 @@
 from asset_scanner.core.processor import BaseAggregationProcessor
 from asset_scanner.core.types import SpatialExtent, TemporalExtent
+from asset_scanner.core.item_describer import ItemDescription
 
 import json
 import os
+import sqlite3
+from contextlib import closing
+
+from item_generator.core.plan import PlanCache
+from item_generator.core.summaries import ItemSummary, is_hidden
+
+from typing import Optional, List, Dict, Iterator, Set, TextIO, Tuple
+
+DOCUMENT_SEPARATORS = ' \t\r\n,[]'
 
-from typing import Optional, List, Dict
 
 class JSONAggregator(BaseAggregationProcessor):
+    """
+    .. list-table::
+
+        * - Processor Name
+          - ``json_aggregator``
+
+    Description:
+        Generate item summaries from a JSON dump of the asset documents.
+
+        The file is parsed once into an index of item summaries keyed by
+        ``item_id``. A single pass over the assets collects the values of
+        every property along with the datetime range and bounding box, so
+        the output has the same form as the ``elasticsearch_aggregator``,
+        including ``start_datetime``, ``end_datetime`` and ``bbox``. The
+        index is rebuilt if the modification time or size of the file
+        changes, so each run is a dictionary lookup.
+
+        For dumps which are too large to hold in memory, ``streaming`` mode
+        reads the assets incrementally on every run and only keeps the
+        values of the requested facets for the requested items. The file can be a JSON array or
+        newline delimited JSON.
+
+        For newline delimited files which are only ever appended to,
+        ``offset_index`` keeps a SQLite sidecar of the byte offset of each
+        record by ``item_id`` and the offset consumed so far. Each run only
+        parses the newly appended records and then seeks straight to the
+        records for the requested items. If the file is replaced or
+        truncated the sidecar is rebuilt. The new records are indexed and
+        the stored offset advanced in one ``BEGIN IMMEDIATE`` transaction,
+        so processes sharing a sidecar never index the same records twice.
+
+    Configuration Options:
+        - ``filepath``: ``REQUIRED`` Path to the JSON file of assets
+        - ``streaming``: Read the file incrementally on each run instead of
+        building an index. Default: ``False``
+        - ``read_size``: Number of characters read at a time in streaming
+        mode. Default: ``65536``
+        - ``offset_index``: Path of the sidecar offset index for an append
+        only newline delimited file. ``True`` uses ``<filepath>.idx``
+
+    Configuration Example:
+
+        .. code-block:: yaml
+
+                name: json_aggregator
+                inputs:
+                    filepath: /path/to/assets.json
+    """
+
     def __init__(self, **kwargs) -> None:
         super().__init__(**kwargs)
 
         self.filepath = kwargs['filepath']
+        self.streaming = kwargs.get('streaming', False)
+        self.read_size = kwargs.get('read_size', 65536)
+        self.offset_index = kwargs.get('offset_index')
 
-    def get_facet_values(self, facet: str, file_id: str) -> List:
+        if self.offset_index is True:
+            self.offset_index = f'{self.filepath}.idx'
+
+        self._index = {}
+        self._index_signature = None
+
+        self.plans = PlanCache()
+
+    def file_signature(self) -> Tuple[int, int]:
+        """
+        Modification time and size of the file, used to detect changes
+        """
+        stat = os.stat(self.filepath)
+        return stat.st_mtime_ns, stat.st_size
+
+    @staticmethod
+    def add_asset(index: Dict[str, ItemSummary], asset: Dict, facets: Optional[Set[str]] = None) -> None:
+        """
+        Add the property values and extent of an asset to the index
+
+        :param index: Index of item summaries keyed by item_id
+        :param asset: Asset document
+        :param facets: Only keep the values of these properties. See :py:meth:`ItemSummary.add`
+        """
+        body = asset['body']
 
-        facet_values = []
+        if is_hidden(body):
+            return
+
+        summary = index.get(body['item_id'])
+        if summary is None:
+            summary = index[body['item_id']] = ItemSummary()
+
+        summary.add(body.get('properties', {}), facets)
+
+    @staticmethod
+    def iter_assets(file: TextIO, read_size: int = 65536) -> Iterator[Dict]:
+        """
+        Incrementally decode the assets from a JSON array or newline
+        delimited JSON. Only the current read and the asset being decoded
+        are held in memory.
+
+        :param file: Open file object
+        :param read_size: Number of characters to read at a time
+        """
+        decoder = json.JSONDecoder()
+        buffer = file.read(read_size)
+        eof = not buffer
+        pos = 0
+
+        while True:
+            # Skip whitespace, separators and the enclosing array brackets
+            while True:
+                while pos < len(buffer) and buffer[pos] in DOCUMENT_SEPARATORS:
+                    pos += 1
+
+                if pos < len(buffer) or eof:
+                    break
+
+                buffer = file.read(read_size)
+                eof = not buffer
+                pos = 0
+
+            if pos >= len(buffer):
+                return
+
+            try:
+                asset, pos = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+
+                # Asset spans the end of the buffer, read some more
+                chunk = file.read(read_size)
+                eof = not chunk
+                buffer = buffer[pos:] + chunk
+                pos = 0
+                continue
+
+            yield asset
+
+    def scan(self, item_ids: Set[str], facets: Optional[Set[str]] = None) -> Dict[str, ItemSummary]:
+        """
+        Stream the file and collect the property values for the requested items
+
+        :param item_ids: Items to collect values for
+        :param facets: Facets to collect values for. All if ``None``
+        """
+        index = {}
 
         with open(self.filepath, 'r') as file:
-            file_data = json.load(file)
+            for asset in self.iter_assets(file, self.read_size):
+                if asset['body']['item_id'] in item_ids:
+                    self.add_asset(index, asset, facets)
+
+        return index
+
+    def connect_offset_index(self) -> sqlite3.Connection:
+        """
+        Open the sidecar offset index, creating the tables if needed
+        """
+        conn = sqlite3.connect(self.offset_index, timeout=30)
+
+        with conn:
+            conn.execute('CREATE TABLE IF NOT EXISTS offsets (item_id TEXT NOT NULL, offset INTEGER NOT NULL)')
+            conn.execute('CREATE INDEX IF NOT EXISTS offsets_item_id ON offsets (item_id)')
+            conn.execute('CREATE TABLE IF NOT EXISTS state (key TEXT PRIMARY KEY, value INTEGER)')
+
+        return conn
+
+    def update_offset_index(self, conn: sqlite3.Connection) -> None:
+        """
+        Add the records appended since the last update to the offset index.
+        A trailing record without a newline is still being written and is
+        left for the next update. The stored offset is read, the records
+        after it indexed and the offset advanced in one ``BEGIN IMMEDIATE``
+        transaction.
 
-            for asset in file_data:
-                if 'hidden' in asset['body']['categories']:
-                    next
-                if asset['body']['item_id'] == file_id:
-                    values = asset['body']['properties'][facet]
-                    if isinstance(values, list):
-                        facet_values.extend(values)
-                    else:
-                        facet_values.append(values)
-        return list(set(facet_values))
+        :param conn: Connection to the sidecar offset index
+        """
+        # Readers which are up to date skip the write lock
+        stat = os.stat(self.filepath)
+        state = dict(conn.execute('SELECT key, value FROM state'))
 
+        if state.get('inode') == stat.st_ino and state.get('offset', 0) == stat.st_size:
+            return
+
+        conn.execute('BEGIN IMMEDIATE')
+
+        try:
+            stat = os.stat(self.filepath)
+            state = dict(conn.execute('SELECT key, value FROM state'))
+
+            offset = state.get('offset', 0)
+
+            if state.get('inode') != stat.st_ino or offset > stat.st_size:
+                # File has been replaced or truncated
+                offset = 0
+                conn.execute('DELETE FROM offsets')
+
+            rows = []
+
+            with open(self.filepath, 'rb') as file:
+                file.seek(offset)
+
+                for line in file:
+                    if not line.endswith(b'\n'):
+                        break
+
+                    if line.strip():
+                        asset = json.loads(line)
+                        rows.append((asset['body']['item_id'], offset))
+
+                    offset += len(line)
+
+            conn.executemany('INSERT INTO offsets (item_id, offset) VALUES (?, ?)', rows)
+            conn.executemany(
+                'INSERT OR REPLACE INTO state (key, value) VALUES (?, ?)',
+                [('offset', offset), ('inode', stat.st_ino)]
+            )
+            conn.commit()
+
+        except BaseException:
+            conn.rollback()
+            raise
+
+    def read_offsets(self, item_ids: Set[str], facets: Optional[Set[str]] = None) -> Dict[str, ItemSummary]:
+        """
+        Bring the offset index up to date and read the records for the
+        requested items
+
+        :param item_ids: Items to collect values for
+        :param facets: Facets to collect values for. All if ``None``
+        """
+        index = {}
+
+        with closing(self.connect_offset_index()) as conn:
+            self.update_offset_index(conn)
+
+            with open(self.filepath, 'rb') as file:
+                for item_id in item_ids:
+                    offsets = conn.execute(
+                        'SELECT offset FROM offsets WHERE item_id = ? ORDER BY offset',
+                        (item_id,)
+                    )
+                    for offset, in offsets:
+                        file.seek(offset)
+                        self.add_asset(index, json.loads(file.readline()), facets)
+
+        return index
+
+    def get_index(self, item_ids: Set[str], facets: Optional[Set[str]] = None) -> Dict[str, ItemSummary]:
+        """
+        Return the property values for the requested items
+
+        :param item_ids: Items which will be read from the index
+        :param facets: Facets which will be read. The cached index keeps every facet
+        """
+        if self.offset_index:
+            return self.read_offsets(item_ids, facets)
+
+        if self.streaming:
+            return self.scan(item_ids, facets)
+
+        return self.load_index()
+
+    def load_index(self) -> Dict[str, ItemSummary]:
+        """
+        Return the index of property values keyed by item_id,
+        reading the file if it has changed since the index was built.
+        """
+        signature = self.file_signature()
+
+        if signature != self._index_signature:
+            index = {}
+
+            with open(self.filepath, 'r') as file:
+                for asset in json.load(file):
+                    self.add_asset(index, asset)
+
+            self._index = index
+            self._index_signature = signature
+
+        return self._index
+
+    def get_facet_values(self, facet: str, file_id: str) -> List:
+
+        summary = self.get_index({file_id}, {facet}).get(file_id)
+
+        return list(summary.values.get(facet, [])) if summary else []
+
+    @staticmethod
+    def build_metadata(summary: Optional[ItemSummary], facets: List[str]) -> Dict:
+        """
+        Processor output for an item from its indexed summary, in the same
+        form as the ``elasticsearch_aggregator``
+
+        :param summary: Indexed summary for the item. ``None`` if it has no assets
+        :param facets: Facets to summarise
+        """
+        if summary is None:
+            return {'properties': {}}
+
+        return summary.metadata(facets)
 
     def run(self, file_id: str, description: 'ItemDescription') -> dict:
 
-        facets = set(description.facets.aggregation_facets + description.facets.search_facets)
-
-        summaries = {}
-        
-        for facet in facets:
-            values = self.get_facet_values(facet, file_id)
-            if values:
-                summaries[facet] = values
-        body = {
-            "properties": summaries
-        }
-        return body
+        facets = self.plans.get(description).facets
+
+        return self.build_metadata(self.get_index({file_id}, set(facets)).get(file_id), facets)
+
+    def run_batch(self, item_ids: List[str], descriptions: List['ItemDescription']) -> Dict[str, Dict]:
+        """
+        Run the processor for many items.
+
+        :param item_ids: Item IDs to aggregate on
+        :param descriptions: ItemDescription for each item ID
+        :return: Dictionary of processor output keyed by item ID
+        """
+
+        item_facets = [self.plans.get(description).facets for description in descriptions]
+        index = self.get_index(set(item_ids), set().union(*item_facets))
+
+        output = {}
+        for item_id, facets in zip(item_ids, item_facets):
+            output[item_id] = self.build_metadata(index.get(item_id), facets)
+        return output
@@ -0,0 +1,403 @@
+# encoding: utf-8
+"""
+
+"""
+__author__ = 'Richard Smith'
+__date__ = '18 Oct 2026'
+__copyright__ = 'Copyright 2018 United Kingdom Research and Innovation'
+__license__ = 'BSD - see LICENSE file in top-level package directory'
+__contact__ = 'richard.d.smith@stfc.ac.uk'
+
+from asset_scanner.core.processor import BaseAggregationProcessor
+from asset_scanner.core.item_describer import ItemDescription
+
+import os
+from datetime import datetime
+
+from item_generator.core.plan import PlanCache
+from item_generator.core.summaries import DATETIME_FIELDS, ItemSummary, datetime_key, is_hidden
+
+from typing import Dict, Iterable, List, Optional, Tuple
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+ARROW_EXTENSIONS = ('.arrow', '.feather', '.ipc')
+
+# Extent properties read from the columns of the same name, or from ``datetime``
+EXTENT_COLUMNS = {
+    'start_datetime': ('start_datetime', True),
+    'end_datetime': ('end_datetime', False),
+    'min_datetime': ('datetime', True),
+    'max_datetime': ('datetime', False),
+    'min_lon': ('min_lon', True),
+    'min_lat': ('min_lat', True),
+    'max_lon': ('max_lon', False),
+    'max_lat': ('max_lat', False),
+}
+
+# Properties stored as timestamps when writing a table
+TIMESTAMP_PROPERTIES = ('datetime', 'start_datetime', 'end_datetime')
+
+
+def python_value(value):
+    """
+    JSON serializable form of a value read from a column
+    """
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+def datetime_keys(column: 'pa.Array') -> Optional['pa.Array']:
+    """
+    Timestamps for a datetime column, or ``None`` if the strings in the
+    column can't be parsed as one type
+    """
+    if pa.types.is_timestamp(column.type):
+        return column
+
+    for timestamp_type in (pa.timestamp('ms', tz='UTC'), pa.timestamp('ms')):
+        try:
+            return pc.cast(column, timestamp_type)
+        except (pa.ArrowInvalid, pa.ArrowNotImplementedError):
+            continue
+
+
+class ParquetAggregator(BaseAggregationProcessor):
+    """
+    .. list-table::
+
+        * - Processor Name
+          - ``parquet_aggregator``
+
+    Description:
+        Generate item summaries from a columnar dump of the assets in
+        Parquet or Arrow IPC format.
+
+        Each row is an asset with an ``item_id`` column and a column for
+        each property. Multi-valued properties are list columns. An
+        optional ``categories`` list column is used to exclude hidden
+        assets. Datetimes can be timestamp or ISO 8601 string columns.
+
+        Only the columns for the requested facets and the extent are read.
+        Parquet files are memory mapped and only the row groups whose
+        ``item_id`` statistics cover the requested items are read, so most
+        row groups are skipped when the file is sorted by ``item_id``.
+        Arrow IPC files are memory mapped once, without reading the whole
+        file into memory. Facet values and extents are computed with Arrow
+        compute functions rather than a loop over the assets.
+
+        ``write_table`` converts asset documents, such as a JSON dump, into
+        a file sorted by ``item_id``.
+
+        Requires ``pyarrow``.
+
+    Configuration Options:
+        - ``filepath``: ``REQUIRED`` Path to the Parquet or Arrow IPC file
+        - ``format``: ``parquet`` or ``arrow``. Default: ``arrow`` for
+        files ending ``.arrow``, ``.feather`` or ``.ipc``, otherwise ``parquet``
+
+    Configuration Example:
+
+        .. code-block:: yaml
+
+                name: parquet_aggregator
+                inputs:
+                    filepath: /path/to/assets.parquet
+    """
+
+    def __init__(self, **kwargs) -> None:
+        if pa is None:
+            raise ImportError(
+                'The parquet_aggregator requires the pyarrow package. '
+                'Install with: pip install pyarrow'
+            )
+
+        super().__init__(**kwargs)
+
+        self.filepath = kwargs['filepath']
+        self.format = kwargs.get('format') or (
+            'arrow' if self.filepath.endswith(ARROW_EXTENSIONS) else 'parquet'
+        )
+
+        self._table = None
+        self._file = None
+        self._row_groups = []
+        self._schema = None
+        self._signature = None
+
+        self.plans = PlanCache()
+
+    def file_signature(self) -> Tuple[int, int]:
+        """
+        Modification time and size of the file, used to detect changes
+        """
+        stat = os.stat(self.filepath)
+        return stat.st_mtime_ns, stat.st_size
+
+    def load(self) -> None:
+        """
+        Read the schema, and map the table for Arrow IPC files, if the file
+        has changed since it was last read
+        """
+        signature = self.file_signature()
+
+        if signature == self._signature:
+            return
+
+        if self.format == 'arrow':
+            # Zero copy read, columns are paged in from the map as they are used
+            self._table = pa.ipc.open_file(pa.memory_map(self.filepath)).read_all()
+            self._schema = self._table.schema
+        else:
+            self._file = pq.ParquetFile(self.filepath, memory_map=True)
+            self._schema = self._file.schema_arrow
+            self._row_groups = self.row_group_ranges(self._file)
+
+        self._signature = signature
+
+    @staticmethod
+    def row_group_ranges(file: 'pq.ParquetFile') -> List[Tuple[Optional[str], Optional[str]]]:
+        """
+        Minimum and maximum ``item_id`` in each row group, from the
+        statistics in the footer. ``None`` where there are no statistics.
+        """
+        column = file.schema_arrow.get_field_index('item_id')
+        ranges = []
+
+        for index in range(file.metadata.num_row_groups):
+            statistics = file.metadata.row_group(index).column(column).statistics
+
+            if statistics is not None and statistics.has_min_max:
+                ranges.append((statistics.min, statistics.max))
+            else:
+                ranges.append((None, None))
+
+        return ranges
+
+    def row_groups(self, item_ids: List[str]) -> List[int]:
+        """
+        Row groups which may hold the items
+        """
+        return [
+            index for index, (minimum, maximum) in enumerate(self._row_groups)
+            if minimum is None or any(minimum <= item_id <= maximum for item_id in item_ids)
+        ]
+
+    def columns(self, facets: Iterable[str]) -> List[str]:
+        """
+        Columns needed to summarise the facets which are in the file
+        """
+        names = set(self._schema.names)
+        wanted = ['item_id', 'categories', *facets, *(column for column, _ in EXTENT_COLUMNS.values())]
+
+        return list(dict.fromkeys(column for column in wanted if column in names))
+
+    def read(self, item_ids: List[str], facets: Iterable[str]) -> 'pa.Table':
+        """
+        Read the columns for the facets and extents for the items
+
+        :param item_ids: Items to read
+        :param facets: Facets to read
+        """
+        self.load()
+
+        columns = self.columns(facets)
+
+        if self.format == 'arrow':
+            table = self._table.select(columns)
+        else:
+            # Skip the row groups which can't hold the items
+            table = self._file.read_row_groups(self.row_groups(item_ids), columns=columns, use_threads=False)
+
+        return table.filter(pc.is_in(table['item_id'], value_set=pa.array(item_ids)))
+
+    @staticmethod
+    def visible(table: 'pa.Table') -> 'pa.Table':
+        """
+        Remove the hidden assets
+        """
+        if 'categories' not in table.column_names:
+            return table
+
+        categories = table['categories'].combine_chunks()
+
+        if not pa.types.is_list(categories.type):
+            return table
+
+        # Running count of hidden categories over the values of all the lists.
+        # The count for each row is the difference at the ends of its list.
+        flags = pc.cast(pc.fill_null(pc.equal(categories.values, 'hidden'), False), pa.int64())
+        running = pc.cumulative_sum(pa.concat_arrays([pa.array([0], pa.int64()), flags]))
+
+        offsets = categories.offsets
+        hidden = pc.subtract(pc.take(running, offsets[1:]), pc.take(running, offsets[:-1]))
+
+        if not pc.any(pc.greater(hidden, 0)).as_py():
+            return table
+
+        return table.filter(pc.equal(hidden, 0))
+
+    @staticmethod
+    def add_extent(summary: ItemSummary, table: 'pa.Table') -> None:
+        """
+        Add the minimum and maximum datetimes and the bbox of the assets
+        """
+        for field, (column_name, minimum) in EXTENT_COLUMNS.items():
+            if column_name not in table.column_names:
+                continue
+
+            column = table[column_name].combine_chunks()
+
+            if field in DATETIME_FIELDS:
+                keys = datetime_keys(column)
+
+                if keys is None:
+                    # Mixed string formats, compare the distinct values
+                    for value in pc.unique(column).to_pylist():
+                        if value is not None:
+                            summary.update_bound(field, value)
+                    continue
+            else:
+                keys = column
+
+            extreme = pc.min(keys) if minimum else pc.max(keys)
+
+            if not extreme.is_valid:
+                continue
+
+            # Report the value as stored in the row holding the extreme
+            value = column[pc.index(keys, extreme).as_py()].as_py()
+            summary.update_bound(field, python_value(value))
+
+    @classmethod
+    def summarise_table(cls, table: 'pa.Table', facets: Iterable[str]) -> ItemSummary:
+        """
+        Summarise the assets of one item
+
+        :param table: Assets of the item
+        :param facets: Facets to summarise
+        """
+        table = cls.visible(table)
+        summary = ItemSummary()
+        summary.assets = len(table)
+
+        if not len(table):
+            return summary
+
+        for facet in facets:
+            if facet not in table.column_names:
+                continue
+
+            column = table[facet].combine_chunks()
+
+            if pa.types.is_list(column.type) or pa.types.is_large_list(column.type):
+                column = pc.list_flatten(column)
+
+            values = pc.unique(column.drop_null()).to_pylist()
+
+            if values:
+                summary.values[facet] = set(python_value(value) for value in values)
+
+        cls.add_extent(summary, table)
+
+        return summary
+
+    @staticmethod
+    def split(table: 'pa.Table') -> Dict[str, 'pa.Table']:
+        """
+        Split the table into a table for each item
+        """
+        table = table.sort_by('item_id')
+        counts = pc.value_counts(table['item_id'])
+
+        tables = {}
+        offset = 0
+
+        for item_id, count in zip(counts.field('values').to_pylist(), counts.field('counts').to_pylist()):
+            tables[item_id] = table.slice(offset, count)
+            offset += count
+
+        return tables
+
+    def get_facet_values(self, facet: str, file_id: str) -> List:
+
+        summary = self.summarise_table(self.read([file_id], [facet]), [facet])
+
+        return list(summary.values.get(facet, []))
+
+    def run(self, file_id: str, description: 'ItemDescription') -> Dict:
+        """
+        Run the processor
+        :param file_id: Item ID to summarise
+        :param description: ItemDescription containing keys to summarise
+        """
+        facets = self.plans.get(description).facets
+
+        return self.summarise_table(self.read([file_id], facets), facets).metadata(facets)
+
+    def run_batch(self, item_ids: List[str], descriptions: List['ItemDescription']) -> Dict[str, Dict]:
+        """
+        Run the processor for many items with one read of the file.
+
+        :param item_ids: Item IDs to aggregate on
+        :param descriptions: ItemDescription for each item ID
+        :return: Dictionary of processor output keyed by item ID
+        """
+        plans = [self.plans.get(description) for description in descriptions]
+        all_facets = list(dict.fromkeys(facet for plan in plans for facet in plan.facets))
+
+        tables = self.split(self.read(list(set(item_ids)), all_facets))
+
+        output = {}
+        for item_id, plan in zip(item_ids, plans):
+            table = tables.get(item_id)
+            summary = self.summarise_table(table, plan.facets) if table is not None else ItemSummary()
+            output[item_id] = summary.metadata(plan.facets)
+
+        return output
+
+    @staticmethod
+    def write_table(assets: Iterable[Dict], path: str, format: str = 'parquet', row_group_size: int = 65536) -> None:
+        """
+        Write asset documents to a Parquet or Arrow IPC file sorted by
+        ``item_id``. Hidden assets are left out. The whole table is built in
+        memory before it is written.
+
+        :param assets: Asset documents, either with the fields in ``body`` or at the top level
+        :param path: Output path
+        :param format: ``parquet`` or ``arrow``
+        :param row_group_size: Rows in each Parquet row group
+        """
+        if pa is None:
+            raise ImportError('Writing columnar assets requires the pyarrow package. Install with: pip install pyarrow')
+
+        records = []
+
+        for asset in assets:
+            body = asset.get('body', asset)
+
+            if is_hidden(body):
+                continue
+
+            record = dict(body.get('properties', {}))
+
+            for key in TIMESTAMP_PROPERTIES:
+                if isinstance(record.get(key), str):
+                    record[key] = datetime_key(record[key])
+
+            record['item_id'] = body['item_id']
+            records.append(record)
+
+        # Assets need not have the same properties, so use every key seen
+        keys = dict.fromkeys(key for record in records for key in record)
+        table = pa.table({key: [record.get(key) for record in records] for key in keys}).sort_by('item_id')
+
+        if format == 'arrow':
+            with pa.OSFile(path, 'wb') as sink, pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+        else:
+            pq.write_table(table, path, row_group_size=row_group_size)
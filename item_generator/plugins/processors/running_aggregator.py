@@ -0,0 +1,328 @@
+# encoding: utf-8
+"""
+
+"""
+__author__ = 'Richard Smith'
+__date__ = '18 Oct 2026'
+__copyright__ = 'Copyright 2018 United Kingdom Research and Innovation'
+__license__ = 'BSD - see LICENSE file in top-level package directory'
+__contact__ = 'richard.d.smith@stfc.ac.uk'
+
+from asset_scanner.core.processor import BaseAggregationProcessor
+from asset_scanner.core.item_describer import ItemDescription
+
+import json
+import os
+import sqlite3
+import threading
+
+from item_generator.core.plan import PlanCache
+from item_generator.core.summaries import ItemSummary, summarise
+
+from typing import Dict, Iterable, List, Optional
+
+# Number of appended records added in each transaction
+CHUNK_SIZE = 10000
+
+
+class RunningAggregator(BaseAggregationProcessor):
+    """
+    .. list-table::
+
+        * - Processor Name
+          - ``running_aggregator``
+
+    Description:
+        Keep a running summary of each item as its assets arrive: the set of
+        values of each property, the minimum and maximum datetimes and the
+        union of the bounding boxes. The summaries are persisted in a local
+        SQLite database keyed by ``item_id``, so each run is a single row
+        lookup however many assets the item has.
+
+        Assets are added by following an append only newline delimited JSON
+        file of asset documents, as read by the ``json_aggregator``. Each run
+        adds the records appended since the last run. Assets can also be
+        pushed directly with ``add_assets``.
+
+        If the followed file is replaced or truncated the summaries are
+        rebuilt from a full scan of the file. ``rebuild`` forces this, for
+        example after assets have been removed.
+
+        Any number of processes can read from a database and follow the
+        same file. Each chunk of records is read and the stored offset
+        advanced within one ``BEGIN IMMEDIATE`` transaction, so a chunk is
+        only ever merged by one of them. Assets pushed with ``add_assets``
+        should only come from one process.
+
+        The output has the same form as the ``elasticsearch_aggregator``.
+
+    Configuration Options:
+        - ``path``: ``REQUIRED`` Path of the SQLite database of summaries
+        - ``filepath``: Newline delimited JSON file of assets to follow
+        - ``rebuild_on_start``: Rebuild the summaries from a full scan of
+        ``filepath`` when the processor is loaded. Default: ``False``
+        - ``facets``: Only keep the values of these properties. Default: all
+        but the extent properties
+
+    Configuration Example:
+
+        .. code-block:: yaml
+
+                name: running_aggregator
+                inputs:
+                    path: /path/to/summaries.db
+                    filepath: /path/to/assets.ndjson
+    """
+
+    def __init__(self, **kwargs) -> None:
+        super().__init__(**kwargs)
+
+        self.path = kwargs['path']
+        self.filepath = kwargs.get('filepath')
+        self.facets = kwargs.get('facets')
+
+        self.plans = PlanCache()
+        self.lock = threading.Lock()
+        self.conn = self.connect()
+
+        if kwargs.get('rebuild_on_start'):
+            self.rebuild()
+
+    def connect(self) -> sqlite3.Connection:
+        """
+        Open the database, creating the tables if needed
+        """
+        conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+
+        with conn:
+            conn.execute('CREATE TABLE IF NOT EXISTS summaries (item_id TEXT PRIMARY KEY, summary TEXT NOT NULL)')
+            conn.execute('CREATE TABLE IF NOT EXISTS state (key TEXT PRIMARY KEY, value INTEGER)')
+
+        return conn
+
+    def close(self) -> None:
+        with self.lock:
+            self.conn.close()
+
+    @staticmethod
+    def store(conn: sqlite3.Connection, partials: Dict[str, ItemSummary]) -> None:
+        """
+        Merge the summaries of newly added assets into the stored summaries
+
+        :param conn: Database connection, within a transaction
+        :param partials: Summaries of the new assets keyed by item_id
+        """
+        rows = []
+
+        for item_id, partial in partials.items():
+            row = conn.execute('SELECT summary FROM summaries WHERE item_id = ?', (item_id,)).fetchone()
+
+            if row:
+                summary = ItemSummary.from_dict(json.loads(row[0]))
+                summary.merge(partial)
+            else:
+                summary = partial
+
+            rows.append((item_id, json.dumps(summary.to_dict())))
+
+        conn.executemany('INSERT OR REPLACE INTO summaries (item_id, summary) VALUES (?, ?)', rows)
+
+    def add_assets(self, assets: Iterable[Dict]) -> None:
+        """
+        Add assets to the running summaries. Each item is updated once for
+        all of its assets in the batch.
+
+        :param assets: Asset documents, either with the fields in ``body`` or at the top level
+        """
+        partials = summarise(assets, facets=self.facets)
+
+        with self.lock, self.conn:
+            self.store(self.conn, partials)
+
+    def add_asset(self, asset: Dict) -> None:
+        """
+        Add a single asset to the running summaries
+
+        :param asset: Asset document
+        """
+        self.add_assets([asset])
+
+    @staticmethod
+    def delete_all(conn: sqlite3.Connection) -> None:
+        """
+        Delete the summaries and the followed file state
+
+        :param conn: Database connection, within a transaction
+        """
+        conn.execute('DELETE FROM summaries')
+        conn.execute('DELETE FROM state')
+
+    def clear(self) -> None:
+        with self.conn:
+            self.delete_all(self.conn)
+
+    def follow_chunk(self, rebuild: bool = False) -> bool:
+        """
+        Add the next chunk of records appended to ``filepath``. The stored
+        offset is read, the records after it merged and the offset advanced
+        in one ``BEGIN IMMEDIATE`` transaction, so processes following the
+        same file never merge the same records.
+
+        :param rebuild: Discard the summaries and start from the beginning of the file
+        :return: Whether there may be more records to add
+        """
+        if not rebuild:
+            # Readers which are up to date skip the write lock
+            stat = os.stat(self.filepath)
+            state = dict(self.conn.execute('SELECT key, value FROM state'))
+
+            if state.get('inode') == stat.st_ino and state.get('offset', 0) == stat.st_size:
+                return False
+
+        self.conn.execute('BEGIN IMMEDIATE')
+
+        try:
+            stat = os.stat(self.filepath)
+            state = dict(self.conn.execute('SELECT key, value FROM state'))
+
+            offset = state.get('offset', 0)
+
+            if rebuild or state.get('inode') != stat.st_ino or offset > stat.st_size:
+                # File has been replaced or truncated
+                self.delete_all(self.conn)
+                offset = 0
+
+            assets = []
+
+            if offset < stat.st_size:
+                with open(self.filepath, 'rb') as file:
+                    file.seek(offset)
+
+                    for line in file:
+                        if not line.endswith(b'\n'):
+                            break
+
+                        if line.strip():
+                            assets.append(json.loads(line))
+
+                        offset += len(line)
+
+                        if len(assets) == CHUNK_SIZE:
+                            break
+
+            self.store(self.conn, summarise(assets, facets=self.facets))
+            self.conn.executemany(
+                'INSERT OR REPLACE INTO state (key, value) VALUES (?, ?)',
+                [('offset', offset), ('inode', stat.st_ino)]
+            )
+            self.conn.commit()
+
+        except BaseException:
+            self.conn.rollback()
+            raise
+
+        return len(assets) == CHUNK_SIZE
+
+    def follow(self, rebuild: bool = False) -> None:
+        """
+        Add the records appended to ``filepath`` since the last update.
+        A trailing record without a newline is still being written and is
+        left for the next update. If the file has been replaced or
+        truncated, the summaries are rebuilt from the start of the file.
+
+        :param rebuild: Discard the summaries and start from the beginning of the file
+        """
+        if not self.filepath:
+            return
+
+        while self.follow_chunk(rebuild):
+            rebuild = False
+
+    def rebuild(self, assets: Optional[Iterable[Dict]] = None) -> None:
+        """
+        Discard the summaries and rebuild them from a full scan
+
+        :param assets: Asset documents to rebuild from. Defaults to the whole
+        of ``filepath``, which is the only source when following a file
+        """
+        if assets is not None and self.filepath:
+            raise ValueError(f'Summaries are rebuilt from {self.filepath}')
+
+        with self.lock:
+            if assets is None and self.filepath:
+                self.follow(rebuild=True)
+            else:
+                with self.conn:
+                    self.delete_all(self.conn)
+                    self.store(self.conn, summarise(assets or [], facets=self.facets))
+
+    def refresh(self) -> None:
+        """
+        Bring the summaries up to date with the followed file
+        """
+        with self.lock:
+            self.follow()
+
+    def get_summary(self, item_id: str) -> ItemSummary:
+        """
+        Current summary of the item. Empty if no assets have been added.
+
+        :param item_id: Item to read
+        """
+        return self.get_summary_batch([item_id]).get(item_id, ItemSummary())
+
+    def get_summary_batch(self, item_ids: List[str]) -> Dict[str, ItemSummary]:
+        """
+        Current summaries of the items which have assets
+
+        :param item_ids: Items to read
+        """
+        self.refresh()
+
+        summaries = {}
+        item_ids = list(set(item_ids))
+
+        with self.lock:
+            # Stay within the SQLite limit on query parameters
+            for start in range(0, len(item_ids), 500):
+                chunk = item_ids[start:start + 500]
+                placeholders = ','.join('?' * len(chunk))
+                rows = self.conn.execute(
+                    f'SELECT item_id, summary FROM summaries WHERE item_id IN ({placeholders})',
+                    chunk
+                )
+                for item_id, summary in rows:
+                    summaries[item_id] = ItemSummary.from_dict(json.loads(summary))
+
+        return summaries
+
+    def get_facet_values(self, facet: str, file_id: str) -> List:
+
+        return list(self.get_summary(file_id).values.get(facet, []))
+
+    def run(self, file_id: str, description: 'ItemDescription') -> Dict:
+        """
+        Run the processor
+        :param file_id: Item ID to summarise
+        :param description: ItemDescription containing keys to summarise
+        """
+        facets = self.plans.get(description).facets
+
+        return self.get_summary(file_id).metadata(facets)
+
+    def run_batch(self, item_ids: List[str], descriptions: List['ItemDescription']) -> Dict[str, Dict]:
+        """
+        Run the processor for many items.
+
+        :param item_ids: Item IDs to aggregate on
+        :param descriptions: ItemDescription for each item ID
+        :return: Dictionary of processor output keyed by item ID
+        """
+        summaries = self.get_summary_batch(item_ids)
+
+        output = {}
+        for item_id, description in zip(item_ids, descriptions):
+            facets = self.plans.get(description).facets
+            output[item_id] = summaries.get(item_id, ItemSummary()).metadata(facets)
+
+        return output
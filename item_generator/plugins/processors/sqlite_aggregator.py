@@ -0,0 +1,328 @@
+# encoding: utf-8
+"""
+
+"""
+__author__ = 'Richard Smith'
+__date__ = '18 Oct 2026'
+__copyright__ = 'Copyright 2018 United Kingdom Research and Innovation'
+__license__ = 'BSD - see LICENSE file in top-level package directory'
+__contact__ = 'richard.d.smith@stfc.ac.uk'
+
+from asset_scanner.core.processor import BaseAggregationProcessor
+from asset_scanner.core.item_describer import ItemDescription
+
+import os
+import sqlite3
+import threading
+from itertools import islice
+
+from item_generator.core.plan import PlanCache
+from item_generator.core.summaries import ItemSummary, datetime_key, is_hidden
+from item_generator.plugins.processors.json_aggregator import JSONAggregator
+
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+# Number of assets inserted in each statement when loading
+CHUNK_SIZE = 10000
+
+SCHEMA = (
+    'CREATE TABLE IF NOT EXISTS assets ('
+    ' item_id TEXT NOT NULL,'
+    ' datetime TEXT, datetime_key REAL,'
+    ' start_datetime TEXT, start_key REAL,'
+    ' end_datetime TEXT, end_key REAL,'
+    ' min_lon REAL, min_lat REAL, max_lon REAL, max_lat REAL)',
+    'CREATE TABLE IF NOT EXISTS facet_values ('
+    ' item_id TEXT NOT NULL, facet TEXT NOT NULL, value NOT NULL,'
+    ' PRIMARY KEY (item_id, facet, value)) WITHOUT ROWID',
+    'CREATE TABLE IF NOT EXISTS state (key TEXT PRIMARY KEY, value INTEGER)',
+)
+
+# The datetime indexes cover the extent subqueries, which are answered from
+# the first or last index entry for the item without reading the table
+INDEX_COLUMNS = {
+    'assets_item_id': 'item_id',
+    'assets_item_start': 'item_id, start_key, start_datetime',
+    'assets_item_end': 'item_id, end_key, end_datetime',
+    'assets_item_datetime': 'item_id, datetime_key, datetime',
+}
+
+INDEXES = tuple(
+    f'CREATE INDEX IF NOT EXISTS {name} ON assets ({columns})' for name, columns in INDEX_COLUMNS.items()
+)
+
+EXTENT_QUERY = (
+    'SELECT'
+    ' (SELECT start_datetime FROM assets WHERE item_id = :item_id AND start_key IS NOT NULL'
+    '  ORDER BY start_key LIMIT 1),'
+    ' (SELECT end_datetime FROM assets WHERE item_id = :item_id AND end_key IS NOT NULL'
+    '  ORDER BY end_key DESC LIMIT 1),'
+    ' (SELECT datetime FROM assets WHERE item_id = :item_id AND datetime_key IS NOT NULL'
+    '  ORDER BY datetime_key LIMIT 1),'
+    ' (SELECT datetime FROM assets WHERE item_id = :item_id AND datetime_key IS NOT NULL'
+    '  ORDER BY datetime_key DESC LIMIT 1),'
+    ' MIN(min_lon), MIN(min_lat), MAX(max_lon), MAX(max_lat)'
+    ' FROM assets WHERE item_id = :item_id'
+)
+
+EXTENT_FIELDS = (
+    'start_datetime', 'end_datetime', 'min_datetime', 'max_datetime',
+    'min_lon', 'min_lat', 'max_lon', 'max_lat',
+)
+
+
+def datetime_columns(value) -> Tuple[Optional[str], Optional[float]]:
+    """
+    Stored text and numeric sort key of a datetime property
+    """
+    key = datetime_key(value) if isinstance(value, str) else None
+
+    if key is None:
+        return None, None
+
+    return value, key.timestamp()
+
+
+def coordinate(value) -> Optional[float]:
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return value
+
+
+class SQLiteAggregator(BaseAggregationProcessor):
+    """
+    .. list-table::
+
+        * - Processor Name
+          - ``sqlite_aggregator``
+
+    Description:
+        Generate item summaries from a local SQLite database of the assets,
+        for aggregation without an Elasticsearch cluster.
+
+        The assets are bulk loaded into indexed tables: the distinct
+        ``(item_id, facet, value)`` triples and one row per asset holding
+        the datetime and bounding box columns. Each run answers the facet
+        values and the extent of an item with indexed queries. The output
+        has the same form as the ``elasticsearch_aggregator``.
+
+        The assets are loaded from a JSON dump, a JSON array or newline
+        delimited JSON as read by the ``json_aggregator``. The database is
+        reloaded when the modification time or size of the dump changes.
+        Assets can also be appended with ``load_assets``.
+
+    Configuration Options:
+        - ``path``: ``REQUIRED`` Path of the SQLite database
+        - ``filepath``: JSON dump of assets to load
+        - ``facets``: Only load the values of these properties. Default: all
+
+    Configuration Example:
+
+        .. code-block:: yaml
+
+                name: sqlite_aggregator
+                inputs:
+                    path: /path/to/assets.db
+                    filepath: /path/to/assets.json
+    """
+
+    def __init__(self, **kwargs) -> None:
+        super().__init__(**kwargs)
+
+        self.path = kwargs['path']
+        self.filepath = kwargs.get('filepath')
+        self.facets = kwargs.get('facets')
+
+        self.plans = PlanCache()
+        self.lock = threading.Lock()
+        self.conn = self.connect()
+
+    def connect(self) -> sqlite3.Connection:
+        """
+        Open the database, creating the tables if needed
+        """
+        conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+
+        with conn:
+            for statement in SCHEMA + INDEXES:
+                conn.execute(statement)
+
+        return conn
+
+    def close(self) -> None:
+        with self.lock:
+            self.conn.close()
+
+    def rows(self, assets: Iterable[Dict]) -> Iterator[Tuple[Tuple, List[Tuple]]]:
+        """
+        Asset row and facet value rows for each visible asset
+
+        :param assets: Asset documents, either with the fields in ``body`` or at the top level
+        """
+        facets = set(self.facets) if self.facets is not None else None
+
+        for asset in assets:
+            body = asset.get('body', asset)
+
+            if is_hidden(body):
+                continue
+
+            item_id = body['item_id']
+            properties = body.get('properties', {})
+
+            values = []
+            for key, prop_values in properties.items():
+                if facets is not None and key not in facets:
+                    continue
+
+                if not isinstance(prop_values, list):
+                    prop_values = [prop_values]
+
+                values.extend(
+                    (item_id, key, value) for value in prop_values
+                    # Objects and nulls can't be summarised
+                    if isinstance(value, (str, int, float))
+                )
+
+            asset_row = (
+                item_id,
+                *datetime_columns(properties.get('datetime')),
+                *datetime_columns(properties.get('start_datetime')),
+                *datetime_columns(properties.get('end_datetime')),
+                *(coordinate(properties.get(field)) for field in ('min_lon', 'min_lat', 'max_lon', 'max_lat')),
+            )
+
+            yield asset_row, values
+
+    def insert(self, assets: Iterable[Dict]) -> None:
+        """
+        Insert the assets in chunks. Call within a transaction.
+        """
+        rows = self.rows(assets)
+
+        while True:
+            chunk = list(islice(rows, CHUNK_SIZE))
+
+            if not chunk:
+                break
+
+            self.conn.executemany(
+                'INSERT INTO assets VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                [asset_row for asset_row, _ in chunk]
+            )
+            self.conn.executemany(
+                'INSERT OR IGNORE INTO facet_values (item_id, facet, value) VALUES (?, ?, ?)',
+                [value for _, values in chunk for value in values]
+            )
+
+    def load_assets(self, assets: Iterable[Dict]) -> None:
+        """
+        Append assets to the database
+
+        :param assets: Asset documents, either with the fields in ``body`` or at the top level
+        """
+        with self.lock, self.conn:
+            self.insert(assets)
+
+    def file_signature(self) -> List[int]:
+        stat = os.stat(self.filepath)
+        return [stat.st_mtime_ns, stat.st_size]
+
+    def reload(self) -> None:
+        """
+        Replace the contents of the database with the assets in ``filepath``.
+        The index is dropped during the load and rebuilt afterwards.
+        """
+        signature = self.file_signature()
+
+        with self.conn:
+            self.conn.execute('DELETE FROM assets')
+            self.conn.execute('DELETE FROM facet_values')
+            for name in INDEX_COLUMNS:
+                self.conn.execute(f'DROP INDEX IF EXISTS {name}')
+
+            with open(self.filepath, 'r') as file:
+                self.insert(JSONAggregator.iter_assets(file))
+
+            for statement in INDEXES:
+                self.conn.execute(statement)
+
+            self.conn.executemany(
+                'INSERT OR REPLACE INTO state (key, value) VALUES (?, ?)',
+                zip(('mtime', 'size'), signature)
+            )
+
+    def refresh(self) -> None:
+        """
+        Reload the database if ``filepath`` has changed since it was loaded
+        """
+        if not self.filepath:
+            return
+
+        with self.lock:
+            state = dict(self.conn.execute('SELECT key, value FROM state'))
+
+            if [state.get('mtime'), state.get('size')] != self.file_signature():
+                self.reload()
+
+    def get_summary(self, item_id: str, facets: Iterable[str]) -> ItemSummary:
+        """
+        Values of the facets and the extent of the item
+
+        :param item_id: Item to summarise
+        :param facets: Facets to read values for
+        """
+        facets = list(facets)
+        summary = ItemSummary()
+
+        with self.lock:
+            if facets:
+                placeholders = ','.join('?' * len(facets))
+                rows = self.conn.execute(
+                    f'SELECT facet, value FROM facet_values WHERE item_id = ? AND facet IN ({placeholders})',
+                    [item_id, *facets]
+                )
+                for facet, value in rows:
+                    summary.values.setdefault(facet, set()).add(value)
+
+            extent = self.conn.execute(EXTENT_QUERY, {'item_id': item_id}).fetchone()
+
+        for field, value in zip(EXTENT_FIELDS, extent):
+            if value is not None:
+                summary.update_bound(field, value)
+
+        return summary
+
+    def get_facet_values(self, facet: str, file_id: str) -> List:
+
+        self.refresh()
+
+        return list(self.get_summary(file_id, [facet]).values.get(facet, []))
+
+    def run(self, file_id: str, description: 'ItemDescription') -> Dict:
+        """
+        Run the processor
+        :param file_id: Item ID to summarise
+        :param description: ItemDescription containing keys to summarise
+        """
+        self.refresh()
+
+        facets = self.plans.get(description).facets
+
+        return self.get_summary(file_id, facets).metadata(facets)
+
+    def run_batch(self, item_ids: List[str], descriptions: List['ItemDescription']) -> Dict[str, Dict]:
+        """
+        Run the processor for many items.
+
+        :param item_ids: Item IDs to aggregate on
+        :param descriptions: ItemDescription for each item ID
+        :return: Dictionary of processor output keyed by item ID
+        """
+        self.refresh()
+
+        output = {}
+        for item_id, description in zip(item_ids, descriptions):
+            facets = self.plans.get(description).facets
+            output[item_id] = self.get_summary(item_id, facets).metadata(facets)
+
+        return output
@@ -0,0 +1,42 @@
+# encoding: utf-8
+"""
+Precompile the item description yaml files into a prefix index.
+
+Usage::
+
+    build_description_index /path/to/descriptions descriptions.db
+
+Set ``item_descriptions.index`` in the extractor configuration to load the
+index instead of the yaml files. See :py:mod:`item_generator.core.descriptions`
+"""
+__author__ = 'Richard Smith'
+__date__ = '18 Oct 2026'
+__copyright__ = 'Copyright 2018 United Kingdom Research and Innovation'
+__license__ = 'BSD - see LICENSE file in top-level package directory'
+__contact__ = 'richard.d.smith@stfc.ac.uk'
+
+import argparse
+
+from item_generator.core.descriptions import build_index
+
+
+def cmd_arguments():
+    parser = argparse.ArgumentParser(description='Build the description prefix index')
+
+    parser.add_argument('root_directory', help='Root directory of the item description yaml files')
+    parser.add_argument('output', help='Path to write the index to')
+
+    args = parser.parse_args()
+
+    return args
+
+
+def main():
+
+    args = cmd_arguments()
+
+    build_index(args.output, args.root_directory)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,53 @@
+# encoding: utf-8
+"""
+Convert a JSON dump of assets into a columnar file for the
+``parquet_aggregator``.
+
+Usage::
+
+    convert_assets assets.json assets.parquet
+    convert_assets assets.ndjson assets.arrow --format arrow
+
+The input can be a JSON array or newline delimited JSON, as read by the
+``json_aggregator``. Requires ``pyarrow``.
+"""
+__author__ = 'Richard Smith'
+__date__ = '18 Oct 2026'
+__copyright__ = 'Copyright 2018 United Kingdom Research and Innovation'
+__license__ = 'BSD - see LICENSE file in top-level package directory'
+__contact__ = 'richard.d.smith@stfc.ac.uk'
+
+import argparse
+
+from item_generator.plugins.processors.json_aggregator import JSONAggregator
+from item_generator.plugins.processors.parquet_aggregator import ParquetAggregator
+
+
+def cmd_arguments():
+    parser = argparse.ArgumentParser(description='Convert a JSON dump of assets to Parquet or Arrow IPC')
+
+    parser.add_argument('input', help='JSON dump of assets')
+    parser.add_argument('output', help='Path to write the columnar file to')
+    parser.add_argument('--format', choices=['parquet', 'arrow'], default='parquet', help='Output format')
+    parser.add_argument('--row-group-size', type=int, default=65536, help='Rows in each Parquet row group')
+
+    args = parser.parse_args()
+
+    return args
+
+
+def main():
+
+    args = cmd_arguments()
+
+    with open(args.input, 'r') as file:
+        ParquetAggregator.write_table(
+            JSONAggregator.iter_assets(file),
+            args.output,
+            format=args.format,
+            row_group_size=args.row_group_size,
+        )
+
+
+if __name__ == '__main__':
+    main()
@@ -1,5 +1,29 @@
 # encoding: utf-8
 """
+Generate items for a stream of files.
+
+Usage::
+
+    generate_items conf.yml files.jsonl --workers 8
+    find_assets ... | generate_items conf.yml --limit 1000
+
+The input is read from a file, or stdin if not given or ``-``. Each line is
+either a JSON record:
+
+.. code-block:: json
+
+    {"filepath": "/badc/faam/data/...nc", "item_id": "c9ba1eb8...", "source_media": "POSIX"}
+
+or tab separated ``filepath  item_id  [source_media]``. ``source_media``
+defaults to ``POSIX``.
+
+The ``item_id`` is required as it comes from the asset index and cannot be
+derived from the path. A line without one, such as a bare path, stops the
+run with an error naming the line. JSON lines which cannot be parsed are
+logged and skipped.
+
+Throughput and latency are reported to stderr while running, followed by a
+summary when the input is exhausted.
 
 Configuration Options:
 
@@ -13,6 +37,9 @@ Configuration Options:
                 item_descriptions:
                     root_directory: /path/to/descriptions
 
+    executor:
+        Default options for the batch executor. See :py:mod:`item_generator.core.executor`
+
     logging:
         keyword arguments to pass to the python ``logging.basicConfig`` method
 
@@ -24,17 +51,35 @@ __license__ = 'BSD - see LICENSE file in top-level package directory'
 __contact__ = 'richard.d.smith@stfc.ac.uk'
 
 import argparse
+import json
 import logging
+import sys
+import time
+from itertools import islice
+from typing import Iterator, TextIO, Tuple
 
 import yaml
 
-from item_generator import FacetExtractor
+from item_generator.core.executor import BatchExecutor, BatchResult
+
+LOGGER = logging.getLogger(__name__)
+
+# Number of recent files used for the live latency percentiles
+RECENT_FILES = 10000
 
 
 def cmd_arguments():
-    parser = argparse.ArgumentParser()
+    parser = argparse.ArgumentParser(description='Generate items for a stream of files')
 
     parser.add_argument('conf', help='Path to config file')
+    parser.add_argument('input', nargs='?', default='-',
+                        help='File of JSONL or tab separated records. Reads stdin if omitted or -')
+    parser.add_argument('--workers', type=int, help='Number of concurrent workers')
+    parser.add_argument('--batch-size', type=int, help='Number of files sent to a worker at a time')
+    parser.add_argument('--mode', choices=['thread', 'process'], help='Run workers as threads or processes')
+    parser.add_argument('--limit', type=int, help='Stop after this many files')
+    parser.add_argument('--progress-interval', type=float, default=10,
+                        help='Seconds between progress reports. 0 to disable')
 
     args = parser.parse_args()
 
@@ -57,14 +102,126 @@ def setup_logging(conf):
     logging.basicConfig(**config)
 
 
+def read_records(stream: TextIO) -> Iterator[Tuple[str, str, str]]:
+    """
+    Parse the input lines into ``(filepath, item_id, source_media)``.
+    Malformed JSON lines are logged and skipped.
+
+    :param stream: Input stream
+    :raises ValueError: If a line has no filepath or item_id
+    """
+    for line_number, line in enumerate(stream, 1):
+        line = line.strip()
+
+        if not line or line.startswith('#'):
+            continue
+
+        if line.startswith('{'):
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError as e:
+                LOGGER.error(f'Line {line_number}: skipping malformed JSON: {e}')
+                continue
+
+            filepath = record.get('filepath')
+            item_id = record.get('item_id')
+            source_media = record.get('source_media', 'POSIX')
+        else:
+            parts = line.split('\t')
+            filepath = parts[0]
+            item_id = parts[1] if len(parts) > 1 else None
+            source_media = parts[2] if len(parts) > 2 else 'POSIX'
+
+        if not filepath or not item_id:
+            raise ValueError(f'Line {line_number}: filepath and item_id are required, got: {line}')
+
+        yield filepath, item_id, source_media
+
+
+def format_latency(value) -> str:
+    return f'{value * 1000:.1f}ms' if value is not None else '-'
+
+
+class ProgressReporter:
+    """
+    Prints the throughput and recent latency percentiles at most once per interval
+    """
+
+    def __init__(self, interval: float, stream: TextIO = sys.stderr):
+        self.interval = interval
+        self.stream = stream
+        self.last = time.perf_counter()
+
+    def __call__(self, result: BatchResult) -> None:
+        now = time.perf_counter()
+
+        if not self.interval or now - self.last < self.interval:
+            return
+
+        self.last = now
+
+        print(
+            f'processed={result.processed} failed={result.failed} '
+            f'rate={result.rate:.1f}/s '
+            f'p50={format_latency(result.percentile(50, RECENT_FILES))} '
+            f'p95={format_latency(result.percentile(95, RECENT_FILES))}',
+            file=self.stream,
+            flush=True
+        )
+
+
+def print_summary(result: BatchResult, stream: TextIO = sys.stderr) -> None:
+    """
+    Print the final summary for the run
+    """
+    print(
+        f'Finished in {result.elapsed:.1f}s: processed={result.processed} failed={result.failed} '
+        f'rate={result.rate:.1f}/s '
+        f'p50={format_latency(result.percentile(50))} '
+        f'p95={format_latency(result.percentile(95))}',
+        file=stream,
+        flush=True
+    )
+
+    for error in result.errors:
+        print(f'FAILED {error.filepath} ({error.item_id}): {error.error}', file=stream)
+
+
 def main():
 
     args = cmd_arguments()
 
     conf = load_config(args.conf)
-    
+
     setup_logging(conf)
-    
-    extractor = FacetExtractor(conf)
 
-    extractor.process_file('/badc/faam/data/2005/b069-jan-05/core_processed/core_faam_20050105_r0_b069.nc', 'POSIX')
+    executor = BatchExecutor.from_conf(
+        conf,
+        mode=args.mode,
+        workers=args.workers,
+        chunk_size=args.batch_size,
+    )
+
+    stream = sys.stdin if args.input == '-' else open(args.input)
+
+    try:
+        records = read_records(stream)
+
+        if args.limit:
+            records = islice(records, args.limit)
+
+        result = executor.run(records, callback=ProgressReporter(args.progress_interval))
+    except ValueError as e:
+        sys.exit(f'Invalid input: {e}')
+    finally:
+        if stream is not sys.stdin:
+            stream.close()
+
+    print_summary(result)
+
+    if result.failed:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
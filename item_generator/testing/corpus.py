@@ -0,0 +1,152 @@
+# encoding: utf-8
+"""
+Synthetic asset corpora for tests and benchmarks.
+
+Assets are generated deterministically from their position, so the same
+arguments always give the same corpus. Each item has ``files_per_item``
+assets and each facet takes ``cardinality`` distinct values across the
+corpus. Every asset has a ``datetime``, ``start_datetime``,
+``end_datetime`` and bounding box so the extent aggregations have data.
+"""
+__author__ = 'Richard Smith'
+__date__ = '18 Oct 2026'
+__copyright__ = 'Copyright 2018 United Kingdom Research and Innovation'
+__license__ = 'BSD - see LICENSE file in top-level package directory'
+__contact__ = 'richard.d.smith@stfc.ac.uk'
+
+import json
+from datetime import datetime, timedelta
+from typing import Dict, Iterator, List, Sequence, Tuple
+
+from asset_scanner.core.item_describer import ItemDescription
+
+DEFAULT_FACETS = ('platform', 'flight_number', 'variable')
+
+START = datetime(2005, 1, 1)
+
+
+class Corpus:
+    """
+    Description of a synthetic corpus
+    """
+
+    def __init__(self,
+                 items: int = 100,
+                 files_per_item: int = 10,
+                 cardinality: int = 10,
+                 facets: Sequence[str] = DEFAULT_FACETS,
+                 hidden_every: int = 0):
+        """
+        :param items: Number of items
+        :param files_per_item: Number of assets in each item
+        :param cardinality: Number of distinct values for each facet
+        :param facets: Facet names
+        :param hidden_every: Mark every nth asset as hidden. 0 for none
+        """
+        self.items = items
+        self.files_per_item = files_per_item
+        self.cardinality = cardinality
+        self.facets = tuple(facets)
+        self.hidden_every = hidden_every
+
+    @property
+    def size(self) -> int:
+        return self.items * self.files_per_item
+
+    @staticmethod
+    def item_id(item: int) -> str:
+        return f'item-{item:08d}'
+
+    def filepath(self, index: int) -> str:
+        item = index // self.files_per_item
+        return f'/badc/synthetic/data/{item // 1000:04d}/{self.item_id(item)}/file-{index:010d}.nc'
+
+    def asset(self, index: int) -> Dict:
+        """
+        The asset at the position in the corpus
+        """
+        item = index // self.files_per_item
+        start = START + timedelta(hours=index)
+
+        properties = {
+            # Spread the values so consecutive files share some values
+            facet: f'{facet}-{(index * (n + 3) + item) % self.cardinality}'
+            for n, facet in enumerate(self.facets)
+        }
+
+        properties.update({
+            'datetime': start.isoformat(),
+            'start_datetime': start.isoformat(),
+            'end_datetime': (start + timedelta(minutes=30)).isoformat(),
+            'min_lon': -10.0 + index % 10,
+            'min_lat': 50.0 + index % 5,
+            'max_lon': 0.0 + index % 10,
+            'max_lat': 55.0 + index % 5,
+        })
+
+        categories = ['data']
+        if self.hidden_every and index % self.hidden_every == 0:
+            categories.append('hidden')
+
+        return {
+            'id': f'asset-{index:010d}',
+            'item_id': self.item_id(item),
+            'filepath': self.filepath(index),
+            'categories': categories,
+            'properties': properties,
+        }
+
+    def assets(self) -> Iterator[Dict]:
+        for index in range(self.size):
+            yield self.asset(index)
+
+    def files(self) -> Iterator[Tuple[str, str, str]]:
+        """
+        ``(filepath, item_id, source_media)`` for each asset
+        """
+        for index in range(self.size):
+            yield self.filepath(index), self.item_id(index // self.files_per_item), 'POSIX'
+
+    def item_ids(self) -> List[str]:
+        return [self.item_id(item) for item in range(self.items)]
+
+    def description(self) -> ItemDescription:
+        return ItemDescription(
+            paths=['/badc/synthetic/data'],
+            collections={'id': 'synthetic'},
+            facets={'aggregation_facets': list(self.facets)},
+        )
+
+    def description_yaml(self) -> str:
+        """
+        Item description file for the corpus
+        """
+        facets = '\n'.join(f'    - {facet}' for facet in self.facets)
+        return (
+            'paths:\n'
+            '  - /badc/synthetic/data\n'
+            'collections:\n'
+            '  id: synthetic\n'
+            'facets:\n'
+            '  aggregation_facets:\n'
+            f'{facets}\n'
+        )
+
+    def write_json(self, path: str, ndjson: bool = False) -> None:
+        """
+        Write the corpus in the format read by the ``json_aggregator``
+
+        :param path: Output path
+        :param ndjson: Write newline delimited JSON instead of an array
+        """
+        with open(path, 'w') as writer:
+            if not ndjson:
+                writer.write('[\n')
+
+            for index, asset in enumerate(self.assets()):
+                document = {'id': asset.pop('id'), 'body': asset}
+                separator = '\n' if ndjson or index == self.size - 1 else ',\n'
+                writer.write(json.dumps(document) + separator)
+
+            if not ndjson:
+                writer.write(']\n')
@@ -0,0 +1,554 @@
+# encoding: utf-8
+"""
+In-process stand-in for the parts of the Elasticsearch search API used by the
+aggregation processors. Documents are held in memory and searched by brute
+force, so it is intended for tests and benchmarks of the processor logic
+rather than of Elasticsearch itself.
+
+Supported:
+
+- queries: ``match_all``, ``term``, ``terms`` and ``bool`` with ``must``,
+  ``filter`` and ``must_not``
+- aggregations: ``composite`` with ``terms`` sources, ``terms`` with
+  sub-aggregations and ``include`` partitions, ``min``, ``max``,
+  ``cardinality`` and ``top_hits``
+- ``track_total_hits: false`` and ``filter_path`` on searches
+- serialized query bodies, as sent by :py:class:`QueryTemplate`
+- ``get``, ``mget`` and ``update`` with ``upsert`` or ``doc_as_upsert``.
+  Painless scripts can't be run, so each script source is registered with a
+  Python function of the document source and the script parameters
+- ``bulk`` with ``index`` and ``update`` actions, as a list of lines or
+  newline delimited JSON
+
+Fields ending ``.keyword`` are matched against the unanalysed value.
+Multi-valued fields contribute every value, as in Elasticsearch.
+"""
+__author__ = 'Richard Smith'
+__date__ = '18 Oct 2026'
+__copyright__ = 'Copyright 2018 United Kingdom Research and Innovation'
+__license__ = 'BSD - see LICENSE file in top-level package directory'
+__contact__ = 'richard.d.smith@stfc.ac.uk'
+
+import copy
+import itertools
+import json
+import zlib
+from collections import Counter
+from datetime import datetime, timezone
+from functools import lru_cache
+from typing import Any, Callable, Dict, Iterable, List, Optional, Union
+
+from dateutil.parser import isoparse
+
+
+def field_values(source: Dict, field: str) -> List:
+    """
+    Values of a dotted field in the document. Lists are flattened.
+
+    :param source: Document source
+    :param field: Dotted field name. A ``.keyword`` suffix is ignored
+    """
+    if field.endswith('.keyword'):
+        field = field[:-len('.keyword')]
+
+    values = [source]
+
+    for part in field.split('.'):
+        next_values = []
+        for value in values:
+            if isinstance(value, dict) and part in value:
+                item = value[part]
+                next_values.extend(item if isinstance(item, list) else [item])
+        values = next_values
+
+    return [value for value in values if value is not None]
+
+
+def sort_value(value: Any):
+    """
+    Orders mixed values in the same way between calls
+    """
+    return (isinstance(value, str), value)
+
+
+def numeric_value(value: Any) -> Optional[float]:
+    """
+    Numeric value for ``min`` and ``max``. Dates are converted to epoch
+    milliseconds as in Elasticsearch.
+    """
+    if isinstance(value, bool):
+        return float(value)
+
+    if isinstance(value, (int, float)):
+        return float(value)
+
+    if isinstance(value, str):
+        return date_value(value)
+
+
+@lru_cache(maxsize=65536)
+def date_value(value: str) -> Optional[float]:
+    try:
+        parsed = isoparse(value)
+    except ValueError:
+        return
+
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+
+    return parsed.timestamp() * 1000
+
+
+def format_date(value: float) -> str:
+    return datetime.fromtimestamp(value / 1000, tz=timezone.utc).strftime('%Y-%m-%dT%H:%M:%S.%f')[:-3] + 'Z'
+
+
+def filter_response(response: Any, paths: List[List[str]]) -> Any:
+    """
+    Keep the parts of the response matched by the ``filter_path`` paths.
+    ``*`` matches any key and lists are filtered item by item.
+    """
+    if isinstance(response, list):
+        return [filter_response(item, paths) for item in response]
+
+    if not isinstance(response, dict):
+        return response
+
+    filtered = {}
+    for key, value in response.items():
+        remaining = [path[1:] for path in paths if path[0] in (key, '*')]
+
+        if not remaining:
+            continue
+
+        if any(not path for path in remaining):
+            filtered[key] = value
+            continue
+
+        value = filter_response(value, remaining)
+
+        if value or value == 0:
+            filtered[key] = value
+
+    return filtered
+
+
+def merge_summary(source: Dict, params: Dict) -> None:
+    """
+    Python version of ``SUMMARY_SCRIPT`` from the ``elasticsearch_aggregator``,
+    which merges the summary of new assets into the stored item summary.
+    Register it with :py:meth:`FakeElasticsearch.register_script`.
+    """
+    source['assets'] += params['assets']
+
+    for key, values in params['values'].items():
+        current = source['values'].get(key)
+        if current is None:
+            source['values'][key] = values
+        else:
+            current.update(values)
+
+    for field, value in params['bounds'].items():
+        key = params['bound_keys'][field]
+        current = source['bound_keys'].get(field)
+        if current is None or (key < current if field in params['min_fields'] else key > current):
+            source['bound_keys'][field] = key
+            source['bounds'][field] = value
+
+
+class FakeElasticsearch:
+    """
+    Minimal in-memory Elasticsearch client
+    """
+
+    def __init__(self, documents: Optional[Dict[str, Iterable[Dict]]] = None):
+        """
+        :param documents: Document sources keyed by index name
+        """
+        self.indices: Dict[str, Dict[str, Dict]] = {}
+        self.searches = 0
+        self.bulk_requests = 0
+
+        # Python implementations of scripts keyed by source
+        self.scripts: Dict[str, Callable[[Dict, Dict], None]] = {}
+
+        # Document IDs by index, field and value for the term filters
+        self.term_index: Dict[tuple, Dict[Any, set]] = {}
+
+        for index, sources in (documents or {}).items():
+            self.add_documents(index, sources)
+
+    def add_documents(self, index: str, sources: Iterable[Dict]) -> None:
+        """
+        Add documents to the index. An ``id`` key is used as the document ID.
+        """
+        docs = self.indices.setdefault(index, {})
+
+        for source in sources:
+            doc_id = str(source.get('id', len(docs)))
+            docs[doc_id] = source
+
+        self.clear_term_index(index)
+
+    def index(self, index: str, body: Dict, id: Optional[str] = None, **kwargs) -> Dict:
+        docs = self.indices.setdefault(index, {})
+        doc_id = str(id if id is not None else len(docs))
+        docs[doc_id] = copy.deepcopy(body)
+        self.clear_term_index(index)
+        return {'_index': index, '_id': doc_id, 'result': 'created'}
+
+    def search(self, index: str, body: Union[Dict, str, None] = None, **kwargs) -> Dict:
+        self.searches += 1
+
+        if isinstance(body, (str, bytes)):
+            body = json.loads(body)
+
+        body = body or {}
+
+        docs = [
+            (doc_id, source) for doc_id, source in self.candidates(index, body.get('query'))
+            if self.matches(source, body.get('query'))
+        ]
+
+        size = body.get('size', 10)
+
+        response = {
+            'took': 0,
+            'timed_out': False,
+            'hits': {
+                'total': {'value': len(docs), 'relation': 'eq'},
+                'hits': [self.hit(index, doc_id, source) for doc_id, source in docs[:size]],
+            },
+        }
+
+        if body.get('track_total_hits') is False:
+            del response['hits']['total']
+
+        if 'aggs' in body or 'aggregations' in body:
+            aggs = body.get('aggs', body.get('aggregations'))
+            response['aggregations'] = self.aggregate([source for _, source in docs], aggs)
+
+        if kwargs.get('filter_path'):
+            paths = [path.split('.') for path in kwargs['filter_path'].split(',')]
+            response = filter_response(response, paths)
+
+        return response
+
+    def get(self, index: str, id: str, **kwargs) -> Dict:
+        source = self.indices.get(index, {}).get(str(id))
+
+        if source is None:
+            if 404 not in self.as_list(kwargs.get('ignore')):
+                raise LookupError(f'Document {id} not found in {index}')
+            return {'_index': index, '_id': str(id), 'found': False}
+
+        return dict(self.hit(index, str(id), source), found=True)
+
+    def mget(self, body: Dict, index: str, **kwargs) -> Dict:
+        return {'docs': [self.get(index, doc_id, ignore=404) for doc_id in body['ids']]}
+
+    def register_script(self, source: str, function: Callable[[Dict, Dict], None]) -> None:
+        """
+        Run the function in place of the script
+
+        :param source: Script source as sent in the request
+        :param function: Called with the document source and the script params. Updates the source in place
+        """
+        self.scripts[source] = function
+
+    def update(self, index: str, id: str, body: Dict, **kwargs) -> Dict:
+        docs = self.indices.setdefault(index, {})
+        doc_id = str(id)
+
+        if doc_id not in docs:
+            if body.get('doc_as_upsert'):
+                docs[doc_id] = copy.deepcopy(body['doc'])
+            elif 'upsert' in body:
+                docs[doc_id] = copy.deepcopy(body['upsert'])
+            else:
+                raise LookupError(f'Document {id} not found in {index}')
+
+            result = 'created'
+
+        elif 'script' in body:
+            script = body['script']
+            function = self.scripts.get(script.get('source'))
+
+            if function is None:
+                raise NotImplementedError('Script has not been registered')
+
+            function(docs[doc_id], copy.deepcopy(script.get('params', {})))
+            result = 'updated'
+
+        else:
+            docs[doc_id].update(copy.deepcopy(body.get('doc', {})))
+            result = 'updated'
+
+        self.clear_term_index(index)
+        return {'_index': index, '_id': doc_id, 'result': result}
+
+    def bulk(self, body: Union[List[Dict], str, bytes], index: Optional[str] = None, **kwargs) -> Dict:
+        self.bulk_requests += 1
+
+        if isinstance(body, bytes):
+            body = body.decode()
+
+        if isinstance(body, str):
+            lines = [json.loads(line) for line in body.splitlines() if line.strip()]
+        else:
+            lines = copy.deepcopy(list(body))
+
+        items = []
+
+        while lines:
+            (op_type, action), = lines.pop(0).items()
+            source = lines.pop(0)
+
+            action_index = action.get('_index', index)
+
+            if op_type == 'update':
+                result = self.update(action_index, action['_id'], source)
+            elif op_type == 'index':
+                result = self.index(action_index, source, id=action.get('_id'))
+            else:
+                raise NotImplementedError(f'Unsupported bulk action: {op_type}')
+
+            items.append({op_type: dict(result, status=200)})
+
+        return {'took': 0, 'errors': False, 'items': items}
+
+    def close(self) -> None:
+        pass
+
+    @staticmethod
+    def hit(index: str, doc_id: str, source: Dict, includes: Optional[List[str]] = None) -> Dict:
+        if includes is not None:
+            source = {key: value for key, value in source.items() if key in includes}
+
+        return {'_index': index, '_id': doc_id, '_source': copy.deepcopy(source)}
+
+    # Queries
+
+    def clear_term_index(self, index: str) -> None:
+        for key in [key for key in self.term_index if key[0] == index]:
+            del self.term_index[key]
+
+    def term_ids(self, index: str, field: str, values: Iterable) -> set:
+        """
+        IDs of the documents with any of the values in the field
+        """
+        key = (index, field)
+
+        if key not in self.term_index:
+            by_value = {}
+            for doc_id, source in self.indices.get(index, {}).items():
+                for value in field_values(source, field):
+                    by_value.setdefault(value, set()).add(doc_id)
+            self.term_index[key] = by_value
+
+        by_value = self.term_index[key]
+        return set().union(*[by_value.get(value, set()) for value in values])
+
+    def candidates(self, index: str, query: Optional[Dict]) -> List[tuple]:
+        """
+        Documents which may match the query. The first ``term`` or ``terms``
+        clause in a ``bool`` query is looked up in the term index, the full
+        query is then checked against each candidate.
+        """
+        docs = self.indices.get(index, {})
+
+        clauses = []
+        if query and 'bool' in query:
+            clauses = self.as_list(query['bool'].get('must')) + self.as_list(query['bool'].get('filter'))
+        elif query:
+            clauses = [query]
+
+        for clause in clauses:
+            if 'term' in clause:
+                (field, value), = clause['term'].items()
+                values = [value['value'] if isinstance(value, dict) else value]
+            elif 'terms' in clause:
+                (field, values), = clause['terms'].items()
+            else:
+                continue
+
+            ids = self.term_ids(index, field, values)
+            return [(doc_id, docs[doc_id]) for doc_id in docs if doc_id in ids]
+
+        return list(docs.items())
+
+    def matches(self, source: Dict, query: Optional[Dict]) -> bool:
+        if not query or 'match_all' in query:
+            return True
+
+        if 'bool' in query:
+            clauses = query['bool']
+
+            for key in ('must', 'filter'):
+                if not all(self.matches(source, clause) for clause in self.as_list(clauses.get(key))):
+                    return False
+
+            if any(self.matches(source, clause) for clause in self.as_list(clauses.get('must_not'))):
+                return False
+
+            should = self.as_list(clauses.get('should'))
+            if should and not any(self.matches(source, clause) for clause in should):
+                return False
+
+            return True
+
+        if 'term' in query:
+            (field, value), = query['term'].items()
+            if isinstance(value, dict):
+                value = value['value']
+            return value in field_values(source, field)
+
+        if 'terms' in query:
+            (field, values), = query['terms'].items()
+            return bool(set(field_values(source, field)) & set(values))
+
+        raise NotImplementedError(f'Unsupported query: {list(query)}')
+
+    @staticmethod
+    def as_list(value) -> List:
+        if value is None:
+            return []
+        return value if isinstance(value, list) else [value]
+
+    # Aggregations
+
+    def aggregate(self, sources: List[Dict], aggs: Dict) -> Dict:
+        return {name: self.run_aggregation(sources, agg) for name, agg in aggs.items()}
+
+    def run_aggregation(self, sources: List[Dict], agg: Dict) -> Dict:
+        sub_aggs = agg.get('aggs', agg.get('aggregations'))
+
+        if 'composite' in agg:
+            return self.composite(sources, agg['composite'], sub_aggs)
+        if 'terms' in agg:
+            return self.terms(sources, agg['terms'], sub_aggs)
+        if 'min' in agg:
+            return self.metric(sources, agg['min']['field'], min)
+        if 'max' in agg:
+            return self.metric(sources, agg['max']['field'], max)
+        if 'cardinality' in agg:
+            field = agg['cardinality']['field']
+            return {'value': len({value for doc in sources for value in field_values(doc, field)})}
+        if 'top_hits' in agg:
+            return self.top_hits(sources, agg['top_hits'])
+
+        raise NotImplementedError(f'Unsupported aggregation: {list(agg)}')
+
+    def bucket(self, key: Any, sources: List[Dict], sub_aggs: Optional[Dict]) -> Dict:
+        bucket = {'key': key, 'doc_count': len(sources)}
+
+        if sub_aggs:
+            bucket.update(self.aggregate(sources, sub_aggs))
+
+        return bucket
+
+    def composite(self, sources: List[Dict], composite: Dict, sub_aggs: Optional[Dict]) -> Dict:
+        names = []
+        fields = []
+        for source in composite['sources']:
+            (name, definition), = source.items()
+            names.append(name)
+            fields.append(definition['terms']['field'])
+
+        grouped: Dict[tuple, List[Dict]] = {}
+        for doc in sources:
+            for key in itertools.product(*[set(field_values(doc, field)) for field in fields]):
+                grouped.setdefault(key, []).append(doc)
+
+        keys = sorted(grouped, key=lambda key: tuple(sort_value(value) for value in key))
+
+        after = composite.get('after')
+        if after:
+            after_key = tuple(sort_value(after[name]) for name in names)
+            keys = [key for key in keys if tuple(sort_value(value) for value in key) > after_key]
+
+        keys = keys[:composite.get('size', 10)]
+
+        result = {'buckets': [self.bucket(dict(zip(names, key)), grouped[key], sub_aggs) for key in keys]}
+
+        if keys:
+            result['after_key'] = dict(zip(names, keys[-1]))
+
+        return result
+
+    def terms(self, sources: List[Dict], terms: Dict, sub_aggs: Optional[Dict]) -> Dict:
+        include = terms.get('include')
+
+        grouped: Dict[Any, List[Dict]] = {}
+        for doc in sources:
+            for value in set(field_values(doc, terms['field'])):
+                if include and self.partition(value, include['num_partitions']) != include['partition']:
+                    continue
+                grouped.setdefault(value, []).append(doc)
+
+        counts = Counter({key: len(docs) for key, docs in grouped.items()})
+        keys = sorted(counts, key=lambda key: (-counts[key], sort_value(key)))
+
+        size = terms.get('size', 10)
+        selected = keys[:size]
+
+        return {
+            'doc_count_error_upper_bound': 0,
+            'sum_other_doc_count': sum(counts[key] for key in keys[size:]),
+            'buckets': [self.bucket(key, grouped[key], sub_aggs) for key in selected],
+        }
+
+    @staticmethod
+    def partition(value: Any, num_partitions: int) -> int:
+        """
+        Partition of a term. Stable, but not the hash used by Elasticsearch
+        """
+        return zlib.crc32(str(value).encode()) % num_partitions
+
+    @staticmethod
+    def metric(sources: List[Dict], field: str, function) -> Dict:
+        values = [value for doc in sources for value in field_values(doc, field)]
+        numbers = [(numeric_value(value), value) for value in values]
+        numbers = [(number, value) for number, value in numbers if number is not None]
+
+        if not numbers:
+            return {'value': None}
+
+        number, value = function(numbers, key=lambda pair: pair[0])
+
+        if isinstance(value, str):
+            return {'value': number, 'value_as_string': format_date(number)}
+
+        return {'value': number}
+
+    def top_hits(self, sources: List[Dict], top_hits: Dict) -> Dict:
+        includes = top_hits.get('_source')
+        selected = sources[:top_hits.get('size', 3)]
+
+        return {
+            'hits': {
+                'total': {'value': len(sources), 'relation': 'eq'},
+                'hits': [self.hit('', str(i), source, includes) for i, source in enumerate(selected)],
+            }
+        }
+
+
+class FakeAsyncElasticsearch(FakeElasticsearch):
+    """
+    Asynchronous version of :py:class:`FakeElasticsearch`
+    """
+
+    async def search(self, index: str, body: Union[Dict, str, None] = None, **kwargs) -> Dict:
+        return super().search(index, body, **kwargs)
+
+    async def get(self, index: str, id: str, **kwargs) -> Dict:
+        return super().get(index, id, **kwargs)
+
+    async def mget(self, body: Dict, index: str, **kwargs) -> Dict:
+        return {'docs': [super(FakeAsyncElasticsearch, self).get(index, doc_id, ignore=404) for doc_id in body['ids']]}
+
+    async def update(self, index: str, id: str, body: Dict, **kwargs) -> Dict:
+        return super().update(index, id, body, **kwargs)
+
+    async def close(self) -> None:
+        pass
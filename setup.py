@@ -51,18 +51,37 @@ setup(
         'dev': [
             'isort',
             'pytest',
+        ],
+        'async': [
+            'elasticsearch[async]',
+        ],
+        'redis': [
+            'redis',
+        ],
+        'parquet': [
+            'pyarrow',
+        ],
+        'benchmark': [
+            'pytest',
+            'pytest-benchmark',
         ]
     },
     entry_points={
         'console_scripts': [
-            'generate_items = item_generator.scripts.extract_facet:main',
+            'generate_items = item_generator.scripts.extract_facets:main',
+            'build_description_index = item_generator.scripts.build_description_index:main',
+            'convert_assets = item_generator.scripts.convert_assets:main',
         ],
         'asset_scanner.extractors': [
           'item_generator = item_generator:FacetExtractor',
         ],
         "item_generator.processors": [
             "elasticsearch_aggregator = item_generator.plugins.processors.elasticsearch_aggregator:ElasticsearchAggregator",
-            "json_aggregator = item_generator.plugins.processors.json_aggregator:JSONAggregator"
+            "async_elasticsearch_aggregator = item_generator.plugins.processors.async_elasticsearch_aggregator:AsyncElasticsearchAggregator",
+            "json_aggregator = item_generator.plugins.processors.json_aggregator:JSONAggregator",
+            "running_aggregator = item_generator.plugins.processors.running_aggregator:RunningAggregator",
+            "sqlite_aggregator = item_generator.plugins.processors.sqlite_aggregator:SQLiteAggregator",
+            "parquet_aggregator = item_generator.plugins.processors.parquet_aggregator:ParquetAggregator"
         ],
     }
 )
@@ -0,0 +1,154 @@
+# encoding: utf-8
+"""
+
+"""
+__author__ = 'Richard Smith'
+__date__ = '18 Oct 2026'
+__copyright__ = 'Copyright 2018 United Kingdom Research and Innovation'
+__license__ = 'BSD - see LICENSE file in top-level package directory'
+__contact__ = 'richard.d.smith@stfc.ac.uk'
+
+import time
+
+import pytest
+from cachetools import TTLCache
+
+from asset_scanner.core.item_describer import ItemDescription
+
+from item_generator.core.cache import SummaryCache
+
+
+@pytest.fixture
+def description():
+    return ItemDescription(
+        paths=['/badc/faam/data'],
+        facets={'aggregation_facets': ['platform', 'flight_number']}
+    )
+
+
+def summary(flight_number):
+    return {'properties': {'platform': ['faam'], 'flight_number': [flight_number]}}
+
+
+def test_lru_eviction(description):
+    cache = SummaryCache(maxsize=2, ttl=60)
+
+    cache.set('item1', description, summary('b001'))
+    cache.set('item2', description, summary('b002'))
+
+    # Touch item1 so item2 is the least recently used
+    assert cache.get('item1', description) == summary('b001')
+
+    cache.set('item3', description, summary('b003'))
+
+    assert cache.get('item2', description) is None
+    assert cache.get('item3', description) == summary('b003')
+
+    assert cache.stats()['hits'] == 2
+    assert cache.stats()['misses'] == 1
+
+
+def test_ttl_expiry(description):
+    cache = SummaryCache(policy='ttl', ttl=10)
+    clock = [1000.0]
+    cache.cache = TTLCache(maxsize=10, ttl=10, timer=lambda: clock[0])
+
+    cache.set('item1', description, summary('b001'))
+    assert cache.get('item1', description) is not None
+
+    clock[0] += 11
+    assert cache.get('item1', description) is None
+
+
+def test_lru_expiry(description):
+    cache = SummaryCache(ttl=10)
+    clock = [1000.0]
+    cache.cache = TTLCache(maxsize=10, ttl=10, timer=lambda: clock[0])
+
+    cache.set('item1', description, summary('b001'))
+
+    clock[0] += 11
+    assert cache.get('item1', description) is None
+
+
+def test_memory_budget(description):
+    size = len(str(summary('b001'))) * 3
+    cache = SummaryCache(max_memory=size, ttl=60)
+
+    for i in range(10):
+        cache.set(f'item{i}', description, summary(f'b{i:03d}'))
+
+    assert 0 < cache.stats()['size'] < 10
+
+
+def test_key_includes_facets(description):
+    cache = SummaryCache(ttl=60)
+    cache.set('item1', description, summary('b001'))
+
+    other = ItemDescription(paths=['/badc/faam/data'], facets={'aggregation_facets': ['platform']})
+
+    assert cache.get('item1', other) is None
+
+
+def test_key_uses_plan_facets(description):
+    cache = SummaryCache(ttl=60)
+    cache.set('item1', description, summary('b001'))
+
+    # Same facets in a different order and split across the facet lists
+    other = ItemDescription(
+        paths=['/badc/faam/data'],
+        facets={'aggregation_facets': ['flight_number'], 'search_facets': ['platform', 'flight_number']}
+    )
+
+    assert cache.get('item1', other) == summary('b001')
+
+
+def test_returns_copy(description):
+    cache = SummaryCache(ttl=60)
+    cache.set('item1', description, summary('b001'))
+
+    cache.get('item1', description)['properties']['platform'].append('spam')
+
+    assert cache.get('item1', description) == summary('b001')
+
+
+def test_disk_store(description, tmp_path):
+    path = str(tmp_path / 'summaries.db')
+
+    SummaryCache(path=path, ttl=60).set('item1', description, summary('b001'))
+
+    cache = SummaryCache(path=path, ttl=60)
+    assert cache.get('item1', description) == summary('b001')
+    assert cache.stats()['disk_hits'] == 1
+
+    # Second lookup is served from memory
+    cache.get('item1', description)
+    assert cache.stats()['disk_hits'] == 1
+    assert cache.stats()['hits'] == 2
+
+    cache.clear()
+    assert SummaryCache(path=path, ttl=60).get('item1', description) is None
+
+
+def test_requires_ttl(tmp_path):
+    with pytest.raises(ValueError):
+        SummaryCache()
+
+    with pytest.raises(ValueError):
+        SummaryCache(path=str(tmp_path / 'summaries.db'))
+
+
+def test_disk_store_expired(description, tmp_path, monkeypatch):
+    path = str(tmp_path / 'summaries.db')
+    SummaryCache(path=path, ttl=60).set('item1', description, summary('b001'))
+
+    later = time.time() + 61
+    monkeypatch.setattr(time, 'time', lambda: later)
+
+    cache = SummaryCache(path=path, ttl=60)
+    assert cache.get('item1', description) is None
+
+
+def test_unknown_policy():
+    with pytest.raises(ValueError):
+        SummaryCache(policy='fifo', ttl=60)
@@ -0,0 +1,185 @@
+# encoding: utf-8
+"""
+
+"""
+__author__ = 'Richard Smith'
+__date__ = '18 Oct 2026'
+__copyright__ = 'Copyright 2018 United Kingdom Research and Innovation'
+__license__ = 'BSD - see LICENSE file in top-level package directory'
+__contact__ = 'richard.d.smith@stfc.ac.uk'
+
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import pytest
+
+from item_generator.core.deduplication import (
+    MemoryDeduplicator,
+    RedisDeduplicator,
+    SQLiteDeduplicator,
+    load_deduplicator,
+)
+
+
+class LocalRedis:
+    """
+    Stand-in for a Redis server supporting SET with NX and EX, EXPIRE and
+    pipelines
+    """
+
+    def __init__(self):
+        self.data = {}
+        self.round_trips = 0
+
+    def set(self, key, value, nx=False, ex=None):
+        now = time.time()
+        existing = self.data.get(key)
+
+        if nx and existing and existing[1] > now:
+            return None
+
+        self.data[key] = (value, now + ex if ex else float('inf'))
+        return True
+
+    def expire(self, key, seconds):
+        existing = self.data.get(key)
+
+        if not existing or existing[1] <= time.time():
+            return False
+
+        self.data[key] = (existing[0], time.time() + seconds)
+        return True
+
+    def pipeline(self, transaction=True):
+        return LocalPipeline(self)
+
+
+class LocalPipeline:
+
+    def __init__(self, server):
+        self.server = server
+        self.commands = []
+
+    def set(self, *args, **kwargs):
+        self.commands.append((self.server.set, args, kwargs))
+
+    def expire(self, *args, **kwargs):
+        self.commands.append((self.server.expire, args, kwargs))
+
+    def execute(self):
+        self.server.round_trips += 1
+        return [command(*args, **kwargs) for command, args, kwargs in self.commands]
+
+
+def sqlite_seen(path, key):
+    return SQLiteDeduplicator(path).seen(key)
+
+
+def test_memory_backend():
+    dedup = MemoryDeduplicator(maxsize=2, ttl=30)
+
+    assert not dedup.seen('coll1')
+    assert dedup.seen('coll1')
+    assert not dedup.seen('coll2')
+
+    dedup.add({'coll3': time.time() + 10, 'expired': time.time() - 1})
+    assert set(dedup.state()) == {'coll2', 'coll3'}
+
+    assert dedup.stats() == {'hits': 1, 'misses': 2, 'hit_rate': 1 / 3}
+
+
+def test_memory_backend_state_keeps_expiry():
+    dedup = MemoryDeduplicator(ttl=30)
+    expires = time.time() + 5
+
+    dedup.add({'coll1': expires})
+    since = time.time()
+    assert not dedup.seen('coll2')
+
+    assert dedup.state(since) == {'coll2': pytest.approx(time.time() + 30, abs=1)}
+    assert dedup.state()['coll1'] == expires
+
+    dedup.add({'coll1': expires - 1})
+    assert dedup.state()['coll1'] == expires
+
+
+def test_sqlite_backend_shared_between_processes(tmp_path):
+    path = str(tmp_path / 'headers.db')
+
+    assert not SQLiteDeduplicator(path).seen('coll1')
+
+    with ProcessPoolExecutor(max_workers=2) as pool:
+        results = list(pool.map(sqlite_seen, [path] * 4, ['coll1', 'coll2', 'coll2', 'coll2']))
+
+    assert results.count(True) == 3
+    assert results.count(False) == 1
+
+
+def test_sqlite_backend_expiry_and_capacity(tmp_path):
+    dedup = SQLiteDeduplicator(str(tmp_path / 'headers.db'), maxsize=5, ttl=30)
+    dedup.PRUNE_INTERVAL = 10
+
+    for i in range(20):
+        dedup.seen(f'coll{i}')
+
+    # Pruned back to maxsize on the 20th insert, keeping the newest keys
+    assert dedup.seen('coll19')
+    assert not dedup.seen('coll0')
+
+    expiring = SQLiteDeduplicator(str(tmp_path / 'expiring.db'), ttl=0.01)
+    assert not expiring.seen('coll1')
+    time.sleep(0.02)
+    assert not expiring.seen('coll1')
+
+
+def test_redis_backend():
+    server = LocalRedis()
+
+    worker1 = RedisDeduplicator(client=server, ttl=30)
+    worker2 = RedisDeduplicator(client=server, ttl=30)
+
+    assert not worker1.seen('coll1')
+    assert worker2.seen('coll1')
+    assert 'item_generator:header:coll1' in server.data
+    assert worker2.stats()['hit_rate'] == 1.0
+    assert server.round_trips == 2
+
+
+def test_redis_backend_refreshes_ttl():
+    server = LocalRedis()
+    dedup = RedisDeduplicator(client=server, ttl=30)
+
+    dedup.seen('coll1')
+    server.data['item_generator:header:coll1'] = (1, time.time() + 1)
+
+    assert dedup.seen('coll1')
+    assert server.data['item_generator:header:coll1'][1] > time.time() + 25
+
+
+def test_sqlite_backend_reuses_connection(tmp_path):
+    dedup = SQLiteDeduplicator(str(tmp_path / 'headers.db'))
+    conn = dedup.connection()
+
+    dedup.seen('coll1')
+    assert dedup.seen('coll1')
+    assert dedup.connection() is conn
+
+    dedup.close()
+    assert dedup._conn is None
+
+
+def test_load_deduplicator(tmp_path):
+    assert load_deduplicator({}) is None
+
+    legacy = load_deduplicator({'header_deduplication': True, 'CAHCE_MAX_SIZE': 3})
+    assert isinstance(legacy, MemoryDeduplicator)
+    assert legacy.maxsize == 3
+
+    dedup = load_deduplicator({
+        'header_deduplication': {'backend': 'sqlite', 'path': str(tmp_path / 'headers.db'), 'ttl': 60}
+    })
+    assert isinstance(dedup, SQLiteDeduplicator)
+    assert dedup.ttl == 60
+
+    with pytest.raises(ValueError):
+        load_deduplicator({'header_deduplication': {'backend': 'carrier_pigeon'}})
@@ -0,0 +1,99 @@
+# encoding: utf-8
+"""
+
+"""
+__author__ = 'Richard Smith'
+__date__ = '18 Oct 2026'
+__copyright__ = 'Copyright 2018 United Kingdom Research and Innovation'
+__license__ = 'BSD - see LICENSE file in top-level package directory'
+__contact__ = 'richard.d.smith@stfc.ac.uk'
+
+import os
+
+import pytest
+from asset_scanner.core.item_describer import ItemDescriptions
+from pydantic import ValidationError
+
+from item_generator import FacetExtractor
+from item_generator.core.descriptions import DescriptionIndex, build_index, path_prefixes
+
+FILEPATH = '/badc/faam/data/2005/b070-may-05/core_raw/core_faam_20050524_r0_b070_raw.nc'
+
+
+@pytest.fixture
+def descriptions_root():
+    return os.path.join(os.path.dirname(os.path.realpath(__file__)), 'data', 'descriptions')
+
+
+@pytest.fixture
+def index_path(descriptions_root, tmp_path):
+    path = str(tmp_path / 'descriptions.db')
+    build_index(path, descriptions_root)
+    return path
+
+
+def test_path_prefixes():
+    assert path_prefixes('/badc/faam/') == ['', '/badc', '/badc/faam']
+
+
+def test_index_matches_descriptions(descriptions_root, index_path):
+    descriptions = ItemDescriptions(descriptions_root)
+    index = DescriptionIndex(index_path)
+
+    for filepath in [FILEPATH, '/badc/faam/data', '/badc/spam/data/file.nc']:
+        assert index.get_description(filepath) == descriptions.get_description(filepath)
+
+    # Descriptions are shared between paths with the same prefix
+    assert index.get_description(FILEPATH) is index.get_description('/badc/faam/data/other.nc')
+
+    with pytest.raises(ValidationError):
+        index.get_description('/neodc/unknown/file.nc')
+
+    index.close()
+
+
+def test_extractor_loads_index(descriptions_root, tmp_path):
+    index_path = str(tmp_path / 'descriptions.db')
+
+    extractor = FacetExtractor({
+        'item_descriptions': {
+            'root_directory': descriptions_root,
+            'index': index_path,
+        },
+        'outputs': [{'name': 'standard_out'}],
+    })
+
+    # The index is built on first use and loaded in place of the yaml files
+    assert os.path.exists(index_path)
+    assert isinstance(extractor.item_descriptions, DescriptionIndex)
+    assert extractor.get_description(FILEPATH).facets.aggregation_facets == ['platform', 'flight_number']
+
+
+def test_description_cache(descriptions_root):
+    extractor = FacetExtractor({
+        'item_descriptions': {'root_directory': descriptions_root},
+        'outputs': [{'name': 'standard_out'}],
+    })
+
+    calls = []
+    get_description = extractor.item_descriptions.get_description
+
+    def counting_get_description(filepath):
+        calls.append(filepath)
+        return get_description(filepath)
+
+    extractor.item_descriptions.get_description = counting_get_description
+
+    first = extractor.get_description(FILEPATH)
+    second = extractor.get_description(FILEPATH.replace('r0', 'r1'))
+
+    # Files in the same directory resolve once
+    assert first is second
+    assert calls == [FILEPATH]
+
+    extractor.get_description('/badc/faam/data/2005/b069-jan-05/core_raw/file.nc')
+    assert len(calls) == 2
+
+    # Replacing the descriptions clears the cache
+    extractor.item_descriptions = ItemDescriptions(descriptions_root)
+    assert extractor.get_description(FILEPATH) is not first
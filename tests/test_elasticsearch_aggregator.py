@@ -0,0 +1,303 @@
+# encoding: utf-8
+"""
+
+"""
+__author__ = 'Richard Smith'
+__date__ = '18 Oct 2026'
+__copyright__ = 'Copyright 2018 United Kingdom Research and Innovation'
+__license__ = 'BSD - see LICENSE file in top-level package directory'
+__contact__ = 'richard.d.smith@stfc.ac.uk'
+
+import asyncio
+import json
+
+import pytest
+
+from asset_scanner.core.item_describer import ItemDescription
+
+es_aggregator = pytest.importorskip(
+    'item_generator.plugins.processors.elasticsearch_aggregator',
+    exc_type=ImportError
+)
+ElasticsearchAggregator = es_aggregator.ElasticsearchAggregator
+
+
+class CannedElasticsearch:
+    """
+    Returns the queued responses in order and records the query bodies.
+    Serialized bodies are decoded, as the client sends them unchanged.
+    """
+
+    def __init__(self, responses):
+        self.responses = list(responses)
+        self.queries = []
+
+    @staticmethod
+    def decode(body):
+        return json.loads(body) if isinstance(body, str) else body
+
+    def search(self, index, body):
+        self.queries.append(self.decode(body))
+        return self.responses.pop(0)
+
+
+def extent_aggs():
+    return {
+        'start_datetime': {'value_as_string': '2005-01-05T00:00:00'},
+        'end_datetime': {'value_as_string': '2005-01-06T00:00:00'},
+        'min_datetime': {},
+        'max_datetime': {},
+        'min_lon': {'value': -10.0},
+        'min_lat': {'value': 50.0},
+        'max_lon': {'value': 2.0},
+        'max_lat': {'value': 60.0},
+    }
+
+
+def facet_page(facet, values, after_key=None):
+    page = {'buckets': [{'key': {facet: value}} for value in values]}
+    if after_key:
+        page['after_key'] = after_key
+    return page
+
+
+@pytest.fixture
+def description():
+    return ItemDescription(
+        paths=['/badc/faam/data'],
+        facets={'aggregation_facets': ['platform', 'flight_number']}
+    )
+
+
+@pytest.fixture
+def aggregator():
+    return ElasticsearchAggregator(
+        index='ceda-index',
+        connection_kwargs={'hosts': ['localhost:9200']},
+        single_request=True,
+    )
+
+
+def test_single_request(aggregator, description):
+    """
+    Facets and extent should come back from one search when no facet
+    has more than one page of values.
+    """
+    aggs = extent_aggs()
+    aggs['facet_platform'] = facet_page('platform', ['faam'], {'platform': 'faam'})
+    aggs['facet_flight_number'] = facet_page('flight_number', ['b069', 'b070'])
+
+    aggregator.es = CannedElasticsearch([{'hits': {'hits': []}, 'aggregations': aggs}])
+
+    metadata = aggregator.run('item1', description)
+
+    assert len(aggregator.es.queries) == 1
+    assert metadata['properties']['platform'] == ['faam']
+    assert metadata['properties']['flight_number'] == ['b069', 'b070']
+    assert metadata['properties']['start_datetime'] == '2005-01-05T00:00:00'
+    assert metadata['bbox'] == [-10.0, 50.0, 2.0, 60.0]
+
+
+def test_single_request_pages_only_full_facets(aggregator, description, monkeypatch):
+    """
+    Only facets with a full first page should be paged and
+    they should be paged together.
+    """
+    monkeypatch.setattr(ElasticsearchAggregator, 'PAGE_SIZE', 2)
+
+    aggs = extent_aggs()
+    aggs['facet_platform'] = facet_page('platform', ['faam'], {'platform': 'faam'})
+    aggs['facet_flight_number'] = facet_page('flight_number', ['b069', 'b070'], {'flight_number': 'b070'})
+
+    second_page = {
+        'facet_flight_number': facet_page('flight_number', ['b071'], {'flight_number': 'b071'})
+    }
+
+    aggregator.es = CannedElasticsearch([
+        {'hits': {'hits': []}, 'aggregations': aggs},
+        {'hits': {'hits': []}, 'aggregations': second_page},
+    ])
+
+    metadata = aggregator.run('item1', description)
+
+    assert len(aggregator.es.queries) == 2
+
+    paged_aggs = aggregator.es.queries[1]['aggs']
+    assert list(paged_aggs) == ['facet_flight_number']
+    assert paged_aggs['facet_flight_number']['composite']['after'] == {'flight_number': 'b070'}
+
+    assert metadata['properties']['flight_number'] == ['b069', 'b070', 'b071']
+
+
+def test_run_batch(aggregator, description):
+    """
+    Facet values and extents for many items should be split back
+    out of a single search.
+    """
+    item_extent = extent_aggs()
+    item_extent['key'] = 'item1'
+
+    aggs = {
+        'items': {'buckets': [item_extent]},
+        'facet_platform': {'buckets': [
+            {'key': {'item_id': 'item1', 'platform': 'faam'}},
+            {'key': {'item_id': 'item2', 'platform': 'faam'}},
+        ]},
+        'facet_flight_number': {'buckets': [
+            {'key': {'item_id': 'item1', 'flight_number': 'b069'}},
+            {'key': {'item_id': 'item2', 'flight_number': 'b070'}},
+        ]},
+    }
+
+    aggregator.es = CannedElasticsearch([{'hits': {'hits': []}, 'aggregations': aggs}])
+
+    output = aggregator.run_batch(['item1', 'item2', 'item1'], [description] * 3)
+
+    assert len(aggregator.es.queries) == 1
+    assert aggregator.es.queries[0]['query']['bool']['must'] == [
+        {'terms': {'item_id.keyword': ['item1', 'item2']}}
+    ]
+
+    assert output['item1']['properties']['flight_number'] == ['b069']
+    assert output['item1']['bbox'] == [-10.0, 50.0, 2.0, 60.0]
+    assert output['item2']['properties'] == {'platform': ['faam'], 'flight_number': ['b070']}
+    assert 'bbox' not in output['item2']
+
+
+def test_connection_kwargs():
+    """
+    Connection pool options should be applied to the connection parameters
+    """
+    connection_kwargs = ElasticsearchAggregator.build_connection_kwargs({
+        'connection_kwargs': {'hosts': ['localhost:9200'], 'headers': {'x-test': '1'}},
+        'pool_size': 25,
+        'keep_alive': True,
+    })
+
+    assert connection_kwargs == {
+        'hosts': ['localhost:9200'],
+        'maxsize': 25,
+        'headers': {'x-test': '1', 'connection': 'keep-alive'},
+    }
+
+
+class CannedAsyncElasticsearch(CannedElasticsearch):
+    """
+    Asynchronous version of the canned client. Responses are chosen by the
+    aggregation names in the query, as concurrent searches arrive in any order.
+    """
+
+    def __init__(self, responses):
+        super().__init__(responses)
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def search(self, index, body):
+        body = self.decode(body)
+        self.queries.append(body)
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+
+        await asyncio.sleep(0.01)
+
+        self.in_flight -= 1
+        names = set(body['aggs'])
+        return {
+            'hits': {'hits': []},
+            'aggregations': {name: agg for name, agg in self.responses[0].items() if name in names}
+        }
+
+    async def close(self):
+        pass
+
+
+def test_async_run(description, monkeypatch):
+    """
+    Facet and extent searches should run concurrently and give the same
+    output as the synchronous processor.
+    """
+    async_module = pytest.importorskip(
+        'item_generator.plugins.processors.async_elasticsearch_aggregator',
+        exc_type=ImportError
+    )
+
+    aggs = extent_aggs()
+    aggs['facet_platform'] = facet_page('platform', ['faam'])
+    aggs['facet_flight_number'] = facet_page('flight_number', ['b069', 'b070'])
+
+    client = CannedAsyncElasticsearch([aggs])
+    monkeypatch.setattr(async_module.AsyncElasticsearchAggregator, 'get_client', lambda self, kwargs: client)
+
+    aggregator = async_module.AsyncElasticsearchAggregator(
+        index='ceda-index',
+        connection_kwargs={'hosts': ['localhost:9200']},
+    )
+
+    metadata = asyncio.run(aggregator.arun('item1', description))
+
+    assert len(client.queries) == 3
+    assert client.max_in_flight == 3
+    assert metadata['properties']['flight_number'] == ['b069', 'b070']
+    assert metadata['bbox'] == [-10.0, 50.0, 2.0, 60.0]
+
+    # Synchronous callers use the private event loop
+    assert aggregator.run('item1', description) == metadata
+    aggregator.close()
+
+
+def test_query_bodies_serialized_once(aggregator, description):
+    """
+    The first search for each item should reuse the serialized body with
+    the item ID substituted.
+    """
+    responses = []
+    for _ in range(2):
+        aggs = extent_aggs()
+        aggs['facet_platform'] = facet_page('platform', ['faam'])
+        aggs['facet_flight_number'] = facet_page('flight_number', ['b069'])
+        responses.append({'hits': {'hits': []}, 'aggregations': aggs})
+
+    aggregator.es = CannedElasticsearch(responses)
+
+    aggregator.run('item1', description)
+    aggregator.run('item2', description)
+
+    assert len(aggregator.query_templates) == 1
+    assert [query['query']['bool']['must'][0]['term']['item_id.keyword']['value']
+            for query in aggregator.es.queries] == ['item1', 'item2']
+    assert aggregator.es.queries[0]['aggs'].keys() == aggregator.es.queries[1]['aggs'].keys()
+
+
+def test_query_templates_bounded(monkeypatch):
+    monkeypatch.setattr(ElasticsearchAggregator, 'QUERY_TEMPLATES', 2)
+    aggregator = ElasticsearchAggregator(index='ceda-index', connection_kwargs={'hosts': ['localhost:9200']})
+
+    for facet in ('platform', 'flight_number', 'instrument'):
+        aggregator.query_template(('summary', facet), lambda item_id: {'item_id': item_id})
+
+    assert list(aggregator.query_templates) == [('summary', 'flight_number'), ('summary', 'instrument')]
+
+
+def test_search_metrics(aggregator, description, monkeypatch):
+    """
+    Round trips and composite pages should be recorded for each item
+    """
+    from item_generator.core.metrics import Metrics
+
+    monkeypatch.setattr(ElasticsearchAggregator, 'PAGE_SIZE', 2)
+
+    aggs = extent_aggs()
+    aggs['facet_platform'] = facet_page('platform', ['faam'])
+    aggs['facet_flight_number'] = facet_page('flight_number', ['b069', 'b070'], {'flight_number': 'b070'})
+
+    aggregator.metrics = Metrics()
+    aggregator.es = CannedElasticsearch([
+        {'hits': {'hits': []}, 'aggregations': aggs},
+        {'hits': {'hits': []}, 'aggregations': {'facet_flight_number': facet_page('flight_number', ['b071'])}},
+    ])
+
+    aggregator.run('item1', description)
+
+    assert aggregator.metrics.counter('item_generator_es_searches_total') == 2
+    assert aggregator.metrics.counter('item_generator_es_composite_pages_total') == 3
+    assert aggregator.metrics.histogram('item_generator_es_searches_per_item')['sum'] == 2
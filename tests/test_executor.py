@@ -0,0 +1,133 @@
+# encoding: utf-8
+"""
+
+"""
+__author__ = 'Richard Smith'
+__date__ = '18 Oct 2026'
+__copyright__ = 'Copyright 2018 United Kingdom Research and Innovation'
+__license__ = 'BSD - see LICENSE file in top-level package directory'
+__contact__ = 'richard.d.smith@stfc.ac.uk'
+
+import os
+import threading
+import time
+
+import pytest
+
+from item_generator import FacetExtractor
+from item_generator.core.executor import BatchExecutor, process_chunk
+
+
+@pytest.fixture
+def extractor_conf():
+    test_path = os.path.dirname(os.path.realpath(__file__))
+    return {
+        "item_descriptions": {
+            "root_directory": os.path.join(test_path, 'data', 'descriptions'),
+        },
+        "header_deduplication": True,
+        "outputs": [
+            {
+                "name": "standard_out"
+            }
+        ]
+    }
+
+
+class RecordingExtractor(FacetExtractor):
+    """
+    Extractor which records the files it is asked to process
+    """
+
+    def __init__(self, conf):
+        super().__init__(conf)
+        self.processed = []
+        self.threads = set()
+        self.lock = threading.Lock()
+
+    def process_file(self, filepath, source_media, **kwargs):
+        if kwargs['item_id'] == 'broken':
+            raise ValueError('broken item')
+
+        with self.lock:
+            self.processed.append(filepath)
+            self.threads.add(threading.get_ident())
+
+        self.header_deduplicator.seen(f'collection-{kwargs["item_id"]}')
+
+
+def test_thread_executor(extractor_conf):
+    extractor = RecordingExtractor(extractor_conf)
+    files = [(f'/badc/faam/data/file{i}.nc', f'item{i % 3}', 'POSIX') for i in range(50)]
+    files.insert(10, ('/badc/faam/data/broken.nc', 'broken', 'POSIX'))
+
+    executor = BatchExecutor(extractor_conf, mode='thread', workers=4, chunk_size=5, extractor=extractor)
+    result = executor.run(iter(files))
+
+    assert result.processed == 50
+    assert result.failed == 1
+    assert result.errors[0].filepath == '/badc/faam/data/broken.nc'
+    assert sorted(extractor.processed) == sorted(f[0] for f in files if f[1] != 'broken')
+    assert set(executor.header_state) == {'collection-item0', 'collection-item1', 'collection-item2'}
+
+
+def test_thread_executor_flushes_supplied_extractor(extractor_conf):
+    """
+    Output waiting in an extractor the caller keeps open should be written at the end of the run
+    """
+    extractor = RecordingExtractor(extractor_conf)
+    flushes = []
+    extractor.flush = lambda: flushes.append(len(extractor.processed))
+
+    executor = BatchExecutor(extractor_conf, mode='thread', workers=2, chunk_size=2, extractor=extractor)
+    executor.run([(f'/badc/faam/data/file{i}.nc', 'item1', 'POSIX') for i in range(5)])
+
+    assert flushes == [5]
+
+
+def test_process_chunk_merges_header_state(extractor_conf):
+    extractor = RecordingExtractor(extractor_conf)
+    expires = time.time() + 5
+
+    processed, errors, header_state, latencies = process_chunk(
+        extractor,
+        [('/badc/faam/data/file.nc', 'item1', 'POSIX')],
+        header_state={'collection-other': expires}
+    )
+
+    assert processed == 1
+    assert not errors
+
+    # Only the IDs output during the chunk are returned
+    assert set(header_state) == {'collection-item1'}
+
+    # Merged IDs keep the expiry they were given
+    assert extractor.get_header_state() == {'collection-other': expires, **header_state}
+
+
+def test_executor_drops_expired_header_state(extractor_conf):
+    executor = BatchExecutor(extractor_conf, mode='process')
+    now = time.time()
+
+    executor.merge_header_state({'collection-old': now - 1, 'collection-new': now + 30})
+    executor.merge_header_state({'collection-new': now + 10})
+
+    assert executor.live_header_state() == {'collection-new': now + 30}
+
+
+def test_process_executor_reports_errors(extractor_conf):
+    """
+    Errors in worker processes should be reported per file
+    """
+    files = [(f'/badc/faam/data/file{i}.nc', f'item{i}', 'NOT_A_MEDIA_TYPE') for i in range(4)]
+
+    executor = BatchExecutor(extractor_conf, mode='process', workers=2, chunk_size=1)
+    result = executor.run(files)
+
+    assert result.processed == 0
+    assert sorted(error.filepath for error in result.errors) == sorted(f[0] for f in files)
+
+
+def test_unknown_mode(extractor_conf):
+    with pytest.raises(ValueError):
+        BatchExecutor(extractor_conf, mode='fibre')
@@ -0,0 +1,59 @@
+# encoding: utf-8
+"""
+
+"""
+__author__ = 'Richard Smith'
+__date__ = '18 Oct 2026'
+__copyright__ = 'Copyright 2018 United Kingdom Research and Innovation'
+__license__ = 'BSD - see LICENSE file in top-level package directory'
+__contact__ = 'richard.d.smith@stfc.ac.uk'
+
+import io
+
+import pytest
+
+from item_generator.core.executor import BatchResult
+from item_generator.scripts.extract_facets import print_summary, read_records
+
+
+def test_read_records():
+    stream = io.StringIO(
+        '{"filepath": "/badc/faam/a.nc", "item_id": "item1", "source_media": "OBJECT_STORE"}\n'
+        '\n'
+        '# comment\n'
+        '/badc/faam/b.nc\titem2\n'
+        '{"filepath": "/badc/faam/c.nc", "item_id": \n'
+        '{"filepath": "/badc/faam/d.nc", "item_id": "item3"}\n'
+    )
+
+    assert list(read_records(stream)) == [
+        ('/badc/faam/a.nc', 'item1', 'OBJECT_STORE'),
+        ('/badc/faam/b.nc', 'item2', 'POSIX'),
+        ('/badc/faam/d.nc', 'item3', 'POSIX'),
+    ]
+
+
+def test_read_records_requires_item_id():
+    stream = io.StringIO(
+        '/badc/faam/a.nc\titem1\n'
+        '/badc/faam/b.nc\n'
+    )
+
+    records = read_records(stream)
+    assert next(records) == ('/badc/faam/a.nc', 'item1', 'POSIX')
+
+    with pytest.raises(ValueError, match='Line 2'):
+        next(records)
+
+
+def test_print_summary():
+    result = BatchResult()
+    result.processed = 3
+    result.latencies.extend([0.01, 0.02, 0.5])
+
+    stream = io.StringIO()
+    print_summary(result, stream)
+
+    assert 'processed=3' in stream.getvalue()
+    assert 'p50=20.0ms' in stream.getvalue()
+    assert 'p95=500.0ms' in stream.getvalue()
@@ -9,8 +9,12 @@ __license__ = 'BSD - see LICENSE file in top-level package directory'
 __contact__ = 'richard.d.smith@stfc.ac.uk'
 
 import ast
+import asyncio
 import os
+import threading
+import time
 import pytest
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from unittest import TestCase
 
@@ -285,4 +289,355 @@ def test_templating(extractor, capsys):
     assets = ast.literal_eval(assets)
 
     assert facets['body']['properties']['title'] == expected_title
-    assert facets['body']['properties']['description'] == expected_description
\ No newline at end of file
+    assert facets['body']['properties']['description'] == expected_description
+
+
+def test_process_files(extractor, data_path):
+    """
+    Check that process_files aggregates all the items in a batch with a
+    single call to the processor and outputs an item and header per file.
+    """
+
+    file_list = [Path(os.path.join(
+        data_path,
+        'collection_descriptions',
+        'faam_generated_collection_id.yml'
+    ))]
+
+    extractor.item_descriptions = ItemDescriptions(filelist=file_list)
+
+    class BatchProcessor:
+        def __init__(self):
+            self.calls = []
+
+        def run_batch(self, item_ids, descriptions):
+            self.calls.append(item_ids)
+            return {item_id: {'properties': {'platform': ['faam']}} for item_id in item_ids}
+
+    processor = BatchProcessor()
+    outputs = []
+
+    extractor._load_processor = lambda: processor
+    extractor.output = lambda filepath, source_media, data, namespace=None, **kwargs: outputs.append((namespace, data))
+
+    path = '/badc/faam/data/2005/b069-jan-05/core_processed/core_faam_20050105_r0_b069.nc'
+    files = [
+        (path, 'item1', 'POSIX'),
+        (path.replace('r0', 'r1'), 'item1', StorageType.POSIX),
+        (path, 'item2', 'POSIX'),
+    ]
+
+    extractor.process_files(files)
+
+    assert processor.calls == [['item1', 'item2']]
+
+    items = [data for namespace, data in outputs if namespace == 'items']
+    headers = [data for namespace, data in outputs if namespace == 'header']
+
+    assert [item['id'] for item in items] == ['item1', 'item1', 'item2']
+    assert items[0]['body']['properties'] == {'platform': ['faam']}
+    assert len(headers) == 3
+
+
+def test_aggregation_processor_reused(extractor):
+    """
+    Check the aggregation processor is loaded once and closed with the extractor
+    """
+
+    class Processor:
+        closed = False
+
+        def run(self, item_id, description):
+            return {}
+
+        def close(self):
+            self.closed = True
+
+    loaded = []
+
+    def load_processor():
+        loaded.append(Processor())
+        return loaded[-1]
+
+    extractor._load_processor = load_processor
+
+    with extractor:
+        for _ in range(3):
+            extractor.get_summaries('item1', None)
+
+    assert len(loaded) == 1
+    assert loaded[0].closed
+    assert extractor.aggregation_processor is None
+
+
+def test_aggregation_processor_loaded_once_across_threads(extractor):
+    """
+    Check concurrent first calls share a single processor
+    """
+    loaded = []
+    barrier = threading.Barrier(4)
+
+    def load_processor():
+        loaded.append(object())
+        time.sleep(0.05)
+        return loaded[-1]
+
+    extractor._load_processor = load_processor
+
+    def get_processor():
+        barrier.wait()
+        return extractor.get_aggregation_processor()
+
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        processors = list(pool.map(lambda _: get_processor(), range(4)))
+
+    assert len(loaded) == 1
+    assert all(processor is loaded[0] for processor in processors)
+
+
+def test_summary_cache(extractor_conf, data_path):
+    """
+    Check repeated items are served from the summary cache
+    """
+    extractor_conf['summary_cache'] = {'maxsize': 10, 'ttl': 300}
+    extractor = FacetExtractor(extractor_conf)
+
+    calls = []
+
+    class Processor:
+        def run(self, item_id, description):
+            calls.append(item_id)
+            return {'properties': {'platform': ['faam']}}
+
+    extractor._load_processor = lambda: Processor()
+
+    path = '/badc/faam/data/2005/b069-jan-05/core_processed/core_faam_20050105_r0_b069.nc'
+    description = extractor.item_descriptions.get_description(path)
+
+    for _ in range(5):
+        assert extractor.get_summaries('item1', description) == {'properties': {'platform': ['faam']}}
+
+    batch = extractor.get_batch_summaries(['item1', 'item2'], [description, description])
+
+    assert set(batch) == {'item1', 'item2'}
+    assert calls == ['item1', 'item2']
+    assert extractor.summary_cache.stats()['hits'] == 5
+
+
+def test_aprocess_files(extractor_conf, data_path):
+    """
+    Check files are processed concurrently up to max_items_in_flight
+    """
+    extractor_conf['max_items_in_flight'] = 3
+    extractor = FacetExtractor(extractor_conf)
+
+    file_list = [Path(os.path.join(
+        data_path,
+        'collection_descriptions',
+        'faam_generated_collection_id.yml'
+    ))]
+
+    extractor.item_descriptions = ItemDescriptions(filelist=file_list)
+
+    class AsyncProcessor:
+        in_flight = 0
+        max_in_flight = 0
+
+        async def arun(self, item_id, description):
+            if item_id == 'broken':
+                raise ValueError(item_id)
+
+            self.in_flight += 1
+            self.max_in_flight = max(self.in_flight, self.max_in_flight)
+            await asyncio.sleep(0.01)
+            self.in_flight -= 1
+            return {'properties': {'platform': ['faam']}}
+
+    processor = AsyncProcessor()
+    outputs = []
+
+    extractor._load_processor = lambda: processor
+    extractor.output = lambda filepath, source_media, data, namespace=None, **kwargs: outputs.append((namespace, data))
+
+    path = '/badc/faam/data/2005/b069-jan-05/core_processed/core_faam_20050105_r0_b069.nc'
+    files = [(path, f'item{i}', 'POSIX') for i in range(10)] + [(path, 'broken', 'POSIX')]
+
+    asyncio.run(extractor.aprocess_files(files))
+
+    items = [data for namespace, data in outputs if namespace == 'items']
+
+    assert processor.max_in_flight == 3
+    assert sorted(item['id'] for item in items) == sorted(f'item{i}' for i in range(10))
+
+
+def test_coalesce(extractor_conf, data_path):
+    """
+    Check items are output once per window while headers are output per file
+    """
+    extractor_conf['coalesce'] = {'max_files': 4, 'max_age': 60}
+    extractor = FacetExtractor(extractor_conf)
+
+    file_list = [Path(os.path.join(
+        data_path,
+        'collection_descriptions',
+        'faam_generated_collection_id.yml'
+    ))]
+
+    extractor.item_descriptions = ItemDescriptions(filelist=file_list)
+
+    calls = []
+
+    class Processor:
+        def run_batch(self, item_ids, descriptions):
+            calls.append(item_ids)
+            return {item_id: {'properties': {'platform': ['faam']}} for item_id in item_ids}
+
+    outputs = []
+
+    extractor._load_processor = lambda: Processor()
+    extractor.output = lambda filepath, source_media, data, namespace=None, **kwargs: outputs.append((namespace, data))
+
+    path = '/badc/faam/data/2005/b069-jan-05/core_processed/core_faam_20050105_r0_b069.nc'
+    item_ids = ['item1', 'item1', 'item2', 'item1', 'item2', 'item3']
+
+    with extractor:
+        for i, item_id in enumerate(item_ids):
+            extractor.process_file(f'{path}.{i}', StorageType.POSIX, item_id=item_id)
+
+        # First window is full after 4 files
+        assert calls == [['item1', 'item2']]
+
+    assert calls == [['item1', 'item2'], ['item2', 'item3']]
+
+    items = [data['id'] for namespace, data in outputs if namespace == 'items']
+    headers = [data for namespace, data in outputs if namespace == 'header']
+
+    assert items == ['item1', 'item2', 'item2', 'item3']
+    assert len(headers) == 6
+
+
+def test_coalesce_window_expires_without_new_files(extractor_conf, data_path):
+    """
+    Check an expired window is output by poll when no further file arrives
+    """
+    extractor_conf['coalesce'] = {'max_files': 100, 'max_age': 0.05}
+    extractor = FacetExtractor(extractor_conf)
+
+    file_list = [Path(os.path.join(
+        data_path,
+        'collection_descriptions',
+        'faam_generated_collection_id.yml'
+    ))]
+
+    extractor.item_descriptions = ItemDescriptions(filelist=file_list)
+
+    class Processor:
+        def run_batch(self, item_ids, descriptions):
+            return {item_id: {'properties': {'platform': ['faam']}} for item_id in item_ids}
+
+    outputs = []
+
+    extractor._load_processor = lambda: Processor()
+    extractor.output = lambda filepath, source_media, data, namespace=None, **kwargs: outputs.append((namespace, data))
+
+    path = '/badc/faam/data/2005/b069-jan-05/core_processed/core_faam_20050105_r0_b069.nc'
+    extractor.process_file(path, StorageType.POSIX, item_id='item1')
+
+    extractor.poll()
+    assert not [data for namespace, data in outputs if namespace == 'items']
+
+    time.sleep(0.06)
+    extractor.poll()
+    assert [data['id'] for namespace, data in outputs if namespace == 'items'] == ['item1']
+
+
+def test_output_buffer(extractor_conf, data_path):
+    """
+    Check outputs are written in batches to each backend and the remainder
+    is written when the extractor is closed
+    """
+    extractor_conf['output_buffer'] = {'max_documents': 4, 'max_age': 60}
+    extractor = FacetExtractor(extractor_conf)
+
+    file_list = [Path(os.path.join(
+        data_path,
+        'collection_descriptions',
+        'faam_generated_collection_id.yml'
+    ))]
+
+    extractor.item_descriptions = ItemDescriptions(filelist=file_list)
+
+    class Processor:
+        def run(self, item_id, description):
+            return {'properties': {'platform': ['faam']}}
+
+    class Backend:
+        def __init__(self, namespace):
+            self.namespace = namespace
+            self.batches = []
+
+        def export_batch(self, messages):
+            self.batches.append([data for data, _ in messages])
+
+    items = Backend('items')
+    headers = Backend('header')
+
+    extractor._load_processor = lambda: Processor()
+    extractor.output_plugins = [items, headers]
+
+    path = '/badc/faam/data/2005/b069-jan-05/core_processed/core_faam_20050105_r0_b069.nc'
+
+    with extractor:
+        for i in range(3):
+            extractor.process_file(f'{path}.{i}', StorageType.POSIX, item_id=f'item{i}')
+
+        # Buffer is full after the item and header of two files
+        assert [len(batch) for batch in items.batches] == [2]
+        assert [len(batch) for batch in headers.batches] == [2]
+
+    assert [item['id'] for batch in items.batches for item in batch] == ['item0', 'item1', 'item2']
+    assert [len(batch) for batch in headers.batches] == [2, 1]
+
+
+def test_output_buffer_expires_without_new_files(extractor_conf, data_path):
+    """
+    Check a buffer older than max_age is written by poll when no further file arrives
+    """
+    extractor_conf['output_buffer'] = {'max_documents': 100, 'max_age': 0.05}
+    extractor = FacetExtractor(extractor_conf)
+
+    file_list = [Path(os.path.join(
+        data_path,
+        'collection_descriptions',
+        'faam_generated_collection_id.yml'
+    ))]
+
+    extractor.item_descriptions = ItemDescriptions(filelist=file_list)
+
+    class Processor:
+        def run(self, item_id, description):
+            return {'properties': {'platform': ['faam']}}
+
+    class Backend:
+        namespace = 'items'
+
+        def __init__(self):
+            self.batches = []
+
+        def export_batch(self, messages):
+            self.batches.append([data for data, _ in messages])
+
+    items = Backend()
+
+    extractor._load_processor = lambda: Processor()
+    extractor.output_plugins = [items]
+
+    path = '/badc/faam/data/2005/b069-jan-05/core_processed/core_faam_20050105_r0_b069.nc'
+    extractor.process_file(path, StorageType.POSIX, item_id='item1')
+
+    extractor.poll()
+    assert not items.batches
+
+    time.sleep(0.06)
+    extractor.poll()
+    assert [item['id'] for batch in items.batches for item in batch] == ['item1']
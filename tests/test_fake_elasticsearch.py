@@ -0,0 +1,438 @@
+# encoding: utf-8
+"""
+
+"""
+__author__ = 'Richard Smith'
+__date__ = '18 Oct 2026'
+__copyright__ = 'Copyright 2018 United Kingdom Research and Innovation'
+__license__ = 'BSD - see LICENSE file in top-level package directory'
+__contact__ = 'richard.d.smith@stfc.ac.uk'
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from item_generator.core.query_planner import TERMS, FacetStrategy
+from item_generator.testing.corpus import Corpus
+from item_generator.testing.fake_elasticsearch import FakeAsyncElasticsearch, FakeElasticsearch, merge_summary
+
+es_aggregator = pytest.importorskip(
+    'item_generator.plugins.processors.elasticsearch_aggregator',
+    exc_type=ImportError
+)
+ElasticsearchAggregator = es_aggregator.ElasticsearchAggregator
+
+CORPUS = Corpus(items=3, files_per_item=4, cardinality=5, hidden_every=6)
+
+
+def expected_values(item, facet):
+    assets = [
+        CORPUS.asset(index) for index in range(item * CORPUS.files_per_item, (item + 1) * CORPUS.files_per_item)
+    ]
+    return sorted({
+        asset['properties'][facet] for asset in assets if 'hidden' not in asset['categories']
+    })
+
+
+@pytest.fixture
+def es():
+    return FakeElasticsearch({'ceda-index': CORPUS.assets()})
+
+
+def aggregator(client, **kwargs):
+    processor = ElasticsearchAggregator(index='ceda-index', connection_kwargs={'hosts': ['localhost:9200']}, **kwargs)
+    processor.es = client
+    return processor
+
+
+def test_composite_paging(es):
+    query = {
+        'size': 0,
+        'aggs': {'facet': {'composite': {'sources': [{'platform': {'terms': {'field': 'properties.platform.keyword'}}}],
+                                         'size': 2}}}
+    }
+
+    values = []
+    while True:
+        agg = es.search('ceda-index', query)['aggregations']['facet']
+        values.extend(bucket['key']['platform'] for bucket in agg['buckets'])
+        if not agg['buckets']:
+            break
+        query['aggs']['facet']['composite']['after'] = agg['after_key']
+
+    assert values == [f'platform-{i}' for i in range(5)]
+
+
+@pytest.mark.parametrize('single_request', [True, False])
+def test_aggregator_against_fake(es, single_request):
+    processor = aggregator(es, single_request=single_request)
+    description = CORPUS.description()
+
+    for item, item_id in enumerate(CORPUS.item_ids()):
+        metadata = processor.run(item_id, description)
+
+        for facet in CORPUS.facets:
+            assert sorted(metadata['properties'][facet]) == expected_values(item, facet)
+
+        assert metadata['properties']['start_datetime'].endswith('Z')
+        assert len(metadata['bbox']) == 4
+
+
+def test_batch_matches_run(es):
+    processor = aggregator(es, single_request=True, batch_page_size=3)
+    description = CORPUS.description()
+    item_ids = CORPUS.item_ids()
+
+    batch = processor.run_batch(item_ids, [description] * len(item_ids))
+
+    for item_id in item_ids:
+        single = processor.run(item_id, description)
+        assert batch[item_id]['bbox'] == single['bbox']
+        for facet in CORPUS.facets:
+            assert sorted(batch[item_id]['properties'][facet]) == sorted(single['properties'][facet])
+
+
+def test_async_aggregator_against_fake(monkeypatch):
+    async_module = pytest.importorskip(
+        'item_generator.plugins.processors.async_elasticsearch_aggregator',
+        exc_type=ImportError
+    )
+
+    client = FakeAsyncElasticsearch({'ceda-index': CORPUS.assets()})
+    monkeypatch.setattr(async_module.AsyncElasticsearchAggregator, 'get_client', lambda self, kwargs: client)
+
+    processor = async_module.AsyncElasticsearchAggregator(
+        index='ceda-index',
+        connection_kwargs={'hosts': ['localhost:9200']},
+    )
+
+    metadata = asyncio.run(processor.arun(CORPUS.item_id(0), CORPUS.description()))
+
+    assert sorted(metadata['properties']['platform']) == expected_values(0, 'platform')
+
+
+def test_async_aggregator_run_from_threads(monkeypatch):
+    """
+    Synchronous runs from many threads share the private event loop
+    """
+    async_module = pytest.importorskip(
+        'item_generator.plugins.processors.async_elasticsearch_aggregator',
+        exc_type=ImportError
+    )
+
+    client = FakeAsyncElasticsearch({'ceda-index': CORPUS.assets()})
+    monkeypatch.setattr(async_module.AsyncElasticsearchAggregator, 'get_client', lambda self, kwargs: client)
+
+    processor = async_module.AsyncElasticsearchAggregator(
+        index='ceda-index',
+        connection_kwargs={'hosts': ['localhost:9200']},
+    )
+    description = CORPUS.description()
+    item_ids = CORPUS.item_ids() * 3
+
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        outputs = list(pool.map(lambda item_id: processor.run(item_id, description), item_ids))
+
+    for item_id, metadata in zip(item_ids, outputs):
+        item = CORPUS.item_ids().index(item_id)
+        assert sorted(metadata['properties']['platform']) == expected_values(item, 'platform')
+
+    processor.close()
+
+
+def test_get_and_update():
+    es = FakeElasticsearch()
+
+    assert es.get('summaries', 'a', ignore=404)['found'] is False
+    with pytest.raises(LookupError):
+        es.get('summaries', 'a')
+
+    es.register_script('add', lambda source, params: source.update(count=source['count'] + params['n']))
+
+    body = {'script': {'source': 'add', 'params': {'n': 2}}, 'upsert': {'count': 1}}
+    assert es.update('summaries', 'a', body)['result'] == 'created'
+    assert es.update('summaries', 'a', body)['result'] == 'updated'
+
+    assert es.get('summaries', 'a')['_source'] == {'count': 3}
+    assert [doc['found'] for doc in es.mget({'ids': ['a', 'b']}, index='summaries')['docs']] == [True, False]
+
+
+def test_materialised_summaries(es):
+    """
+    Summaries merged in batches as assets are indexed should match the
+    aggregation over the asset index
+    """
+    es.register_script(es_aggregator.SUMMARY_SCRIPT, merge_summary)
+
+    materialised = aggregator(es, summary_index='summaries')
+    assets = list(CORPUS.assets())
+
+    # Batches which split the items
+    for start in range(0, len(assets), 5):
+        materialised.update_summaries(assets[start:start + 5])
+
+    description = CORPUS.description()
+    item_ids = CORPUS.item_ids()
+    searches = es.searches
+
+    outputs = [materialised.run(item_id, description) for item_id in item_ids]
+    batch = materialised.run_batch(item_ids, [description] * len(item_ids))
+
+    # Materialised runs do not search the asset index
+    assert es.searches == searches
+
+    for item, (item_id, metadata) in enumerate(zip(item_ids, outputs)):
+        for facet in CORPUS.facets:
+            assert sorted(metadata['properties'][facet]) == expected_values(item, facet)
+
+        assert metadata['bbox'] == aggregator(es).run(item_id, description)['bbox']
+        assert metadata == batch[item_id]
+
+    assert materialised.run('unknown', description) == {'properties': {}}
+
+
+def test_materialised_summary_facets(es):
+    """
+    Stored summaries should only keep the values of the configured facets
+    """
+    es.register_script(es_aggregator.SUMMARY_SCRIPT, merge_summary)
+
+    materialised = aggregator(es, summary_index='summaries', summary_facets=['platform'])
+    assets = list(CORPUS.assets())
+
+    for start in range(0, len(assets), 5):
+        materialised.update_summaries(assets[start:start + 5])
+
+    source = es.get('summaries', CORPUS.item_id(0))['_source']
+
+    assert set(source['values']) == {'platform'}
+    assert sorted(source['values']['platform'].values()) == expected_values(0, 'platform')
+    assert sorted(materialised.get_materialised_summary(CORPUS.item_id(0)).values['platform']) == \
+        expected_values(0, 'platform')
+
+
+def test_materialised_summaries_metrics_and_replay(es, tmp_path):
+    """
+    Reads of the summary index should be counted and replayed from a recording
+    """
+    from item_generator.core.metrics import Metrics
+
+    es.register_script(es_aggregator.SUMMARY_SCRIPT, merge_summary)
+    path = str(tmp_path / 'traffic.ndjson')
+
+    recorder = ElasticsearchAggregator(
+        index='ceda-index',
+        connection_kwargs={'hosts': ['localhost:9200']},
+        summary_index='summaries',
+        record=path,
+    )
+    recorder.es.client = es
+    recorder.update_summaries(CORPUS.assets())
+    recorder.metrics = Metrics()
+
+    description = CORPUS.description()
+    item_ids = CORPUS.item_ids()
+
+    outputs = [recorder.run(item_id, description) for item_id in item_ids]
+    batch = recorder.run_batch(item_ids, [description] * len(item_ids))
+    recorder.close()
+
+    assert recorder.metrics.counter('item_generator_es_searches_total') == len(item_ids) + 1
+    assert recorder.metrics.histogram('item_generator_es_searches_per_item')['sum'] == len(item_ids)
+
+    replayer = ElasticsearchAggregator(index='ceda-index', summary_index='summaries', replay=path)
+
+    assert [replayer.run(item_id, description) for item_id in item_ids] == outputs
+    assert replayer.run_batch(item_ids, [description] * len(item_ids)) == batch
+
+
+def test_async_materialised_summaries(monkeypatch):
+    async_module = pytest.importorskip(
+        'item_generator.plugins.processors.async_elasticsearch_aggregator',
+        exc_type=ImportError
+    )
+
+    client = FakeAsyncElasticsearch()
+    client.register_script(es_aggregator.SUMMARY_SCRIPT, merge_summary)
+    monkeypatch.setattr(async_module.AsyncElasticsearchAggregator, 'get_client', lambda self, kwargs: client)
+
+    processor = async_module.AsyncElasticsearchAggregator(
+        index='ceda-index',
+        connection_kwargs={'hosts': ['localhost:9200']},
+        summary_index='summaries',
+    )
+
+    processor.update_summaries(CORPUS.assets())
+
+    metadata = processor.run(CORPUS.item_id(0), CORPUS.description())
+    batch = processor.run_batch([CORPUS.item_id(0)], [CORPUS.description()])
+
+    assert sorted(metadata['properties']['platform']) == expected_values(0, 'platform')
+    assert batch[CORPUS.item_id(0)] == metadata
+    processor.close()
+
+
+def test_json_aggregator_matches_shape(es, tmp_path):
+    """
+    The json_aggregator should give the same properties and bbox as the
+    elasticsearch_aggregator so the two can be swapped
+    """
+    json_aggregator = pytest.importorskip(
+        'item_generator.plugins.processors.json_aggregator',
+        exc_type=ImportError
+    )
+
+    path = tmp_path / 'assets.json'
+    CORPUS.write_json(str(path))
+
+    processor = json_aggregator.JSONAggregator(filepath=str(path))
+    description = CORPUS.description()
+
+    for item_id in CORPUS.item_ids():
+        expected = aggregator(es).run(item_id, description)
+        metadata = processor.run(item_id, description)
+
+        assert set(metadata['properties']) == set(expected['properties'])
+        assert metadata['bbox'] == expected['bbox']
+
+
+def test_filter_path(es):
+    query = {
+        'size': 0,
+        'track_total_hits': False,
+        'aggs': {'platforms': {'terms': {'field': 'properties.platform.keyword'}}},
+    }
+
+    result = es.search('ceda-index', query, filter_path='aggregations.*.buckets.key')
+
+    buckets = result['aggregations']['platforms']['buckets']
+
+    assert list(result) == ['aggregations']
+    assert sorted(bucket['key'] for bucket in buckets) == [f'platform-{i}' for i in range(5)]
+    assert all(list(bucket) == ['key'] for bucket in buckets)
+
+
+@pytest.mark.parametrize('planner', [
+    {},
+    {'terms_max': 0, 'composite_max': 2},
+    {'terms_max': 0, 'composite_max': 0, 'partition_size': 2},
+])
+@pytest.mark.parametrize('single_request', [True, False])
+def test_query_planner(es, planner, single_request):
+    processor = aggregator(es, single_request=single_request, query_planner=planner or True)
+    default = aggregator(es, single_request=single_request)
+    description = CORPUS.description()
+
+    for item_id in CORPUS.item_ids():
+        metadata = processor.run(item_id, description)
+        expected = default.run(item_id, description)
+
+        assert metadata['bbox'] == expected['bbox']
+        for facet in CORPUS.facets:
+            assert sorted(metadata['properties'][facet]) == sorted(expected['properties'][facet])
+
+    # Estimated once for the collection
+    assert len(processor.planner.estimates) == len(CORPUS.facets)
+
+
+def test_query_planner_underestimate(es):
+    """
+    Terms aggregations sized from a low estimate are retried with room for
+    more values
+    """
+    processor = aggregator(es, query_planner=True)
+    strategy = FacetStrategy(TERMS, 1)
+
+    searches = es.searches
+    values = processor.get_facet_values('platform', CORPUS.item_id(0), strategy)
+
+    assert sorted(values) == expected_values(0, 'platform')
+    assert es.searches - searches > 1
+
+
+@pytest.mark.parametrize('single_request', [True, False])
+def test_query_planner_observes_values(single_request):
+    """
+    Values found beyond a low estimate are written back, so the next item
+    in the collection is not retried
+    """
+    corpus = Corpus(items=2, files_per_item=60, cardinality=40)
+    es = FakeElasticsearch({'ceda-index': corpus.assets()})
+    processor = aggregator(es, single_request=single_request, query_planner=True)
+    description = corpus.description()
+
+    collection = processor.planner.collection_key(description)
+    processor.planner.set_estimates(collection, {facet: 1 for facet in corpus.facets})
+
+    searches = []
+    for item_id in corpus.item_ids():
+        start = es.searches
+        processor.run(item_id, description)
+        searches.append(es.searches - start)
+
+    estimates = processor.planner.get_estimates(collection, corpus.facets)
+
+    assert estimates['platform'] == 40
+    assert searches[1] < searches[0]
+
+
+def test_async_query_planner(monkeypatch):
+    async_module = pytest.importorskip(
+        'item_generator.plugins.processors.async_elasticsearch_aggregator',
+        exc_type=ImportError
+    )
+
+    client = FakeAsyncElasticsearch({'ceda-index': CORPUS.assets()})
+    monkeypatch.setattr(async_module.AsyncElasticsearchAggregator, 'get_client', lambda self, kwargs: client)
+
+    for single_request in (True, False):
+        processor = async_module.AsyncElasticsearchAggregator(
+            index='ceda-index',
+            connection_kwargs={'hosts': ['localhost:9200']},
+            single_request=single_request,
+            query_planner={'terms_max': 2},
+        )
+
+        metadata = asyncio.run(processor.arun(CORPUS.item_id(0), CORPUS.description()))
+
+        for facet in CORPUS.facets:
+            assert sorted(metadata['properties'][facet]) == expected_values(0, facet)
+
+
+@pytest.mark.parametrize('single_request', [True, False])
+def test_parallel_partitions(es, single_request):
+    planner = {'terms_max': 0, 'composite_max': 0, 'partition_size': 1}
+    processor = aggregator(es, single_request=single_request, query_planner=planner, parallel_partitions=4)
+    description = CORPUS.description()
+
+    for item, item_id in enumerate(CORPUS.item_ids()):
+        metadata = processor.run(item_id, description)
+
+        for facet in CORPUS.facets:
+            assert sorted(metadata['properties'][facet]) == expected_values(item, facet)
+
+    processor.close()
+
+
+def test_async_parallel_partitions(monkeypatch):
+    async_module = pytest.importorskip(
+        'item_generator.plugins.processors.async_elasticsearch_aggregator',
+        exc_type=ImportError
+    )
+
+    client = FakeAsyncElasticsearch({'ceda-index': CORPUS.assets()})
+    monkeypatch.setattr(async_module.AsyncElasticsearchAggregator, 'get_client', lambda self, kwargs: client)
+
+    processor = async_module.AsyncElasticsearchAggregator(
+        index='ceda-index',
+        connection_kwargs={'hosts': ['localhost:9200']},
+        single_request=True,
+        query_planner={'terms_max': 0, 'composite_max': 0, 'partition_size': 1},
+        parallel_partitions=4,
+    )
+
+    metadata = asyncio.run(processor.arun(CORPUS.item_id(1), CORPUS.description()))
+
+    for facet in CORPUS.facets:
+        assert sorted(metadata['properties'][facet]) == expected_values(1, facet)
@@ -0,0 +1,253 @@
+# encoding: utf-8
+"""
+
+"""
+__author__ = 'Richard Smith'
+__date__ = '18 Oct 2026'
+__copyright__ = 'Copyright 2018 United Kingdom Research and Innovation'
+__license__ = 'BSD - see LICENSE file in top-level package directory'
+__contact__ = 'richard.d.smith@stfc.ac.uk'
+
+import json
+import os
+import sqlite3
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+
+import pytest
+
+from asset_scanner.core.item_describer import ItemDescription
+
+json_aggregator = pytest.importorskip(
+    'item_generator.plugins.processors.json_aggregator',
+    exc_type=ImportError
+)
+JSONAggregator = json_aggregator.JSONAggregator
+
+ITEM_ID = 'c9ba1eb86ad1599bc715791e9f5af9de'
+OTHER_ITEM_ID = '5d7e2c1b0a9f8e7d6c5b4a3928170615'
+
+
+def normalise(metadata):
+    properties = {
+        key: sorted(value) if isinstance(value, list) else value
+        for key, value in metadata['properties'].items()
+    }
+    return dict(metadata, properties=properties)
+
+
+@pytest.fixture
+def data_path():
+    mod_path = os.path.realpath(__file__)
+    test_path = os.path.dirname(mod_path)
+    return os.path.join(test_path, 'data')
+
+
+@pytest.fixture
+def asset_file(data_path):
+    return os.path.join(data_path, 'assets', 'faam_assets.json')
+
+
+@pytest.fixture
+def description():
+    return ItemDescription(
+        paths=['/badc/faam/data'],
+        facets={
+            'aggregation_facets': ['platform', 'flight_number'],
+            'search_facets': ['variables']
+        }
+    )
+
+
+@pytest.fixture
+def aggregator(asset_file):
+    return JSONAggregator(filepath=asset_file)
+
+
+def test_run(aggregator, description):
+    """
+    Hidden assets should not contribute to the summaries
+    """
+    properties = aggregator.run(ITEM_ID, description)['properties']
+
+    assert properties['platform'] == ['faam']
+    assert properties['flight_number'] == ['b069']
+    assert sorted(properties['variables']) == ['altitude', 'latitude', 'longitude']
+
+
+def test_extent(aggregator, description):
+    """
+    The extent should be summarised in the same form as the
+    elasticsearch_aggregator. Start and end datetimes are preferred over
+    the datetime of hidden assets.
+    """
+    metadata = aggregator.run(ITEM_ID, description)
+
+    assert metadata['properties']['start_datetime'] == '2005-01-05T08:30:00'
+    assert metadata['properties']['end_datetime'] == '2005-01-05T12:00:00'
+    assert metadata['bbox'] == [-5.0, 50.1, -1.2, 53.0]
+    assert metadata['properties']['min_lon'] == -5.0
+    assert metadata['properties']['max_lat'] == 53.0
+
+    # Items with only a datetime have no bbox
+    assert 'bbox' not in aggregator.run(OTHER_ITEM_ID, description)
+
+
+def test_run_batch(aggregator, description):
+    """
+    Batch output should match the output of individual runs
+    """
+    output = aggregator.run_batch([ITEM_ID, OTHER_ITEM_ID], [description, description])
+
+    assert set(output) == {ITEM_ID, OTHER_ITEM_ID}
+    assert output[OTHER_ITEM_ID]['properties'] == {
+        'platform': ['faam'],
+        'flight_number': ['b070'],
+        'start_datetime': '2005-01-06T00:00:00',
+        'end_datetime': '2005-01-06T00:00:00',
+    }
+    assert sorted(output[ITEM_ID]['properties']['variables']) == ['altitude', 'latitude', 'longitude']
+
+
+def test_index_loaded_once(asset_file, description, tmp_path, monkeypatch):
+    """
+    The file should be parsed once and re-read only when it changes
+    """
+    filepath = tmp_path / 'assets.json'
+    with open(asset_file) as reader:
+        assets = json.load(reader)
+    filepath.write_text(json.dumps(assets))
+
+    aggregator = JSONAggregator(filepath=str(filepath))
+
+    loads = []
+    original_load = json_aggregator.json.load
+
+    def counting_load(file):
+        loads.append(file)
+        return original_load(file)
+
+    monkeypatch.setattr(json_aggregator.json, 'load', counting_load)
+
+    aggregator.run(ITEM_ID, description)
+    aggregator.run(OTHER_ITEM_ID, description)
+    assert len(loads) == 1
+
+    assets[-1]['body']['properties']['flight_number'] = 'b071'
+    filepath.write_text(json.dumps(assets, indent=2))
+
+    properties = aggregator.run(OTHER_ITEM_ID, description)['properties']
+    assert len(loads) == 2
+    assert properties['flight_number'] == ['b071']
+
+
+@pytest.mark.parametrize('ndjson', [False, True])
+def test_streaming(asset_file, description, tmp_path, ndjson):
+    """
+    Streaming mode should give the same results as the index for JSON
+    arrays and newline delimited JSON, however the assets are split
+    between reads.
+    """
+    with open(asset_file) as reader:
+        assets = json.load(reader)
+
+    filepath = tmp_path / 'assets.json'
+    if ndjson:
+        filepath.write_text('\n'.join(json.dumps(asset) for asset in assets) + '\n')
+    else:
+        filepath.write_text(json.dumps(assets, indent=2))
+
+    indexed = JSONAggregator(filepath=asset_file)
+    streaming = JSONAggregator(filepath=str(filepath), streaming=True, read_size=7)
+
+    for item_id in (ITEM_ID, OTHER_ITEM_ID):
+        expected = indexed.run(item_id, description)
+        metadata = streaming.run(item_id, description)
+
+        assert normalise(metadata) == normalise(expected)
+
+    # Only the requested facets are kept
+    assert set(streaming.scan({ITEM_ID}, {'platform'})[ITEM_ID].values) == {'platform'}
+
+
+def test_streaming_memory_is_bounded(tmp_path, description):
+    """
+    Peak memory of a streaming run should not grow with the size of the file
+    """
+    def peak_memory(n_assets):
+        filepath = tmp_path / f'assets-{n_assets}.json'
+        filepath.write_text(json.dumps([
+            {'body': {'item_id': f'item-{i % 50}', 'categories': ['data'], 'properties': {'platform': f'p{i}'}}}
+            for i in range(n_assets)
+        ]))
+
+        aggregator = JSONAggregator(filepath=str(filepath), streaming=True, read_size=4096)
+
+        tracemalloc.start()
+        aggregator.run('missing-item', description)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        return peak
+
+    assert peak_memory(20000) < 2 * peak_memory(2000)
+
+
+def test_offset_index(asset_file, description, tmp_path):
+    """
+    Appended records should be picked up by later runs, partially written
+    records should wait for their newline and a replaced file should
+    rebuild the sidecar.
+    """
+    with open(asset_file) as reader:
+        assets = json.load(reader)
+
+    filepath = tmp_path / 'assets.ndjson'
+    filepath.write_text(''.join(json.dumps(asset) + '\n' for asset in assets[:2]))
+
+    aggregator = JSONAggregator(filepath=str(filepath), offset_index=True)
+    assert aggregator.offset_index == f'{filepath}.idx'
+
+    assert aggregator.run(OTHER_ITEM_ID, description)['properties'] == {}
+    assert sorted(aggregator.run(ITEM_ID, description)['properties']['variables']) == [
+        'altitude', 'latitude', 'longitude'
+    ]
+
+    # Append the rest, with the last record not yet terminated
+    with open(filepath, 'a') as writer:
+        writer.write(json.dumps(assets[2]) + '\n')
+        writer.write(json.dumps(assets[3]))
+
+    assert aggregator.run(OTHER_ITEM_ID, description)['properties'] == {}
+
+    with open(filepath, 'a') as writer:
+        writer.write('\n')
+
+    assert aggregator.run(OTHER_ITEM_ID, description)['properties']['flight_number'] == ['b070']
+
+    # Replace the file
+    filepath.unlink()
+    filepath.write_text(json.dumps(assets[3]) + '\n')
+
+    assert aggregator.run(ITEM_ID, description)['properties'] == {}
+    assert aggregator.run(OTHER_ITEM_ID, description)['properties']['flight_number'] == ['b070']
+
+
+def update_in_process(filepath):
+    JSONAggregator(filepath=filepath, offset_index=True).get_index(set())
+
+
+def test_offset_index_concurrent_updates(asset_file, tmp_path):
+    """
+    Processes sharing a sidecar should each index a record only once
+    """
+    with open(asset_file) as reader:
+        assets = json.load(reader)
+
+    filepath = tmp_path / 'assets.ndjson'
+    filepath.write_text(''.join(json.dumps(asset) + '\n' for asset in assets * 50))
+
+    with ProcessPoolExecutor(max_workers=4) as pool:
+        list(pool.map(update_in_process, [str(filepath)] * 8))
+
+    with sqlite3.connect(f'{filepath}.idx') as conn:
+        assert conn.execute('SELECT COUNT(*) FROM offsets').fetchone()[0] == len(assets) * 50
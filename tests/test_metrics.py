@@ -0,0 +1,104 @@
+# encoding: utf-8
+"""
+
+"""
+__author__ = 'Richard Smith'
+__date__ = '18 Oct 2026'
+__copyright__ = 'Copyright 2018 United Kingdom Research and Innovation'
+__license__ = 'BSD - see LICENSE file in top-level package directory'
+__contact__ = 'richard.d.smith@stfc.ac.uk'
+
+import os
+from pathlib import Path
+from urllib.request import urlopen
+
+from asset_scanner.core.item_describer import ItemDescriptions
+
+from item_generator import FacetExtractor
+from item_generator.core.metrics import NULL_METRICS, Metrics
+
+
+def test_counters_and_histograms():
+    metrics = Metrics()
+
+    metrics.inc('requests_total', cache='summary', result='hit')
+    metrics.inc('requests_total', 2, cache='summary', result='hit')
+    metrics.observe('latency_seconds', 0.003, stage='summaries')
+    metrics.observe('latency_seconds', 2.0, stage='summaries')
+
+    assert metrics.counter('requests_total', result='hit', cache='summary') == 3
+
+    histogram = metrics.histogram('latency_seconds', stage='summaries')
+    assert histogram['count'] == 2
+    assert histogram['buckets'][0.005] == 1
+    assert histogram['buckets'][float('inf')] == 2
+
+    text = metrics.render()
+    assert '# TYPE requests_total counter' in text
+    assert 'requests_total{cache="summary",result="hit"} 3' in text
+    assert 'latency_seconds_bucket{stage="summaries",le="+Inf"} 2' in text
+    assert 'latency_seconds_count{stage="summaries"} 2' in text
+
+    assert 'requests_total{cache="summary",result="hit"}=3' in metrics.summary_line()
+
+
+def test_disabled():
+    assert Metrics.from_conf(None) is NULL_METRICS
+    assert Metrics.from_conf({'enabled': False}) is NULL_METRICS
+
+    with NULL_METRICS.timer('latency_seconds'):
+        NULL_METRICS.inc('requests_total')
+
+    assert NULL_METRICS.counter('requests_total') == 0
+    assert NULL_METRICS.histogram('latency_seconds') is None
+
+
+def test_prometheus_endpoint():
+    metrics = Metrics()
+    metrics.inc('item_generator_files_total', 5)
+
+    server = metrics.serve(0, '127.0.0.1')
+
+    try:
+        with urlopen(f'http://127.0.0.1:{server.server_address[1]}/metrics') as response:
+            assert 'item_generator_files_total 5' in response.read().decode()
+    finally:
+        metrics.close()
+
+
+def test_extractor_stages():
+    data_path = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'data')
+
+    extractor = FacetExtractor({
+        'item_descriptions': {'root_directory': os.path.join(data_path, 'descriptions')},
+        'outputs': [{'name': 'standard_out'}],
+        'summary_cache': {'maxsize': 10, 'ttl': 300},
+        'metrics': {'enabled': True},
+    })
+    extractor.item_descriptions = ItemDescriptions(
+        filelist=[Path(os.path.join(data_path, 'collection_descriptions/faam_generated_collection_id.yml'))]
+    )
+
+    class Processor:
+        def run(self, item_id, description):
+            return {'properties': {'platform': ['faam']}}
+
+    extractor._load_processor = lambda: Processor()
+    extractor.output = lambda filepath, source_media, data, namespace=None, **kwargs: None
+
+    for r in range(3):
+        extractor.process_file(
+            f'/badc/faam/data/2005/b069-jan-05/core_processed/core_faam_20050105_r{r}_b069.nc',
+            item_id='item1'
+        )
+
+    metrics = extractor.metrics
+
+    assert metrics.counter('item_generator_files_total') == 3
+
+    for stage in ['description', 'summaries', 'build_item', 'output_item', 'output_header']:
+        assert metrics.histogram('item_generator_stage_seconds', stage=stage)['count'] == 3
+
+    assert metrics.histogram('item_generator_processor_seconds', processor='Processor')['count'] == 1
+    assert metrics.counter('item_generator_cache_requests_total', cache='summary', result='hit') == 2
+    assert metrics.counter('item_generator_cache_requests_total', cache='description', result='hit') == 2
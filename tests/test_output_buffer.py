@@ -0,0 +1,164 @@
+# encoding: utf-8
+"""
+
+"""
+__author__ = 'Richard Smith'
+__date__ = '18 Oct 2026'
+__copyright__ = 'Copyright 2018 United Kingdom Research and Innovation'
+__license__ = 'BSD - see LICENSE file in top-level package directory'
+__contact__ = 'richard.d.smith@stfc.ac.uk'
+
+import time
+
+import pytest
+
+from item_generator.core import output_buffer
+from item_generator.core.output_buffer import OutputBuffer, OutputFlushError, write_batch
+from item_generator.testing.fake_elasticsearch import FakeElasticsearch
+
+
+class Backend:
+    namespace = None
+
+    def __init__(self):
+        self.exported = []
+
+    def export(self, data, **kwargs):
+        self.exported.append((data, kwargs))
+
+
+class FailingBackend(Backend):
+    failing = True
+
+    def export(self, data, **kwargs):
+        if self.failing:
+            raise ConnectionError('backend unavailable')
+        super().export(data, **kwargs)
+
+
+class BatchBackend(Backend):
+
+    def __init__(self):
+        super().__init__()
+        self.batches = []
+
+    def export_batch(self, messages):
+        self.batches.append(messages)
+
+
+def test_from_conf():
+    assert OutputBuffer.from_conf(None) is None
+    assert OutputBuffer.from_conf({'max_documents': 10}).max_documents == 10
+
+
+def test_count_threshold():
+    buffer = OutputBuffer(max_documents=3, max_bytes=None, max_age=60)
+    backend = Backend()
+
+    assert not buffer.add(backend, {'id': 1})
+    assert not buffer.add(backend, {'id': 2})
+    assert buffer.add(backend, {'id': 3}, deduplicate=True)
+
+    assert buffer.flush() == 3
+    assert backend.exported == [({'id': 1}, {}), ({'id': 2}, {}), ({'id': 3}, {'deduplicate': True})]
+    assert buffer.flush() == 0
+
+
+def test_size_threshold():
+    buffer = OutputBuffer(max_documents=100, max_bytes=50, max_age=60)
+    backend = Backend()
+
+    assert not buffer.add(backend, {'id': 'small'})
+    assert buffer.add(backend, {'id': 'x' * 50})
+
+
+def test_age_threshold():
+    buffer = OutputBuffer(max_documents=100, max_age=0.01)
+    backend = Backend()
+
+    assert not buffer.add(backend, {'id': 1})
+    time.sleep(0.02)
+    assert buffer.add(backend, {'id': 2})
+
+
+def test_due():
+    buffer = OutputBuffer(max_documents=100, max_age=0.01)
+    assert not buffer.due()
+
+    buffer.add(Backend(), {'id': 1})
+    assert not buffer.due()
+
+    time.sleep(0.02)
+    assert buffer.due()
+
+
+def test_backends_written_in_order():
+    buffer = OutputBuffer()
+    items = BatchBackend()
+    headers = Backend()
+
+    buffer.add(items, {'id': 'item1'})
+    buffer.add(headers, {'collection_id': 'c'}, deduplicate=False)
+    buffer.add(items, {'id': 'item2'})
+
+    assert [backend for backend, _, _ in buffer.drain()] == [items, headers]
+
+
+def test_failed_flush_keeps_messages():
+    buffer = OutputBuffer(max_documents=2, max_bytes=None, max_age=60)
+    items = Backend()
+    headers = FailingBackend()
+
+    buffer.add(items, {'id': 'item1'}, filepath='/a.nc')
+    buffer.add(headers, {'collection_id': 'c1'}, filepath='/a.nc')
+    buffer.add(headers, {'collection_id': 'c2'}, filepath='/b.nc')
+
+    with pytest.raises(OutputFlushError) as error:
+        buffer.flush()
+
+    assert error.value.filepaths == ['/a.nc', '/b.nc']
+    assert error.value.written == 1
+    assert items.exported == [({'id': 'item1'}, {})]
+
+    # A failing backend is not retried for each new message
+    assert not buffer.add(headers, {'collection_id': 'c3'}, filepath='/c.nc')
+
+    headers.failing = False
+    assert buffer.flush() == 3
+    assert [data['collection_id'] for data, _ in headers.exported] == ['c1', 'c2', 'c3']
+    assert buffer.documents == 0
+
+
+def test_export_batch():
+    backend = BatchBackend()
+
+    write_batch(backend, [({'id': 1}, {}), ({'id': 2}, {})])
+
+    assert backend.batches == [[({'id': 1}, {}), ({'id': 2}, {})]]
+    assert backend.exported == []
+
+
+def test_elasticsearch_bulk():
+    if output_buffer.ElasticsearchOutputBackend is None:
+        pytest.skip('elasticsearch output backend not installed')
+
+    es = FakeElasticsearch()
+
+    # Skip the connection made in __init__
+    backend = output_buffer.ElasticsearchOutputBackend.__new__(output_buffer.ElasticsearchOutputBackend)
+    backend.es = es
+    backend.index_name = 'items'
+    backend.namespace = 'items'
+
+    messages = [
+        ({'id': 'item1', 'body': {'bbox': [-10.0, 50.0, 2.0, 60.0], 'properties': {'platform': 'faam'}}}, {}),
+        ({'id': 'item2', 'body': {'properties': {'platform': 'arsf'}}}, {}),
+        ({'id': 'item1', 'body': {'properties': {'platform': 'faam', 'flight_number': 'b069'}}}, {}),
+    ]
+
+    write_batch(backend, messages)
+
+    assert es.bulk_requests == 1
+    assert es.get('items', 'item1')['_source']['properties'] == {'platform': 'faam', 'flight_number': 'b069'}
+    assert es.get('items', 'item1')['_source']['spatial']['bbox']['type'] == 'envelope'
+    assert es.get('items', 'item2')['_source']['properties'] == {'platform': 'arsf'}
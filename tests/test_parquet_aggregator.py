@@ -0,0 +1,109 @@
+# encoding: utf-8
+"""
+
+"""
+__author__ = 'Richard Smith'
+__date__ = '18 Oct 2026'
+__copyright__ = 'Copyright 2018 United Kingdom Research and Innovation'
+__license__ = 'BSD - see LICENSE file in top-level package directory'
+__contact__ = 'richard.d.smith@stfc.ac.uk'
+
+import pytest
+
+from asset_scanner.core.item_describer import ItemDescription
+
+from item_generator.core.summaries import summarise
+from item_generator.testing.corpus import Corpus
+
+pa = pytest.importorskip('pyarrow')
+pq = pytest.importorskip('pyarrow.parquet')
+
+parquet_aggregator = pytest.importorskip(
+    'item_generator.plugins.processors.parquet_aggregator',
+    exc_type=ImportError
+)
+ParquetAggregator = parquet_aggregator.ParquetAggregator
+
+CORPUS = Corpus(items=4, files_per_item=6, cardinality=5, hidden_every=4)
+
+
+def facet_values(metadata):
+    return {facet: sorted(metadata['properties'].get(facet, [])) for facet in CORPUS.facets}
+
+
+@pytest.mark.parametrize('filename', ['assets.parquet', 'assets.arrow'])
+def test_matches_summaries(tmp_path, filename):
+    path = str(tmp_path / filename)
+    ParquetAggregator.write_table(CORPUS.assets(), path, format='arrow' if filename.endswith('.arrow') else 'parquet')
+
+    processor = ParquetAggregator(filepath=path)
+    description = CORPUS.description()
+    expected = summarise(CORPUS.assets())
+
+    item_ids = CORPUS.item_ids()
+    batch = processor.run_batch(item_ids, [description] * len(item_ids))
+
+    for item_id in item_ids:
+        metadata = processor.run(item_id, description)
+        reference = expected[item_id].metadata(CORPUS.facets)
+
+        assert facet_values(metadata) == facet_values(reference)
+        assert metadata['bbox'] == reference['bbox']
+
+        # Datetimes are written as UTC timestamps
+        assert metadata['properties']['start_datetime'] == reference['properties']['start_datetime'] + '+00:00'
+        assert metadata['properties']['end_datetime'] == reference['properties']['end_datetime'] + '+00:00'
+
+        assert batch[item_id]['bbox'] == metadata['bbox']
+        assert facet_values(batch[item_id]) == facet_values(metadata)
+
+    assert processor.run('unknown', description) == {'properties': {}}
+
+
+def test_string_columns_and_hidden(tmp_path):
+    """
+    Files written elsewhere may keep ISO strings and the asset categories
+    """
+    table = pa.table({
+        'item_id': ['a', 'a', 'a', 'b'],
+        'categories': [['data'], ['data', 'hidden'], None, ['data']],
+        'platform': [['faam', 'arsf'], ['hidden-value'], ['faam'], ['other']],
+        'start_datetime': ['2005-01-01T10:00:00', '2001-01-01T00:00:00', '2005-01-01T08:00:00+01:00', None],
+        'min_lon': [-5.0, -90.0, -4.0, 1.0],
+    })
+    path = str(tmp_path / 'assets.parquet')
+    pq.write_table(table, path)
+
+    processor = ParquetAggregator(filepath=path)
+    description = ItemDescription(paths=['/badc/faam/data'], facets={'aggregation_facets': ['platform']})
+    metadata = processor.run('a', description)
+
+    assert sorted(metadata['properties']['platform']) == ['arsf', 'faam']
+    # Mixed offsets are compared as instants
+    assert metadata['properties']['start_datetime'] == '2005-01-01T08:00:00+01:00'
+    assert 'bbox' not in metadata
+
+    assert processor.get_facet_values('platform', 'b') == ['other']
+
+
+def test_visible_filters_hidden_rows():
+    table = pa.table({
+        'row': [0, 1, 2, 3, 4],
+        'categories': pa.array([['a'], ['hidden', 'b'], None, [], ['b', None, 'hidden']]),
+    })
+
+    assert ParquetAggregator.visible(table)['row'].to_pylist() == [0, 2, 3]
+    assert ParquetAggregator.visible(table.slice(1))['row'].to_pylist() == [2, 3]
+
+
+def test_row_group_pruning(tmp_path):
+    corpus = Corpus(items=4, files_per_item=6)
+    path = str(tmp_path / 'assets.parquet')
+    ParquetAggregator.write_table(corpus.assets(), path, row_group_size=corpus.files_per_item)
+
+    processor = ParquetAggregator(filepath=path)
+    processor.load()
+
+    # Sorted by item_id, so each item is in one row group
+    assert processor.row_groups([corpus.item_id(2)]) == [2]
+    assert processor.run(corpus.item_id(2), corpus.description())['properties']
@@ -0,0 +1,78 @@
+# encoding: utf-8
+"""
+
+"""
+__author__ = 'Richard Smith'
+__date__ = '18 Oct 2026'
+__copyright__ = 'Copyright 2018 United Kingdom Research and Innovation'
+__license__ = 'BSD - see LICENSE file in top-level package directory'
+__contact__ = 'richard.d.smith@stfc.ac.uk'
+
+import json
+
+import pytest
+
+from asset_scanner.core.item_describer import ItemDescription
+
+from item_generator.core.plan import ExecutionPlan, PlanCache, QueryTemplate
+
+
+def description():
+    return ItemDescription(
+        paths=['/badc/faam/data'],
+        facets={
+            'aggregation_facets': ['platform', 'flight_number'],
+            'search_facets': ['platform'],
+            'templates': {'title': '$platform flight no. $flight_number'},
+        }
+    )
+
+
+def test_execution_plan():
+    plan = ExecutionPlan(description())
+
+    assert plan.facets == ['flight_number', 'platform']
+    assert plan.render_templates({'platform': 'faam', 'flight_number': 'b070'})['title'] == 'faam flight no. b070'
+    assert 'description' not in plan.render_templates({})
+
+
+def test_plan_cache():
+    compiled = []
+
+    def compile(desc):
+        compiled.append(desc)
+        return ExecutionPlan(desc)
+
+    cache = PlanCache(compile)
+    first = description()
+    second = description()
+
+    assert cache.get(first) is cache.get(first)
+    assert cache.get(second) is not cache.get(first)
+    assert compiled == [first, second]
+
+
+def test_query_template():
+    template = QueryTemplate({
+        'query': {'term': {'item_id.keyword': {'value': QueryTemplate.PLACEHOLDER}}},
+        'size': 0,
+    })
+
+    body = template.render('item "1"')
+
+    assert json.loads(body) == {'query': {'term': {'item_id.keyword': {'value': 'item "1"'}}}, 'size': 0}
+
+
+def test_query_template_repeated_placeholder():
+    template = QueryTemplate({
+        'query': {'term': {'item_id.keyword': {'value': QueryTemplate.PLACEHOLDER}}},
+        'aggs': {'item': {'filter': {'term': {'item_id.keyword': QueryTemplate.PLACEHOLDER}}}},
+    })
+
+    body = json.loads(template.render('item1'))
+
+    assert body['query']['term']['item_id.keyword']['value'] == 'item1'
+    assert body['aggs']['item']['filter']['term']['item_id.keyword'] == 'item1'
+
+    with pytest.raises(ValueError):
+        QueryTemplate({'size': 0})
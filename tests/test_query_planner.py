@@ -0,0 +1,105 @@
+# encoding: utf-8
+"""
+
+"""
+__author__ = 'Richard Smith'
+__date__ = '18 Oct 2026'
+__copyright__ = 'Copyright 2018 United Kingdom Research and Innovation'
+__license__ = 'BSD - see LICENSE file in top-level package directory'
+__contact__ = 'richard.d.smith@stfc.ac.uk'
+
+from item_generator.core.query_planner import (
+    COMPOSITE,
+    PARTITIONS,
+    TERMS,
+    FacetCursor,
+    FacetStrategy,
+    QueryPlanner,
+)
+
+
+def test_choose():
+    planner = QueryPlanner(terms_max=100, composite_max=1000, partition_size=200)
+
+    assert planner.choose(3).kind == TERMS
+    assert planner.choose(100).size > 100
+    assert planner.choose(500) == FacetStrategy(COMPOSITE, 601)
+    assert planner.choose(999).size == 1000
+
+    strategy = planner.choose(5000)
+    assert strategy.kind == PARTITIONS
+    assert strategy.partitions == 25
+    assert strategy.size > 200
+
+
+def test_from_conf():
+    assert QueryPlanner.from_conf(None) is None
+    assert QueryPlanner.from_conf(True).terms_max == 1000
+    assert QueryPlanner.from_conf({'terms_max': 5}).terms_max == 5
+
+
+def test_estimates_cached():
+    planner = QueryPlanner(ttl=60)
+    planner.set_estimates('collection', {'platform': 3})
+
+    assert planner.get_estimates('collection', ['platform', 'variable']) == {'platform': 3}
+    assert planner.get_estimates('other', ['platform']) == {}
+
+
+def test_composite_cursor():
+    cursor = FacetCursor('platform', FacetStrategy(COMPOSITE, 2))
+
+    assert 'after' not in cursor.agg()['composite']
+
+    cursor.parse({'buckets': [{'key': {'platform': 'a'}}, {'key': {'platform': 'b'}}],
+                  'after_key': {'platform': 'b'}})
+    assert not cursor.done
+    assert cursor.agg()['composite']['after'] == {'platform': 'b'}
+
+    cursor.parse({'buckets': [{'key': {'platform': 'c'}}], 'after_key': {'platform': 'c'}})
+    assert cursor.done
+    assert cursor.values == ['a', 'b', 'c']
+
+
+def test_truncated_terms_retried():
+    cursor = FacetCursor('platform', FacetStrategy(TERMS, 1))
+
+    cursor.parse({'buckets': [{'key': 'a'}], 'sum_other_doc_count': 4})
+    assert not cursor.done
+    assert cursor.values == []
+    assert cursor.agg()['terms']['size'] == 2
+
+    cursor.parse({'buckets': [{'key': 'a'}, {'key': 'b'}], 'sum_other_doc_count': 0})
+    assert cursor.done
+    assert cursor.values == ['a', 'b']
+
+
+def test_partition_cursor():
+    cursor = FacetCursor('platform', FacetStrategy(PARTITIONS, 10, 3))
+
+    for partition in range(3):
+        assert cursor.agg()['terms']['include'] == {'partition': partition, 'num_partitions': 3}
+        cursor.parse({'buckets': [{'key': partition}], 'sum_other_doc_count': 0})
+
+    assert cursor.done
+    assert cursor.values == [0, 1, 2]
+
+
+def test_missing_aggregation_is_done():
+    cursor = FacetCursor('platform', FacetStrategy(TERMS, 10))
+    cursor.parse(None)
+
+    assert cursor.done
+
+
+def test_split_partitions():
+    cursor = FacetCursor('platform', FacetStrategy(PARTITIONS, 10, 3))
+    cursor.parse({'buckets': [{'key': 'a'}], 'sum_other_doc_count': 0})
+
+    parts = cursor.split()
+
+    assert [part.agg()['terms']['include']['partition'] for part in parts] == [1, 2]
+
+    parts[0].parse({'buckets': [{'key': 'b'}], 'sum_other_doc_count': 0})
+    assert parts[0].done
+    assert not parts[1].done
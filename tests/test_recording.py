@@ -0,0 +1,84 @@
+# encoding: utf-8
+"""
+
+"""
+__author__ = 'Richard Smith'
+__date__ = '18 Oct 2026'
+__copyright__ = 'Copyright 2018 United Kingdom Research and Innovation'
+__license__ = 'BSD - see LICENSE file in top-level package directory'
+__contact__ = 'richard.d.smith@stfc.ac.uk'
+
+import json
+
+import pytest
+
+from item_generator.core import recording
+from item_generator.core.recording import RecordingClient, ReplayClient, ReplayMissError
+from item_generator.testing.corpus import Corpus
+from item_generator.testing.fake_elasticsearch import FakeElasticsearch
+
+CORPUS = Corpus(items=3, files_per_item=4, cardinality=5)
+
+
+@pytest.fixture
+def client():
+    return FakeElasticsearch({'ceda-index': CORPUS.assets()})
+
+
+@pytest.mark.parametrize('filename', ['traffic.ndjson', 'traffic.ndjson.gz'])
+def test_record_and_replay(client, tmp_path, filename):
+    path = str(tmp_path / filename)
+    query = {'size': 0, 'aggs': {'platform': {'terms': {'field': 'properties.platform.keyword'}}}}
+
+    recorder = RecordingClient(client, path)
+    recorded = recorder.search(index='ceda-index', body=query)
+    recorder.close()
+
+    replay = ReplayClient(path)
+
+    # Serialized bodies match on content, not key order
+    serialized = json.dumps(dict(reversed(list(query.items()))))
+    assert replay.search(index='ceda-index', body=serialized) == recorded
+
+    with pytest.raises(ReplayMissError):
+        replay.search(index='other-index', body=query)
+
+
+def test_replay_order_and_latency(client, tmp_path, monkeypatch):
+    path = str(tmp_path / 'traffic.ndjson')
+
+    with open(path, 'w') as writer:
+        for n, latency in [(1, 0.5), (2, 0.25)]:
+            writer.write(json.dumps({'index': 'i', 'query': {}, 'response': {'n': n}, 'latency': latency}) + '\n')
+
+    sleeps = []
+    monkeypatch.setattr(recording.time, 'sleep', sleeps.append)
+
+    replay = ReplayClient(path, latency=True, speed=2)
+
+    assert [replay.search('i')['n'] for _ in range(3)] == [1, 2, 2]
+    assert sleeps == [0.25, 0.125, 0.125]
+
+
+def test_aggregator_replay(client, tmp_path):
+    es_aggregator = pytest.importorskip(
+        'item_generator.plugins.processors.elasticsearch_aggregator',
+        exc_type=ImportError
+    )
+
+    path = str(tmp_path / 'traffic.ndjson.gz')
+    description = CORPUS.description()
+
+    recorder = es_aggregator.ElasticsearchAggregator(
+        index='ceda-index',
+        connection_kwargs={'hosts': ['localhost:9200']},
+        record=path,
+    )
+    recorder.es.client = client
+
+    recorded = [recorder.run(item_id, description) for item_id in CORPUS.item_ids()]
+    recorder.close()
+
+    replayer = es_aggregator.ElasticsearchAggregator(index='ceda-index', replay=path)
+
+    assert [replayer.run(item_id, description) for item_id in CORPUS.item_ids()] == recorded
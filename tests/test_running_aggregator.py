@@ -0,0 +1,170 @@
+# encoding: utf-8
+"""
+
+"""
+__author__ = 'Richard Smith'
+__date__ = '18 Oct 2026'
+__copyright__ = 'Copyright 2018 United Kingdom Research and Innovation'
+__license__ = 'BSD - see LICENSE file in top-level package directory'
+__contact__ = 'richard.d.smith@stfc.ac.uk'
+
+import json
+from concurrent.futures import ProcessPoolExecutor
+
+import pytest
+
+from item_generator.core.summaries import summarise
+from item_generator.testing.corpus import Corpus
+
+running_aggregator = pytest.importorskip(
+    'item_generator.plugins.processors.running_aggregator',
+    exc_type=ImportError
+)
+RunningAggregator = running_aggregator.RunningAggregator
+
+
+@pytest.fixture
+def corpus():
+    return Corpus(items=5, files_per_item=8, cardinality=6, hidden_every=5)
+
+
+def append(path, assets):
+    with open(path, 'a') as writer:
+        for asset in assets:
+            writer.write(json.dumps({'id': asset.pop('id'), 'body': asset}) + '\n')
+
+
+def follow_in_process(path, filepath, chunk_size):
+    running_aggregator.CHUNK_SIZE = chunk_size
+    processor = RunningAggregator(path=path, filepath=filepath)
+    processor.refresh()
+    processor.close()
+
+
+def test_concurrent_followers(tmp_path):
+    """
+    Processes following the same file should each merge a chunk only once
+    """
+    corpus = Corpus(items=4, files_per_item=50, cardinality=6)
+    asset_file = str(tmp_path / 'assets.ndjson')
+    path = str(tmp_path / 'summaries.db')
+    corpus.write_json(asset_file, ndjson=True)
+
+    with ProcessPoolExecutor(max_workers=4) as pool:
+        list(pool.map(follow_in_process, [path] * 8, [asset_file] * 8, [7] * 8))
+
+    processor = RunningAggregator(path=path, filepath=asset_file)
+    expected = summarise(corpus.assets())
+
+    for item in range(4):
+        item_id = corpus.item_id(item)
+        assert processor.get_summary(item_id).assets == expected[item_id].assets
+
+
+def test_follow_file(tmp_path, corpus):
+    asset_file = tmp_path / 'assets.ndjson'
+    corpus.write_json(str(asset_file), ndjson=True)
+
+    processor = RunningAggregator(path=str(tmp_path / 'summaries.db'), filepath=str(asset_file))
+    item_id = corpus.item_id(2)
+
+    result = processor.run(item_id, corpus.description())
+    expected = summarise(corpus.assets())[item_id]
+
+    for facet in corpus.facets:
+        assert sorted(result['properties'][facet]) == sorted(expected.values[facet])
+
+    visible = [asset for asset in corpus.assets() if asset['item_id'] == item_id and 'hidden' not in asset['categories']]
+
+    assert result['properties']['start_datetime'] == min(a['properties']['start_datetime'] for a in visible)
+    assert result['properties']['end_datetime'] == max(a['properties']['end_datetime'] for a in visible)
+    assert result['bbox'] == [
+        min(a['properties']['min_lon'] for a in visible),
+        min(a['properties']['min_lat'] for a in visible),
+        max(a['properties']['max_lon'] for a in visible),
+        max(a['properties']['max_lat'] for a in visible),
+    ]
+
+    assert processor.run('unknown', corpus.description()) == {'properties': {}}
+
+
+def test_appended_assets(tmp_path, corpus):
+    asset_file = tmp_path / 'assets.ndjson'
+    asset_file.write_text('')
+
+    processor = RunningAggregator(path=str(tmp_path / 'summaries.db'), filepath=str(asset_file))
+    item_id = corpus.item_id(0)
+
+    append(asset_file, [corpus.asset(1)])
+    assert processor.get_summary(item_id).assets == 1
+
+    # Record still being written is left for the next update
+    with open(asset_file, 'a') as writer:
+        writer.write('{"id": "partial", "body": {"item_id"')
+
+    append(asset_file, [])
+    assert processor.get_summary(item_id).assets == 1
+
+    with open(asset_file, 'a') as writer:
+        writer.write(f': "{item_id}", "properties": {{"platform": "new"}}}}}}\n')
+
+    summary = processor.get_summary(item_id)
+    assert summary.assets == 2
+    assert 'new' in summary.values['platform']
+
+
+def test_persisted(tmp_path, corpus):
+    path = str(tmp_path / 'summaries.db')
+    item_id = corpus.item_id(3)
+
+    processor = RunningAggregator(path=path)
+    processor.add_assets(corpus.assets())
+    expected = processor.run_batch([item_id], [corpus.description()])[item_id]
+    processor.close()
+
+    reopened = RunningAggregator(path=path)
+
+    assert reopened.run(item_id, corpus.description()) == expected
+
+
+def test_rebuild(tmp_path, corpus):
+    asset_file = tmp_path / 'assets.ndjson'
+    corpus.write_json(str(asset_file), ndjson=True)
+
+    processor = RunningAggregator(path=str(tmp_path / 'summaries.db'), filepath=str(asset_file))
+    item_id = corpus.item_id(0)
+    before = processor.get_summary(item_id).assets
+
+    # Repeated updates from the same file do not add the assets again
+    assert processor.get_summary(item_id).assets == before
+
+    # Replaced file is scanned again from the start
+    smaller = Corpus(items=1, files_per_item=2)
+    replacement = tmp_path / 'replacement.ndjson'
+    smaller.write_json(str(replacement), ndjson=True)
+    replacement.replace(asset_file)
+
+    assert processor.get_summary(item_id).assets == 2
+    assert processor.get_summary(corpus.item_id(1)).assets == 0
+
+    processor.rebuild()
+    assert processor.get_summary(item_id).assets == 2
+
+    with pytest.raises(ValueError):
+        processor.rebuild([corpus.asset(0)])
+
+    pushed = RunningAggregator(path=str(tmp_path / 'pushed.db'))
+    pushed.add_assets(corpus.assets())
+    pushed.rebuild([corpus.asset(1)])
+
+    assert pushed.get_summary(item_id).assets == 1
+
+
+def test_configured_facets(tmp_path, corpus):
+    processor = RunningAggregator(path=str(tmp_path / 'summaries.db'), facets=['platform'])
+    processor.add_assets(corpus.assets())
+
+    summary = processor.get_summary(corpus.item_id(0))
+
+    assert set(summary.values) == {'platform'}
+    assert 'spatial' in summary.extent()
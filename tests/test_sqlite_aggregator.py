@@ -0,0 +1,104 @@
+# encoding: utf-8
+"""
+
+"""
+__author__ = 'Richard Smith'
+__date__ = '18 Oct 2026'
+__copyright__ = 'Copyright 2018 United Kingdom Research and Innovation'
+__license__ = 'BSD - see LICENSE file in top-level package directory'
+__contact__ = 'richard.d.smith@stfc.ac.uk'
+
+import os
+
+import pytest
+
+from item_generator.core.summaries import summarise
+from item_generator.testing.corpus import Corpus
+
+sqlite_aggregator = pytest.importorskip(
+    'item_generator.plugins.processors.sqlite_aggregator',
+    exc_type=ImportError
+)
+SQLiteAggregator = sqlite_aggregator.SQLiteAggregator
+
+CORPUS = Corpus(items=4, files_per_item=6, cardinality=5, hidden_every=4)
+
+
+def normalise(metadata):
+    properties = {
+        key: sorted(value) if isinstance(value, list) else value
+        for key, value in metadata['properties'].items()
+    }
+    return dict(metadata, properties=properties)
+
+
+@pytest.fixture
+def asset_file(tmp_path):
+    path = tmp_path / 'assets.json'
+    CORPUS.write_json(str(path))
+    return str(path)
+
+
+@pytest.mark.parametrize('ndjson', [False, True])
+def test_matches_summaries(tmp_path, ndjson):
+    asset_file = tmp_path / 'assets.json'
+    CORPUS.write_json(str(asset_file), ndjson=ndjson)
+
+    processor = SQLiteAggregator(path=str(tmp_path / 'assets.db'), filepath=str(asset_file))
+    description = CORPUS.description()
+    expected = summarise(CORPUS.assets())
+
+    item_ids = CORPUS.item_ids()
+    batch = processor.run_batch(item_ids, [description] * len(item_ids))
+
+    for item_id in item_ids:
+        metadata = processor.run(item_id, description)
+
+        assert normalise(metadata) == normalise(expected[item_id].metadata(CORPUS.facets))
+        assert normalise(batch[item_id]) == normalise(metadata)
+
+    assert processor.run('unknown', description) == {'properties': {}}
+    assert processor.get_facet_values('platform', item_ids[0])
+
+
+def test_reload_on_change(tmp_path, asset_file):
+    processor = SQLiteAggregator(path=str(tmp_path / 'assets.db'), filepath=asset_file)
+    description = CORPUS.description()
+
+    assert processor.run(CORPUS.item_id(3), description)['properties']
+
+    Corpus(items=2, files_per_item=3).write_json(asset_file)
+    os.utime(asset_file, ns=(1, 1))
+
+    assert processor.run(CORPUS.item_id(3), description) == {'properties': {}}
+    assert processor.run(CORPUS.item_id(1), description)['properties']
+
+
+def test_load_assets(tmp_path):
+    processor = SQLiteAggregator(path=str(tmp_path / 'assets.db'), facets=['platform'])
+    item_id = CORPUS.item_id(0)
+
+    processor.load_assets(CORPUS.assets())
+    metadata = processor.run(item_id, CORPUS.description())
+
+    assert sorted(metadata['properties']) == ['end_datetime', 'max_lat', 'max_lon', 'min_lat', 'min_lon',
+                                              'platform', 'start_datetime']
+    assert sorted(metadata['properties']['platform']) == sorted(summarise(CORPUS.assets())[item_id].values['platform'])
+    processor.close()
+
+    # Loaded assets are persisted
+    reopened = SQLiteAggregator(path=str(tmp_path / 'assets.db'))
+    assert normalise(reopened.run(item_id, CORPUS.description())) == normalise(metadata)
+
+
+def test_extent_query_uses_covering_indexes(tmp_path, asset_file):
+    processor = SQLiteAggregator(path=str(tmp_path / 'assets.db'), filepath=asset_file)
+    processor.run(CORPUS.item_id(0), CORPUS.description())
+
+    plan = [row[-1] for row in processor.conn.execute(
+        f'EXPLAIN QUERY PLAN {sqlite_aggregator.EXTENT_QUERY}', {'item_id': CORPUS.item_id(0)}
+    )]
+    subqueries = [step for step in plan if 'start_key' in step or 'end_key' in step or 'datetime_key' in step]
+
+    assert len(subqueries) == 4
+    assert all('COVERING INDEX' in step for step in subqueries)
@@ -0,0 +1,81 @@
+# encoding: utf-8
+"""
+
+"""
+__author__ = 'Richard Smith'
+__date__ = '18 Oct 2026'
+__copyright__ = 'Copyright 2018 United Kingdom Research and Innovation'
+__license__ = 'BSD - see LICENSE file in top-level package directory'
+__contact__ = 'richard.d.smith@stfc.ac.uk'
+
+from item_generator.core.summaries import ItemSummary, summarise
+from item_generator.testing.corpus import Corpus
+
+
+def normalise(metadata):
+    properties = {
+        key: sorted(value) if isinstance(value, list) else value
+        for key, value in metadata['properties'].items()
+    }
+    return dict(metadata, properties=properties)
+
+
+def test_item_summary():
+    summary = ItemSummary()
+    summary.add({'platform': 'faam', 'datetime': '2005-01-01T12:00:00', 'min_lon': -5.0, 'min_lat': 50.0,
+                 'max_lon': 1.0, 'max_lat': 55.0})
+    summary.add({'platform': ['faam', 'arsf'], 'datetime': '2005-01-01T09:00:00+00:00', 'min_lon': -8.0,
+                 'min_lat': 51.0, 'max_lon': 0.5, 'max_lat': 56.0})
+
+    metadata = summary.metadata(['platform', 'variable'])
+
+    assert sorted(metadata['properties']['platform']) == ['arsf', 'faam']
+    assert 'variable' not in metadata['properties']
+
+    # Datetimes are compared as instants, the recorded value is returned
+    assert metadata['properties']['start_datetime'] == '2005-01-01T09:00:00+00:00'
+    assert metadata['properties']['end_datetime'] == '2005-01-01T12:00:00'
+    assert metadata['bbox'] == [-8.0, 50.0, 1.0, 56.0]
+
+
+def test_start_end_preferred():
+    summary = ItemSummary()
+    summary.add({'datetime': '2001-01-01T00:00:00', 'start_datetime': '2005-01-01T00:00:00'})
+
+    assert summary.extent() == {'temporal': [['2005-01-01T00:00:00', None]]}
+
+
+def test_merge_and_round_trip():
+    corpus = Corpus(items=1, files_per_item=20)
+    assets = list(corpus.assets())
+
+    whole = summarise(assets)[corpus.item_id(0)]
+
+    first = summarise(assets[:7])[corpus.item_id(0)]
+    rest = ItemSummary.from_dict(summarise(assets[7:])[corpus.item_id(0)].to_dict())
+    first.merge(rest)
+
+    assert first.assets == whole.assets == 20
+    assert normalise(first.metadata(corpus.facets)) == normalise(whole.metadata(corpus.facets))
+
+
+def test_hidden_assets_excluded():
+    corpus = Corpus(items=2, files_per_item=4, hidden_every=2)
+
+    summaries = summarise(corpus.assets())
+
+    assert summaries[corpus.item_id(0)].assets == 2
+    assert summaries[corpus.item_id(1)].assets == 2
+
+
+def test_extent_values_not_kept():
+    corpus = Corpus(items=1, files_per_item=10)
+
+    summary = summarise(corpus.assets())[corpus.item_id(0)]
+
+    assert not summary.values.keys() & {'datetime', 'start_datetime', 'end_datetime', 'min_lon', 'max_lat'}
+    assert summary.extent()['temporal'][0][0] is not None
+
+    filtered = summarise(corpus.assets(), facets=['platform', 'start_datetime'])[corpus.item_id(0)]
+
+    assert set(filtered.values) == {'platform', 'start_datetime'}